@@ -1,114 +1,274 @@
 import docker
+import json
 import sqlite3
 import os
 import yaml
 import subprocess
-from flask import Flask, jsonify, render_template, request, session, redirect, url_for
+import sys
+import threading
+import time
+from flask import Flask, Response, g, jsonify, render_template, request, session, redirect, url_for
 from werkzeug.security import generate_password_hash, check_password_hash
 
+from bulk import ACTIONS as BULK_ACTIONS, BULK_PARALLELISM, STOP_TIMEOUT, plan_waves, run_bulk
+from docker_calls import api_calls
+from encoding import (STATIC_MAX_AGE, FastJSONProvider, choose_encoding, compact_section, compress_response,
+                      compress_stream, dumps, static_hash, view_response)
+from health import HostUnavailable
+from hosts import HOST_TIMEOUT, Host, HostRegistry
+from hoststats import HostStatsSampler
+from indexes import DEFAULT_LIMIT, FILTER_FIELDS
+from inventory import SECTION_KEYS
+from jobs import JobManager, JobQueueFull, pull_image, pull_key, run_command
+from logarchive import SEARCH_LIMIT, LogArchive, LogIngester, archive_path
+from logstream import DEFAULT_TAIL, MAX_TAIL, LineFilter, stream_logs, timestamp_ns
+import metrics
+from notify import Notifier, masked_url, validate_rule, validate_sink
+from prepull import compose_images, missing_images, plan as image_plan, prewarm, pull_images
+from shared import CollectorHost, SharedHost
+from stacks import StackBusy, StackIndex
+from stats import ContainerStatsSampler, parse_duration
+from storage import Storage
+from terminal import (Terminal, TerminalError, TerminalRelay, TerminalsFull, handshake_response, hijack, open_exec,
+                      websocket_key)
+
 app = Flask(__name__)
 app.secret_key = 'orbit_secret_key_2026'
+app.json = FastJSONProvider(app)
 
 VERSION = "1.1.0"
 GITHUB_REPO = "TobiMessi/orbit"
 
-DB_PATH = '/app/orbit.db'
-STACKS_PATH = '/app/stacks'
-
-# Utwórz folder na stacki
-os.makedirs(STACKS_PATH, exist_ok=True)
+DB_PATH = os.environ.get('ORBIT_DB_PATH', '/app/orbit.db')
+STACKS_PATH = os.environ.get('ORBIT_STACKS_PATH', '/app/stacks')
+# Archiwum logów: puste/0 = wyłączone, 1 = włączone, albo od razu lista źródeł (project:web,container:nginx)
+LOG_ARCHIVE = os.environ.get('ORBIT_LOG_ARCHIVE', '')
+
+# Co ile sekund strumień /status/stream wysyła keepalive, gdy nic się nie zmienia
+STREAM_KEEPALIVE = 15
+
+# standalone - jeden proces robi wszystko (python app.py)
+# collector  - jedyny proces rozmawiający z Dockerem o inwentarzu; publikuje snapshoty
+# worker     - obsługuje HTTP, inwentarz czyta ze snapshotów kolektora
+ROLES = ('standalone', 'collector', 'worker')
+# Co ile sekund kolektor i workery podchwytują hosty dodane w innym procesie
+HOSTS_SYNC_INTERVAL = 10
+
+# Ustawiane przez create_app()
+storage = None
+registry = None
+client = None
+inventory = None
+stats_sampler = None
+host_stats = None
+jobs = None
+stacks = None
+terminals = None
+log_archive = None
+log_ingester = None
+notifier = None
 
 
 # ============ BAZA DANYCH ============
 
-def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
-
-
 def init_db():
-    conn = get_db()
-    db = conn.cursor()
-
-    db.execute('''CREATE TABLE IF NOT EXISTS users
-                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                   email TEXT UNIQUE,
-                   password TEXT)''')
-
-    db.execute('''CREATE TABLE IF NOT EXISTS hosts
-                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                   name TEXT,
-                   url TEXT,
-                   is_local INTEGER DEFAULT 0)''')
-
-    db.execute("SELECT id FROM hosts WHERE is_local = 1")
-    if not db.fetchone():
-        db.execute("INSERT INTO hosts (name, url, is_local) VALUES (?, ?, ?)",
-                   ("Local Docker", "unix://var/run/docker.sock", 1))
-
-    conn.commit()
-    conn.close()
+    storage.migrate()
+    storage.ensure_local_host()
     print("✅ Baza danych zainicjalizowana")
 
 
-init_db()
-
-
 # ============ DOCKER CLIENT ============
 
 def get_docker_client(host_id=None):
-    try:
-        if host_id:
-            conn = get_db()
-            host = conn.execute("SELECT url FROM hosts WHERE id = ?", (host_id,)).fetchone()
-            conn.close()
-            if host:
-                return docker.DockerClient(base_url=host['url'])
-        return docker.from_env()
-    except Exception as e:
-        print(f"⚠️ Błąd połączenia z Dockerem: {e}")
-        return None
+    return registry.client(host_id)
 
 
-client = get_docker_client()
-if client:
-    print("✅ Połączono z Docker Engine")
+def action_client(host_id=None):
+    """Klient hosta do akcji - przez rejestr i bezpiecznik, jak odczyty; HostUnavailable to 503"""
+    host = registry.get(host_id) if host_id else registry.local()
+    if host is None:
+        raise HostUnavailable("Docker niedostępny")
+    return host.require_client()
 
 
-# ============ STACKS HELPER ============
+@app.errorhandler(HostUnavailable)
+def host_unavailable(e):
+    return jsonify({"status": "error", "message": str(e)}), 503
 
-def get_stacks():
-    """Pobiera listę stacków na podstawie docker-compose projektów"""
-    stacks = {}
 
-    try:
-        containers = client.containers.list(all=True)
+def get_host_inventory(host_id=None):
+    host = registry.get(host_id) if host_id else registry.local()
+    if host is None or (host.inventory is None and host.connect() is None):
+        return None
+    return host.inventory
 
-        for c in containers:
-            labels = c.labels
-            project = labels.get('com.docker.compose.project')
 
-            if project:
-                if project not in stacks:
-                    stacks[project] = {
-                        'name': project,
-                        'containers': [],
-                        'path': labels.get('com.docker.compose.project.working_dir', '')
-                    }
+# Kolektor publikuje inwentarz, zdrowie i raport dysku hostów; worker tylko je czyta
+# i łączy się z Dockerem dopiero przy akcji
+HOST_CLASSES = {
+    'standalone': Host,
+    'collector': CollectorHost,
+    'worker': SharedHost,
+}
 
-                c.reload()
-                state = c.attrs['State']
-                status = 'running' if state.get('Running') else 'stopped'
 
-                stacks[project]['containers'].append({
-                    'name': c.name,
-                    'status': status
-                })
-    except Exception as e:
-        print(f"Błąd pobierania stacków: {e}")
+def watch_hosts():
+    while True:
+        time.sleep(HOSTS_SYNC_INTERVAL)
+        try:
+            storage.invalidate_hosts()
+            registry.sync()
+        except Exception as e:
+            print(f"⚠️ Błąd synchronizacji hostów: {e}")
+
+
+# ============ FABRYKA APLIKACJI ============
+
+def create_app(role=None):
+    """Inicjalizuje bazę, klientów Dockera i wątki w tle; zwraca aplikację Flask.
+
+    Wywoływane raz na proces, już po forku - np. gunicorn 'app:create_app("worker")' (gunicorn.conf.py)
+    obok jednego procesu `python app.py collector`. Rola domyślnie z ORBIT_ROLE.
+    """
+    global storage, registry, client, inventory, stats_sampler, host_stats, jobs, stacks, terminals, log_archive, \
+        log_ingester, notifier
+    if storage is not None:
+        return app
+
+    role = role or os.environ.get('ORBIT_ROLE', 'standalone')
+    if role not in ROLES:
+        raise ValueError(f"Nieznana rola: {role} (dostępne: {', '.join(ROLES)})")
+    app.config['ORBIT_ROLE'] = role
+
+    os.makedirs(STACKS_PATH, exist_ok=True)
+    storage = Storage(DB_PATH)
+    init_db()
+
+    # Jeden długo żyjący klient (i inwentarz) na każdy host z tabeli hosts
+    registry = HostRegistry(storage.hosts, host_class=HOST_CLASSES[role])
+    registry.sync()
+    inventory = get_host_inventory()
+    if role != 'worker':
+        # Sonda w tle zamyka i otwiera bezpieczniki hostów; zapytania nie czekają na martwe silniki.
+        # Worker nie pinguje hostów - czyta ich stan opublikowany przez kolektor
+        registry.start_probing()
+        client = get_docker_client()
+    if client:
+        print("✅ Połączono z Docker Engine")
+        stats_sampler = ContainerStatsSampler(client, inventory, storage)
+        stats_sampler.start()
+    elif role == 'worker':
+        # Strumienie statystyk otwiera tylko kolektor; worker czyta historię z bazy
+        stats_sampler = ContainerStatsSampler(None, inventory, storage)
+
+    # Metryki maszyny próbkuje jeden proces; workery czytają jego bufor z SNAPSHOT_DIR
+    host_stats = HostStatsSampler(storage)
+    if role != 'worker':
+        host_stats.start()
+
+    # Długie operacje (pull, compose up) nie blokują wątków obsługujących requesty;
+    # workery zapisują je w bazie, bo /jobs/<id> może trafić do innego procesu
+    jobs = JobManager(store=storage if role == 'worker' else None)
+    stacks = StackIndex(STACKS_PATH, inventory)
+    # Terminale exec: jeden wątek z selektorem na wszystkie sesje
+    terminals = TerminalRelay()
+    if LOG_ARCHIVE.lower() not in ('', '0', 'false', 'no', 'off'):
+        start_log_archive(role)
+    # Zdarzenia hostów subskrybuje jeden proces - inaczej każdy worker wysłałby to samo powiadomienie
+    if role != 'worker':
+        notifier = Notifier(registry, storage).start()
+
+    if role != 'standalone':
+        threading.Thread(target=watch_hosts, name='hosts-sync', daemon=True).start()
+    print(f"🚀 Orbit uruchomiony w trybie {role}")
+    return app
+
+
+def start_log_archive(role):
+    """Archiwum w orbit-logs.db obok orbit.db; logi czyta tylko jeden proces, szukać można w każdym"""
+    global log_archive, log_ingester
+    log_archive = LogArchive(archive_path(DB_PATH))
+    for selector in LOG_ARCHIVE.split(','):
+        selector = selector.strip()
+        if not selector or selector.lower() in ('1', 'true', 'yes', 'on'):
+            continue
+        try:
+            log_archive.add_source(selector)
+        except ValueError as e:
+            print(f"⚠️ {e}")
+    if client:
+        log_ingester = LogIngester(client, inventory, log_archive)
+        log_ingester.start()
+    print(f"🗄️ Archiwum logów: {', '.join(log_archive.sources()) or 'brak źródeł'}")
+
+
+# ============ METRYKI ============
+
+# Gdy ustawiony, /metrics wymaga nagłówka Authorization: Bearer <token>
+METRICS_TOKEN = os.environ.get('ORBIT_METRICS_TOKEN')
+
+metrics.registry.gauge('orbit_jobs', "Zadania w tle wg stanu",
+                       lambda: {(status,): jobs.count(status) for status in ('queued', 'running')}, ('status',))
+metrics.registry.gauge('orbit_inventory_version', "Wersja snapshotu inwentarza",
+                       lambda: inventory.version if inventory else None)
+metrics.registry.gauge('orbit_inventory_age_seconds', "Wiek snapshotu inwentarza",
+                       lambda: inventory.freshness()['age'] if inventory else None)
+metrics.registry.gauge('orbit_terminals', "Otwarte terminale exec",
+                       lambda: terminals.count() if terminals else None)
+metrics.registry.gauge('orbit_hosts_connected', "Hosty z aktywnym klientem Dockera",
+                       lambda: sum(1 for host in registry.hosts() if host.connected))
+metrics.registry.gauge('orbit_hosts_circuit_open', "Hosty z otwartym bezpiecznikiem (nie odpowiadają)",
+                       lambda: sum(1 for host in registry.hosts() if not host.breaker.closed))
+metrics.registry.gauge('orbit_host_sampler_cpu_percent', "Procent rdzenia zużywany przez próbkowanie metryk hosta",
+                       lambda: host_stats.overhead if host_stats else None)
+metrics.registry.gauge('orbit_log_archive_followed', "Kontenery, których logi trafiają do archiwum",
+                       lambda: len(log_ingester.followed) if log_ingester else None)
+metrics.registry.gauge('orbit_notifications_dropped', "Zdarzenia wyrzucone z pełnych kolejek odbiorców powiadomień",
+                       lambda: {(sink.name,): sink.dropped for sink in notifier.sinks.values()} if notifier else None,
+                       ('sink',))
+
+
+@app.before_request
+def start_request_trace():
+    metrics.start_trace()
+    g.docker_calls_start = api_calls.thread_calls
+
+
+@app.after_request
+def finish_request_trace(response):
+    # Dla odpowiedzi strumieniowych to czas do nagłówków, nie do końca strumienia
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    metrics.finish_trace(request.method, route, response.status_code,
+                         api_calls.thread_calls - g.get('docker_calls_start', api_calls.thread_calls))
+    return response
+
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Metryki Orbit w formacie tekstowym Prometheusa"""
+    if METRICS_TOKEN and request.headers.get('Authorization') != f"Bearer {METRICS_TOKEN}":
+        return jsonify({"error": "unauthorized"}), 401
+
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+# ============ KOMPRESJA I CACHE ============
+
+@app.url_defaults
+def static_version(endpoint, values):
+    """url_for('static', ...) dokleja hash treści pliku"""
+    if endpoint == 'static' and 'filename' in values:
+        version = static_hash(app.static_folder, values['filename'])
+        if version:
+            values['v'] = version
+
 
-    return list(stacks.values())
+@app.after_request
+def compress_and_cache(response):
+    if request.endpoint == 'static' and request.args.get('v'):
+        if request.args['v'] == static_hash(app.static_folder, request.view_args['filename']):
+            response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}, immutable'
+    return compress_response(response, request.accept_encodings, cache_key=request.full_path)
 
 
 # ============ ROUTING - AUTH ============
@@ -132,9 +292,7 @@ def login():
     if not email or not password:
         return jsonify({"status": "error", "message": "Uzupełnij wszystkie pola"}), 400
 
-    conn = get_db()
-    user = conn.execute("SELECT password FROM users WHERE email=?", (email,)).fetchone()
-    conn.close()
+    user = storage.get_user(email)
 
     if user and check_password_hash(user['password'], password):
         session['user'] = email
@@ -153,10 +311,7 @@ def register():
 
     hashed_pw = generate_password_hash(password)
     try:
-        conn = get_db()
-        conn.execute("INSERT INTO users (email, password) VALUES (?, ?)", (email, hashed_pw))
-        conn.commit()
-        conn.close()
+        storage.create_user(email, hashed_pw)
         return jsonify({"status": "ok", "message": "Konto utworzone! Możesz się zalogować."})
     except sqlite3.IntegrityError:
         return jsonify({"status": "error", "message": "Ten email jest już zarejestrowany"}), 400
@@ -168,6 +323,131 @@ def logout():
     return redirect(url_for('login'))
 
 
+# ============ ROUTING - HOSTY ============
+
+@app.route('/hosts')
+def hosts_list():
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    return jsonify([host.describe() for host in registry.hosts()])
+
+
+@app.route('/host/create', methods=['POST'])
+def host_create():
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    try:
+        data = request.json
+        name = data.get('name')
+        url = data.get('url')
+
+        if not name or not url:
+            return jsonify({"status": "error", "message": "Nazwa i adres hosta są wymagane"}), 400
+
+        # Limity czasu klienta w sekundach; puste = domyślne (health.CONNECT_TIMEOUT / READ_TIMEOUT).
+        # Sonda hosta ma zawsze krótki health.PROBE_TIMEOUT
+        try:
+            timeouts = [float(data[key]) if data.get(key) else None for key in ('connect_timeout', 'read_timeout')]
+        except (TypeError, ValueError):
+            return jsonify({"status": "error", "message": "Limity czasu muszą być liczbami sekund"}), 400
+        if any(timeout is not None and timeout <= 0 for timeout in timeouts):
+            return jsonify({"status": "error", "message": "Limity czasu muszą być dodatnie"}), 400
+
+        storage.add_host(name, url, connect_timeout=timeouts[0], read_timeout=timeouts[1])
+        registry.sync()
+        return jsonify({"status": "ok", "message": f"Host {name} dodany"})
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route('/host/<int:host_id>/remove', methods=['POST'])
+def host_remove(host_id):
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    try:
+        storage.remove_host(host_id)
+        registry.sync()
+        return jsonify({"status": "ok", "message": "Host usunięty"})
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+# ============ ROUTING - MIEJSCE NA DYSKU ============
+
+def disk_host(host_id):
+    host = registry.get(host_id) if host_id else registry.local()
+    if host is None or (host.disk is None and host.connect() is None):
+        return None
+    return host
+
+
+@app.route('/disk')
+@app.route('/host/<int:host_id>/disk')
+def disk_usage(host_id=None):
+    """Raport z ostatniego `docker system df` hosta: obrazy, wolumeny, cache i plan czyszczenia"""
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+
+    host = disk_host(host_id)
+    if host is None:
+        return jsonify({"error": "Docker niedostępny"}), 503
+    # Host, który nie odpowiada, dostaje ostatni raport z pamięci - bez czekania
+    available = host.breaker.closed
+    report = host.disk.report() if available else host.disk.report(timeout=0)
+    if report is None:
+        return jsonify({"status": "error", "message": host.disk.error or "Raport jeszcze się liczy"}), 503
+    report['stale'] = not available
+    return jsonify(report)
+
+
+@app.route('/disk/refresh', methods=['POST'])
+@app.route('/host/<int:host_id>/disk/refresh', methods=['POST'])
+def disk_refresh(host_id=None):
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+
+    host = disk_host(host_id)
+    if host is None:
+        return jsonify({"error": "Docker niedostępny"}), 503
+    if not host.disk.refresh():
+        return jsonify({"status": "ok", "message": "Raport jest świeży"})
+    return jsonify({"status": "ok", "message": "Odświeżanie raportu"}), 202
+
+
+# ============ ROUTING - METRYKI HOSTA ============
+
+@app.route('/host/metrics')
+def host_metrics():
+    """Bieżące wartości i serie CPU/pamięci/load/dysku/sieci maszyny Orbita, bez wywołań psutil.
+
+    ?range=15m|6h|7d (domyślnie 15m) albo ?from=&to= w sekundach unix;
+    ?resolution=raw|1m|1h wymusza źródło danych.
+    """
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    try:
+        end = request.args.get('to', type=float) or time.time()
+        start = request.args.get('from', type=float) or end - parse_duration(request.args.get('range', '15m'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    resolution = request.args.get('resolution')
+    if resolution not in (None, 'raw', '1m', '1h'):
+        return jsonify({"status": "error", "message": "Nieznana rozdzielczość"}), 400
+
+    data = host_stats.series(start, end, resolution)
+    return jsonify(dict(data, current=host_stats.current(), info=host_stats.info(),
+                        sampler_cpu_percent=host_stats.overhead, **{"from": start, "to": end}))
+
+
+@app.route('/host/metrics/current')
+def host_metrics_current():
+    """Ostatnia próbka - do paska nad zakładkami panelu"""
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    return jsonify({"current": host_stats.current(), "info": host_stats.info()})
+
+
 # ============ ROUTING - VERSION ============
 
 @app.route('/api/version')
@@ -180,86 +460,195 @@ def get_version():
 
 # ============ ROUTING - STATUS ============
 
+def inventory_headers(response, version):
+    freshness = inventory.freshness()
+    response.headers['X-Inventory-Version'] = str(version)
+    if freshness['age'] is not None:
+        response.headers['X-Inventory-Age'] = str(freshness['age'])
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
 @app.route('/status')
 def status():
+    """Snapshot inwentarza z wersją i ETagiem.
+
+    If-None-Match z bieżącym ETagiem daje 304, a ?since=<wersja> zwraca tylko
+    zmienione sekcje i elementy (albo pełny snapshot, gdy dziennik zmian już
+    nie sięga tej wersji).
+    """
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+
+    if inventory is None:
+        return jsonify({"error": "Docker niedostępny"}), 503
+
+    if not inventory.wait_ready():
+        return jsonify({"error": inventory.error or "Inwentarz nie jest jeszcze gotowy"}), 503
+
+    since = request.args.get('since', type=int)
+    compact = request.args.get('format') == 'compact'
+    # Format kompaktowy to inna reprezentacja - osobny ETag
+    suffix = '-c' if compact else ''
+    version = inventory.version
+
+    with api_calls.measure() as measured:
+        if request.if_none_match.contains_weak(f"v{version}{suffix}") or since == version:
+            response = Response(status=304)
+        else:
+            delta = inventory.changes_since(since, compact) if since is not None else None
+            if delta is not None:
+                version = delta['version']
+                response = Response(dumps(delta), mimetype='application/json')
+            else:
+                version, body = inventory.snapshot_json(compact)
+                response = view_response(body)
+
+    response.set_etag(f"v{version}{suffix}")
+    # Ile zapytań do Dockera kosztował ten request (przy gotowym inwentarzu: 0)
+    response.headers['X-Docker-Calls'] = str(measured['calls'])
+    return inventory_headers(response, version)
+
+
+@app.route('/status/inventory')
+def status_inventory():
+    """Świeżość snapshotu: wersja, wiek, ostatnie zdarzenie i rekonsyliacja"""
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+
+    if inventory is None:
+        return jsonify({"error": "Docker niedostępny"}), 503
+
+    return jsonify(inventory.freshness())
+
+
+@app.route('/api/<section>')
+def section_query(section):
+    """Strona jednej sekcji inwentarza: ?limit=&cursor=&sort=[-]pole&q=&<filtr>=wartość.
+
+    Filtry można powtarzać (?label=a&label=b - wszystkie muszą pasować),
+    a next_cursor z odpowiedzi podaje się w kolejnym zapytaniu.
+    """
     if 'user' not in session:
         return jsonify({"error": "unauthorized"}), 401
 
-    if client is None:
+    if section not in SECTION_KEYS:
+        return jsonify({"error": f"Nieznana sekcja: {section}"}), 404
+
+    if inventory is None:
         return jsonify({"error": "Docker niedostępny"}), 503
 
+    if not inventory.wait_ready():
+        return jsonify({"error": inventory.error or "Inwentarz nie jest jeszcze gotowy"}), 503
+
+    sort = request.args.get('sort') or ('tag' if section == 'images' else 'name')
+    filters = {field: request.args.getlist(field) for field in FILTER_FIELDS[section] if field in request.args}
+
     try:
-        all_containers = client.containers.list(all=True)
-        all_images = client.images.list()
-        all_volumes = client.volumes.list()
-        all_networks = client.networks.list()
-        all_stacks = get_stacks()
-
-        containers = []
-        for c in all_containers:
-            c.reload()
-            state = c.attrs['State']
-
-            if state.get('Running'):
-                status = 'running'
-            elif state.get('Paused'):
-                status = 'paused'
-            elif state.get('Restarting'):
-                status = 'restarting'
-            elif state.get('Dead'):
-                status = 'dead'
+        version, index = inventory.index(section)
+        result = index.query(
+            filters=filters,
+            q=request.args.get('q'),
+            sort=sort.lstrip('-'),
+            descending=sort.startswith('-'),
+            limit=request.args.get('limit', DEFAULT_LIMIT, type=int),
+            cursor=request.args.get('cursor')
+        )
+    except (ValueError, TypeError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    if request.args.get('format') == 'compact':
+        result['items'] = compact_section(section, result['items'])
+    result['version'] = version
+    return inventory_headers(jsonify(result), version)
+
+
+@app.route('/hosts/status')
+def hosts_status():
+    """Inwentarz wszystkich hostów zebrany równolegle, elementy oznaczone hostem"""
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+
+    timeout = request.args.get('timeout', HOST_TIMEOUT, type=float)
+    return jsonify(registry.merged_status(timeout=timeout))
+
+
+def sse_message(event, version, body):
+    if isinstance(body, memoryview):
+        body = str(body, 'utf-8')
+    return f"id: {version}\nevent: {event}\ndata: {body}\n\n"
+
+
+@app.route('/status/stream')
+def status_stream():
+    """Server-Sent Events: jeden pełny snapshot, potem tylko różnice per zasób"""
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+
+    if inventory is None:
+        return jsonify({"error": "Docker niedostępny"}), 503
+
+    if not inventory.wait_ready():
+        return jsonify({"error": inventory.error or "Inwentarz nie jest jeszcze gotowy"}), 503
+
+    # Po zerwaniu połączenia przeglądarka odsyła id ostatniej wiadomości
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    resume_from = int(last_event_id) if last_event_id.isdigit() else None
+    compact = request.args.get('format') == 'compact'
+
+    def generate():
+        delta = inventory.changes_since(resume_from, compact) if resume_from is not None else None
+        if delta is None:
+            version, body = inventory.snapshot_json(compact)
+            yield sse_message('snapshot', version, body)
+        else:
+            version = delta['version']
+            if delta['sections']:
+                yield sse_message('delta', version, dumps(delta))
+
+        while True:
+            inventory.wait_for_change(version, STREAM_KEEPALIVE)
+            delta = inventory.changes_since(version, compact)
+            if delta is None:
+                version, body = inventory.snapshot_json(compact)
+                yield sse_message('snapshot', version, body)
+            elif delta['sections']:
+                version = delta['version']
+                yield sse_message('delta', version, dumps(delta))
             else:
-                status = 'stopped'
-
-            containers.append({
-                "id": c.short_id,
-                "name": c.name,
-                "status": status,
-                "image": c.image.tags[0] if c.image.tags else c.image.short_id
-            })
-
-        images = []
-        for img in all_images:
-            size_mb = round(img.attrs['Size'] / (1024 * 1024), 1)
-            images.append({
-                "id": img.short_id.replace("sha256:", ""),
-                "tags": img.tags if img.tags else ["<none>:<none>"],
-                "size": f"{size_mb} MB"
-            })
-
-        volumes = []
-        for vol in all_volumes:
-            volumes.append({
-                "name": vol.name,
-                "driver": vol.attrs.get('Driver', 'unknown'),
-                "mountpoint": vol.attrs.get('Mountpoint', '')[:50]
-            })
-
-        networks = []
-        for net in all_networks:
-            networks.append({
-                "id": net.short_id,
-                "name": net.name,
-                "driver": net.attrs.get('Driver', 'unknown'),
-                "scope": net.attrs.get('Scope', 'unknown')
-            })
+                yield ": keepalive\n\n"
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no', 'Vary': 'Accept-Encoding'}
+    stream = (message.encode() for message in generate())
+    encoding = choose_encoding(request.accept_encodings)
+    if encoding is not None:
+        # Każda wiadomość jest dopychana flushem, więc kompresja nie opóźnia zdarzeń
+        stream = compress_stream(stream, encoding)
+        headers['Content-Encoding'] = encoding
+    return Response(stream, mimetype='text/event-stream', headers=headers)
 
-        return jsonify({
-            "counts": {
-                "containers": len(all_containers),
-                "images": len(all_images),
-                "stacks": len(all_stacks),
-                "volumes": len(all_volumes),
-                "networks": len(all_networks)
-            },
-            "containers": containers,
-            "images": images,
-            "volumes": volumes,
-            "networks": networks,
-            "stacks": all_stacks
-        })
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+
+# ============ ZADANIA W TLE ============
+
+@app.route('/jobs')
+def jobs_list():
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    return jsonify({
+        "queue_depth": jobs.queue_depth(),
+        "jobs": [job.to_dict() for job in jobs.list()]
+    })
+
+
+@app.route('/jobs/<job_id>')
+def job_detail(job_id):
+    """Stan zadania; ?after=N zwraca tylko linie wyjścia nowsze niż N"""
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": "Nie ma takiego zadania"}), 404
+    return jsonify(job.to_dict(output_after=request.args.get('after', 0, type=int)))
 
 
 # ============ KONTENERY - AKCJE ============
@@ -268,6 +657,7 @@ def status():
 def container_start(container_id):
     if 'user' not in session:
         return jsonify({"error": "unauthorized"}), 401
+    client = action_client()
     try:
         container = client.containers.get(container_id)
         container.start()
@@ -280,6 +670,7 @@ def container_start(container_id):
 def container_stop(container_id):
     if 'user' not in session:
         return jsonify({"error": "unauthorized"}), 401
+    client = action_client()
     try:
         container = client.containers.get(container_id)
         container.stop()
@@ -292,6 +683,7 @@ def container_stop(container_id):
 def container_restart(container_id):
     if 'user' not in session:
         return jsonify({"error": "unauthorized"}), 401
+    client = action_client()
     try:
         container = client.containers.get(container_id)
         container.restart()
@@ -304,6 +696,7 @@ def container_restart(container_id):
 def container_remove(container_id):
     if 'user' not in session:
         return jsonify({"error": "unauthorized"}), 401
+    client = action_client()
     try:
         container = client.containers.get(container_id)
         name = container.name
@@ -317,6 +710,7 @@ def container_remove(container_id):
 def container_logs(container_id):
     if 'user' not in session:
         return jsonify({"error": "unauthorized"}), 401
+    client = action_client()
     try:
         container = client.containers.get(container_id)
         logs = container.logs(tail=100, timestamps=True).decode('utf-8', errors='ignore')
@@ -325,6 +719,392 @@ def container_logs(container_id):
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+def same_origin():
+    """Origin przeglądarki zgodny z hostem panelu - cudza strona nie otworzy terminala ciasteczkiem sesji"""
+    origin = request.headers.get('Origin')
+    return origin is None or origin.split('://', 1)[-1] == request.host
+
+
+@app.route('/container/<container_id>/exec', websocket=True)
+def container_exec(container_id):
+    """Terminal w kontenerze przez WebSocket.
+
+    Ramki binarne to surowe bajty TTY w obie strony, tekstowe - komendy
+    sterujące ({"type": "resize", "cols": 120, "rows": 40}). Po handshake'u
+    połączenie przejmuje TerminalRelay, a request od razu się kończy.
+    """
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    try:
+        key = websocket_key(request.headers)
+    except TerminalError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if not same_origin():
+        return jsonify({"status": "error", "message": "Niedozwolony Origin"}), 403
+    if terminals.full():
+        return jsonify({"status": "error", "message": "Za dużo otwartych terminali"}), 429
+
+    client = action_client()
+    try:
+        exec_id, stream = open_exec(client, container_id,
+                                    cols=request.args.get('cols', 80, type=int),
+                                    rows=request.args.get('rows', 24, type=int))
+    except docker.errors.NotFound as e:
+        return jsonify({"status": "error", "message": str(e)}), 404
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+    terminal = Terminal(None, stream, client, exec_id, container_id)
+    try:
+        terminal.ws = hijack(request.environ)
+    except TerminalError as e:
+        stream.close()
+        return jsonify({"status": "error", "message": str(e)}), 501
+    try:
+        terminal.ws.sendall(handshake_response(key))
+        terminals.add(terminal)
+    except (OSError, TerminalsFull) as e:
+        print(f"⚠️ Nie udało się otworzyć terminala w {container_id}: {e}")
+        terminal.ws.close()
+        stream.close()
+    # Serwer zapisze tę odpowiedź do martwego gniazda - klient dostał już swój handshake
+    return Response(status=101)
+
+
+def arg_flag(name, default=False):
+    value = request.args.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes', 'on')
+
+
+@app.route('/container/<container_id>/logs/stream', methods=['GET'])
+def container_logs_stream(container_id):
+    """Strumień logów jako NDJSON {"ts", "line"}.
+
+    follow=1 śledzi nowe linie, since=<ts> wznawia od kursora, before=<ts>
+    zwraca `tail` linii sprzed kursora (stronicowanie wstecz), q/regex/icase
+    filtrują linie, a stdout/stderr wybierają strumienie - wszystko po stronie
+    serwera.
+    """
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    try:
+        since = request.args.get('since')
+        until = request.args.get('before') or request.args.get('until')
+        since = timestamp_ns(since) if since else None
+        until = timestamp_ns(until) if until else None
+        line_filter = LineFilter(request.args.get('q'), regex=arg_flag('regex'), ignore_case=arg_flag('icase'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    follow = arg_flag('follow') and until is None
+    # Przy wznawianiu od kursora domyślnie bierzemy wszystko (do limitu)
+    tail = request.args.get('tail', MAX_TAIL if since is not None else DEFAULT_TAIL, type=int)
+    tail = max(0, min(tail, MAX_TAIL))
+
+    client = action_client()
+    try:
+        client.api.inspect_container(container_id)
+    except docker.errors.NotFound as e:
+        return jsonify({"status": "error", "message": str(e)}), 404
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+    lines = stream_logs(client, container_id, follow=follow, tail=tail, since=since, until=until,
+                        stdout=arg_flag('stdout', True), stderr=arg_flag('stderr', True),
+                        line_filter=line_filter)
+    return Response(lines, mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
+@app.route('/metrics/<container_ref>')
+def container_metrics(container_ref):
+    """Serie CPU/mem/net/blkio kontenera z pamięci lub SQLite, bez wywołań Dockera.
+
+    ?range=15m|6h|7d (domyślnie 15m) albo ?from=&to= w sekundach unix;
+    ?resolution=raw|1m|1h wymusza źródło danych.
+    """
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+
+    if stats_sampler is None:
+        return jsonify({"error": "Docker niedostępny"}), 503
+
+    container_id = inventory.resolve_container(container_ref)
+    if container_id is None:
+        return jsonify({"status": "error", "message": "Nie znaleziono kontenera"}), 404
+
+    try:
+        end = request.args.get('to', type=float) or time.time()
+        start = request.args.get('from', type=float) or end - parse_duration(request.args.get('range', '15m'))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    resolution = request.args.get('resolution')
+    if resolution not in (None, 'raw', '1m', '1h'):
+        return jsonify({"status": "error", "message": "Nieznana rozdzielczość"}), 400
+
+    data = stats_sampler.series(container_id, start, end, resolution)
+    return jsonify(dict(data, container=container_id[:12], **{"from": start, "to": end}))
+
+
+@app.route('/containers/bulk', methods=['POST'])
+def containers_bulk():
+    """Akcja na wielu kontenerach naraz, z kolejnością z depends_on.
+
+    Body: {"action": "start|stop|restart|remove", "containers": [id lub nazwa],
+    "parallelism": 8, "timeout": 10}. Odpowiedź to NDJSON - jeden wynik na
+    kontener w kolejności ukończenia, na końcu podsumowanie.
+    """
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+
+    data = request.json or {}
+    action = data.get('action')
+    refs = data.get('containers') or []
+    if action not in BULK_ACTIONS:
+        return jsonify({"status": "error", "message": f"Nieznana akcja: {action}"}), 400
+    if not refs:
+        return jsonify({"status": "error", "message": "Lista kontenerów jest wymagana"}), 400
+    if not isinstance(refs, list) or not all(isinstance(ref, str) for ref in refs):
+        return jsonify({"status": "error", "message": "containers musi być listą id lub nazw"}), 400
+
+    try:
+        parallelism = int(data.get('parallelism', BULK_PARALLELISM))
+        stop_timeout = int(data.get('timeout', STOP_TIMEOUT))
+    except (TypeError, ValueError):
+        return jsonify({"status": "error", "message": "Nieprawidłowe parametry"}), 400
+
+    containers = inventory.containers(refs=refs)
+    found = {key for c in containers for key in (c['id'], c['id'][:12], c['name'])}
+    missing = [ref for ref in refs if ref not in found]
+    waves = bulk_waves(containers, action)
+    client = action_client()
+
+    def generate():
+        counts = {"ok": 0, "error": len(missing)}
+        for ref in missing:
+            yield json.dumps({"id": ref, "action": action, "status": "error",
+                              "message": "Nie znaleziono kontenera"}) + "\n"
+        for result in run_bulk(client, waves, action, parallelism=parallelism, stop_timeout=stop_timeout):
+            counts[result['status']] += 1
+            yield json.dumps(result) + "\n"
+        yield json.dumps({"done": True, **counts}) + "\n"
+
+    return Response(generate(), mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
+
+
+# ============ ARCHIWUM LOGÓW ============
+
+def log_archive_disabled():
+    return jsonify({"error": "Archiwum logów wyłączone (ORBIT_LOG_ARCHIVE)"}), 503
+
+
+@app.route('/logs/search')
+def logs_search():
+    """Linie z archiwum pasujące do zapytania, bez wywołań Dockera.
+
+    ?q=słowa (wszystkie muszą wystąpić, słowo* = prefiks), ?project=, ?service=,
+    ?container= (nazwa lub prefiks id), ?range=6h albo ?since=&until= (RFC3339
+    lub sekundy unix), ?limit= (domyślnie 200).
+    """
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    if log_archive is None:
+        return log_archive_disabled()
+    try:
+        until = request.args.get('until')
+        until = timestamp_ns(until) if until else time.time_ns()
+        since = request.args.get('since')
+        if since:
+            since = timestamp_ns(since)
+        elif request.args.get('range'):
+            since = until - int(parse_duration(request.args['range']) * 1e9)
+        result = log_archive.search(request.args.get('q'), project=request.args.get('project'),
+                                    service=request.args.get('service'), container=request.args.get('container'),
+                                    since=since, until=until,
+                                    limit=request.args.get('limit', SEARCH_LIMIT, type=int))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except sqlite3.Error as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    return jsonify(result)
+
+
+@app.route('/logs/archive')
+def logs_archive():
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    if log_archive is None:
+        return log_archive_disabled()
+    return jsonify({
+        "sources": log_archive.sources(),
+        # None w workerze - logi czyta kolektor
+        "followed": log_ingester.followed if log_ingester else None,
+        "flushed_at": log_ingester.flushed_at if log_ingester else None,
+        **log_archive.stats()
+    })
+
+
+@app.route('/logs/archive/sources', methods=['POST'])
+def logs_archive_add_source():
+    """Body: {"selector": "project:web" | "service:api" | "container:nginx" | "label:k=v" | "*"}"""
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    if log_archive is None:
+        return log_archive_disabled()
+    selector = (request.json or {}).get('selector')
+    try:
+        log_archive.add_source(selector)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    return jsonify({"status": "ok", "message": f"Źródło {selector} dodane", "sources": log_archive.sources()})
+
+
+@app.route('/logs/archive/sources/<path:selector>', methods=['DELETE'])
+def logs_archive_remove_source(selector):
+    """Kontenery przestają być śledzone; zapisane już linie zostają do końca retencji"""
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    if log_archive is None:
+        return log_archive_disabled()
+    try:
+        if not log_archive.remove_source(selector):
+            return jsonify({"status": "error", "message": "Nie ma takiego źródła"}), 404
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    return jsonify({"status": "ok", "message": f"Źródło {selector} usunięte", "sources": log_archive.sources()})
+
+
+# ============ POWIADOMIENIA ============
+
+@app.route('/notifications')
+def notifications():
+    """Odbiorcy, reguły i liczniki dyspozytora.
+
+    Worker nie wysyła powiadomień - pokazuje liczniki, które kolektor publikuje
+    w bazie co notify.SYNC_INTERVAL s (status_age: ile sekund mają).
+    """
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    if notifier is not None:
+        state = dict(notifier.describe(), status_age=0)
+    else:
+        published = storage.notification_status()
+        state = dict(published[0], status_age=round(time.time() - published[1], 1)) if published else \
+            {"sinks": [], "status_age": None}
+    counters = {sink['id']: sink for sink in state['sinks']}
+    # Adresy webhooków i bota zawierają sekretne tokeny - pokazujemy tylko schemat i host
+    sinks = [dict(sink, url=masked_url(sink['url']), **counters.get(sink['id'], {}))
+             for sink in storage.notification_sinks()]
+    return jsonify(dict(state, sinks=sinks, rules=storage.notification_rules()))
+
+
+@app.route('/notifications/sinks', methods=['POST'])
+def notification_sink_create():
+    """Body: {"name", "kind": webhook|discord|slack|telegram, "url", "options": {...}, "rate_per_minute"}"""
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    data = request.json or {}
+    kind, url, options = data.get('kind', 'webhook'), data.get('url'), data.get('options') or {}
+    try:
+        validate_sink(kind, url, options)
+        rate = data.get('rate_per_minute')
+        rate = float(rate) if rate is not None else None
+        if rate is not None and rate <= 0:
+            raise ValueError("rate_per_minute musi być dodatni")
+        sink_id = storage.add_notification_sink(data.get('name') or kind, kind, url, options, rate)
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    if notifier:
+        notifier.reload()
+    return jsonify({"status": "ok", "message": "Odbiorca dodany", "id": sink_id})
+
+
+@app.route('/notifications/sinks/<int:sink_id>', methods=['DELETE'])
+def notification_sink_delete(sink_id):
+    """Usuwa odbiorcę razem z jego regułami"""
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    try:
+        if not storage.remove_notification_sink(sink_id):
+            return jsonify({"status": "error", "message": "Nie ma takiego odbiorcy"}), 404
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    if notifier:
+        notifier.reload()
+    return jsonify({"status": "ok", "message": "Odbiorca usunięty"})
+
+
+@app.route('/notifications/sinks/<int:sink_id>/test', methods=['POST'])
+def notification_sink_test(sink_id):
+    """Wiadomość próbna z pominięciem reguł; wychodzi z następną paczką odbiorcy.
+
+    W workerze trafia do kolejki w bazie - kolektor podejmuje ją w ciągu notify.SYNC_INTERVAL s.
+    """
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    try:
+        if not any(sink['id'] == sink_id for sink in storage.notification_sinks()):
+            return jsonify({"status": "error", "message": "Nie ma takiego odbiorcy"}), 404
+        if notifier is not None:
+            notifier.reload()
+            notifier.test(sink_id)
+        else:
+            storage.queue_notification_test(sink_id)
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    return jsonify({"status": "ok", "message": "Wiadomość testowa w kolejce"}), 202
+
+
+@app.route('/notifications/rules', methods=['POST'])
+def notification_rule_create():
+    """Body: {"name", "events": ["die", "oom", "restart_loop", "unhealthy", "healthy"], "sink_id",
+    "host_id", "project", "container": "web-*"} - pominięte filtry pasują do wszystkiego
+    """
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    data = request.json or {}
+    events = data.get('events') or []
+    if isinstance(events, str):
+        events = [event.strip() for event in events.split(',') if event.strip()]
+    try:
+        validate_rule(events, data.get('project'), data.get('container'), data.get('host_id'))
+        if not any(sink['id'] == data.get('sink_id') for sink in storage.notification_sinks()):
+            return jsonify({"status": "error", "message": "Nie ma takiego odbiorcy"}), 404
+        rule_id = storage.add_notification_rule(data.get('name') or ','.join(events), events, data['sink_id'],
+                                                data.get('host_id'), data.get('project') or None,
+                                                data.get('container') or None)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    if notifier:
+        notifier.reload()
+    return jsonify({"status": "ok", "message": "Reguła dodana", "id": rule_id})
+
+
+@app.route('/notifications/rules/<int:rule_id>', methods=['DELETE'])
+def notification_rule_delete(rule_id):
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    try:
+        if not storage.remove_notification_rule(rule_id):
+            return jsonify({"status": "error", "message": "Nie ma takiej reguły"}), 404
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    if notifier:
+        notifier.reload()
+    return jsonify({"status": "ok", "message": "Reguła usunięta"})
+
+
 # ============ KONTENERY - TWORZENIE ============
 
 @app.route('/container/create', methods=['POST'])
@@ -332,6 +1112,7 @@ def container_create():
     if 'user' not in session:
         return jsonify({"error": "unauthorized"}), 401
 
+    client = action_client()
     try:
         data = request.json
         image = data.get('image')
@@ -345,12 +1126,6 @@ def container_create():
         if not image:
             return jsonify({"status": "error", "message": "Obraz jest wymagany"}), 400
 
-        try:
-            client.images.get(image)
-        except docker.errors.ImageNotFound:
-            print(f"📥 Pobieranie obrazu: {image}")
-            client.images.pull(image)
-
         port_bindings = {}
         if ports:
             for container_port, host_port in ports.items():
@@ -360,26 +1135,61 @@ def container_create():
         if restart_policy == "on-failure":
             restart_config["MaximumRetryCount"] = 5
 
-        container = client.containers.run(
-            image=image,
-            name=name if name else None,
-            ports=port_bindings if port_bindings else None,
-            environment=env if env else None,
-            volumes=volumes if volumes else None,
-            restart_policy=restart_config,
-            network=network if network else None,
-            detach=True
-        )
+        options = {
+            "name": name if name else None,
+            "ports": port_bindings if port_bindings else None,
+            "environment": env if env else None,
+            "volumes": volumes if volumes else None,
+            "restart_policy": restart_config,
+            "network": network if network else None
+        }
+
+        try:
+            client.images.get(image)
+        except docker.errors.ImageNotFound:
+            # Brak obrazu - pobieranie może trwać minuty, więc idzie do zadania w tle. Pull to osobne
+            # zadanie z kluczem obrazu (wspólne z /image/pull i innymi tworzeniami), zakolejkowane
+            # przed tworzeniem - pula wykonuje je po kolei, więc tworzenie nie czeka na nie w nieskończoność
+            pull, pull_created = jobs.submit('pull', image, pull_image, client, image, dedup_key=pull_key(image))
+            try:
+                job, _ = jobs.submit('container_create', name or image, create_container_job, client, image,
+                                     options, pull)
+            except JobQueueFull:
+                # Nikt nie czekałby na to pobieranie - nie zajmuje kolejki na darmo
+                if pull_created:
+                    jobs.cancel(pull)
+                raise
+            return jsonify({
+                "status": "ok",
+                "message": f"Pobieranie obrazu {image}, kontener zostanie utworzony po pobraniu",
+                "job": job.id
+            }), 202
+
+        container = client.containers.run(image=image, detach=True, **options)
 
         return jsonify({
             "status": "ok",
             "message": f"Kontener {container.name} utworzony i uruchomiony",
             "id": container.short_id
         })
+    except JobQueueFull as e:
+        return jsonify({"status": "error", "message": str(e)}), 429
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
+def create_container_job(job, client, image, options, pull):
+    if not pull.finished:
+        job.log(f"⏳ Czekam na pobieranie {image} (zadanie {pull.id})")
+    job.wait_for(pull)
+    if pull.status == 'error':
+        raise RuntimeError(pull.message)
+
+    container = client.containers.run(image=image, detach=True, **options)
+    job.message = f"Kontener {container.name} utworzony i uruchomiony"
+    return {"id": container.short_id}
+
+
 # ============ OBRAZY ============
 
 @app.route('/image/pull', methods=['POST'])
@@ -387,6 +1197,7 @@ def image_pull():
     if 'user' not in session:
         return jsonify({"error": "unauthorized"}), 401
 
+    client = action_client()
     try:
         data = request.json
         image = data.get('image')
@@ -394,10 +1205,11 @@ def image_pull():
         if not image:
             return jsonify({"status": "error", "message": "Nazwa obrazu jest wymagana"}), 400
 
-        print(f"📥 Pobieranie obrazu: {image}")
-        client.images.pull(image)
-
-        return jsonify({"status": "ok", "message": f"Obraz {image} pobrany"})
+        job, created = jobs.submit('pull', image, pull_image, client, image, dedup_key=pull_key(image))
+        message = f"Pobieranie obrazu {image}" if created else f"Obraz {image} jest już pobierany"
+        return jsonify({"status": "ok", "message": message, "job": job.id}), 202
+    except JobQueueFull as e:
+        return jsonify({"status": "error", "message": str(e)}), 429
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
@@ -406,6 +1218,7 @@ def image_pull():
 def image_remove(image_id):
     if 'user' not in session:
         return jsonify({"error": "unauthorized"}), 401
+    client = action_client()
     try:
         client.images.remove(image_id, force=True)
         return jsonify({"status": "ok", "message": f"Obraz usunięty"})
@@ -419,6 +1232,7 @@ def image_remove(image_id):
 def network_create():
     if 'user' not in session:
         return jsonify({"error": "unauthorized"}), 401
+    client = action_client()
     try:
         data = request.json
         name = data.get('name')
@@ -437,6 +1251,7 @@ def network_create():
 def network_remove(network_id):
     if 'user' not in session:
         return jsonify({"error": "unauthorized"}), 401
+    client = action_client()
     try:
         network = client.networks.get(network_id)
         name = network.name
@@ -452,6 +1267,7 @@ def network_remove(network_id):
 def volume_create():
     if 'user' not in session:
         return jsonify({"error": "unauthorized"}), 401
+    client = action_client()
     try:
         data = request.json
         name = data.get('name')
@@ -469,6 +1285,7 @@ def volume_create():
 def volume_remove(volume_name):
     if 'user' not in session:
         return jsonify({"error": "unauthorized"}), 401
+    client = action_client()
     try:
         volume = client.volumes.get(volume_name)
         volume.remove()
@@ -478,12 +1295,40 @@ def volume_remove(volume_name):
 
 
 # ============ STACKS ============
+# Operacje na jednym stacku idą po kolei (stacks.lock), na różnych - równolegle.
+# Zajęty stack dłużej niż LOCK_TIMEOUT to 409.
+
+@app.route('/stacks')
+def stack_list():
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    try:
+        return jsonify({"stacks": stacks.list()})
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+@app.route('/stack/<name>')
+def stack_detail(name):
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    try:
+        stack = stacks.describe(name)
+        if not stack['compose'] and not stack['containers']:
+            return jsonify({"status": "error", "message": f"Stack {name} nie istnieje"}), 404
+        return jsonify(stack)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 
 @app.route('/stack/create', methods=['POST'])
 def stack_create():
     if 'user' not in session:
         return jsonify({"error": "unauthorized"}), 401
 
+    client = action_client()
     try:
         data = request.json
         name = data.get('name')
@@ -492,32 +1337,161 @@ def stack_create():
         if not name or not compose_content:
             return jsonify({"status": "error", "message": "Nazwa i konfiguracja są wymagane"}), 400
 
-        # Waliduj YAML
+        # Waliduj YAML; z tej samej konfiguracji bierzemy obrazy do pobrania
         try:
-            yaml.safe_load(compose_content)
+            images = compose_images(yaml.safe_load(compose_content))
         except yaml.YAMLError as e:
             return jsonify({"status": "error", "message": f"Nieprawidłowy YAML: {e}"}), 400
+        warm_hosts = prewarm_hosts(data.get('prewarm'))
+
+        # Zapisz docker-compose.yml - nie w trakcie innej operacji na tym stacku
+        with stacks.lock(name):
+            compose_file = stacks.write(name, compose_content)
+
+        # Pobierz brakujące obrazy i uruchom docker-compose w tle, wyjście trafia do zadania
+        job, created = jobs.submit('stack_create', name, deploy_stack_job, client, name, compose_file,
+                                   images, dedup_key=('stack', name))
+        if not created:
+            return jsonify({"status": "error", "message": f"Stack {name} jest właśnie wdrażany", "job": job.id}), 409
+
+        response = {"status": "ok", "message": f"Uruchamianie stacka {name}", "job": job.id}
+        if warm_hosts:
+            response['prewarm_job'] = submit_prewarm(name, images, warm_hosts).id
+        return jsonify(response), 202
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except StackBusy as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
+    except JobQueueFull as e:
+        return jsonify({"status": "error", "message": str(e)}), 429
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+def deploy_stack_job(job, client, name, compose_file, images):
+    # Pobieranie poza blokadą - inne operacje na stacku nie czekają na rejestr
+    missing = missing_images(images, inventory)
+    if missing:
+        job.log(f"📥 Brakujące obrazy: {len(missing)} z {len(images)}")
+        _pulled, failed = pull_images(job, client, missing)
+        if failed:
+            # compose up spróbuje jeszcze raz i zgłosi właściwy błąd
+            job.log(f"⚠️ Nie udało się pobrać {len(failed)} obrazów, compose spróbuje ponownie")
+    with stacks.lock(name):
+        run_command(job, ['docker', 'compose', '-p', name, '-f', compose_file, 'up', '-d'])
+    job.message = f"Stack {name} uruchomiony"
+
+
+def prewarm_hosts(selection):
+    """Hosty do rozgrzania: True = wszystkie zdalne z zamkniętym bezpiecznikiem, lista = wybrane id"""
+    if not selection:
+        return []
+    if selection is True:
+        return [host for host in registry.hosts() if not host.is_local and host.breaker.closed]
+    if not isinstance(selection, list):
+        raise ValueError("prewarm to true albo lista id hostów")
+    hosts = [registry.get(host_id) for host_id in selection]
+    if None in hosts:
+        raise ValueError("Nieznany host w prewarm")
+    return hosts
+
+
+def submit_prewarm(name, images, hosts):
+    job, _created = jobs.submit('stack_prewarm', name, prewarm_stack_job, name, images, hosts,
+                                dedup_key=('prewarm', name))
+    return job
+
+
+def prewarm_stack_job(job, name, images, hosts):
+    job.log(f"🔥 Rozgrzewanie {len(images)} obrazów stacka {name} na {len(hosts)} hostach")
+    results = prewarm(job, hosts, list(images))
+    pulled = sum(len(result.get('pulled', ())) for result in results.values())
+    job.message = f"Obrazy stacka {name} gotowe na {len(hosts)} hostach (pobrano {pulled})"
+    return results
+
+
+@app.route('/stack/<name>/images')
+def stack_images(name):
+    """Plan rozgrzania: które obrazy stacka są już na każdym hoście, bez wywołań Dockera"""
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    try:
+        compose = stacks.compose(name)
+        if compose is None:
+            return jsonify({"status": "error", "message": f"Stack {name} nie ma pliku compose"}), 404
+        return jsonify({
+            "name": name,
+            "hosts": [dict(image_plan(compose.images, host.inventory), id=host.id, name=host.name,
+                           is_local=host.is_local, connected=host.inventory is not None)
+                      for host in registry.hosts()]
+        })
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
 
-        # Utwórz folder stacka
-        stack_dir = os.path.join(STACKS_PATH, name)
-        os.makedirs(stack_dir, exist_ok=True)
 
-        # Zapisz docker-compose.yml
-        compose_file = os.path.join(stack_dir, 'docker-compose.yml')
-        with open(compose_file, 'w') as f:
-            f.write(compose_content)
+@app.route('/stack/<name>/prewarm', methods=['POST'])
+def stack_prewarm(name):
+    """Pobiera obrazy stacka na inne hosty z wyprzedzeniem. Body: {"hosts": [id]} (domyślnie wszystkie zdalne)"""
+    if 'user' not in session:
+        return jsonify({"error": "unauthorized"}), 401
+    try:
+        compose = stacks.compose(name)
+        if compose is None:
+            return jsonify({"status": "error", "message": f"Stack {name} nie ma pliku compose"}), 404
+        hosts = prewarm_hosts((request.get_json(silent=True) or {}).get('hosts') or True)
+        if not hosts:
+            return jsonify({"status": "error", "message": "Brak hostów do rozgrzania"}), 400
+        job = submit_prewarm(name, compose.images, hosts)
+        return jsonify({"status": "ok", "message": f"Rozgrzewanie obrazów stacka {name}", "job": job.id}), 202
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except JobQueueFull as e:
+        return jsonify({"status": "error", "message": str(e)}), 429
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
 
-        # Uruchom docker-compose
-        result = subprocess.run(
-            ['docker', 'compose', '-p', name, '-f', compose_file, 'up', '-d'],
-            capture_output=True,
-            text=True
-        )
 
-        if result.returncode != 0:
-            return jsonify({"status": "error", "message": result.stderr}), 500
+def bulk_waves(containers, action):
+    return plan_waves(containers, action, stacks.dependencies)
 
-        return jsonify({"status": "ok", "message": f"Stack {name} uruchomiony"})
+
+def bulk_targets(containers, action):
+    """Pomija kontenery, na których akcja nic by nie zmieniła"""
+    if action == 'start':
+        return [c for c in containers if c['status'] != 'running']
+    if action in ('stop', 'restart'):
+        return [c for c in containers if c['status'] != 'stopped']
+    return containers
+
+
+def stack_bulk_response(name, action, message):
+    containers = bulk_targets(stacks.containers(name), action)
+    parallelism = request.args.get('parallelism', BULK_PARALLELISM, type=int)
+    results = list(run_bulk(action_client(), bulk_waves(containers, action), action, parallelism=parallelism))
+
+    failed = [r for r in results if r['status'] == 'error']
+    if failed:
+        return jsonify({
+            "status": "error",
+            "message": f"Stack {name}: {len(failed)} z {len(results)} kontenerów z błędem",
+            "results": results
+        }), 500
+    return jsonify({"status": "ok", "message": message, "results": results})
+
+
+def stack_operation(name, operation):
+    """Wykonuje operację pod blokadą stacka; błędy nazwy i zajętości jako 400/409"""
+    try:
+        with stacks.lock(name):
+            return operation()
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    except StackBusy as e:
+        return jsonify({"status": "error", "message": str(e)}), 409
+    except HostUnavailable as e:
+        return jsonify({"status": "error", "message": str(e)}), 503
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
@@ -526,76 +1500,58 @@ def stack_create():
 def stack_start(name):
     if 'user' not in session:
         return jsonify({"error": "unauthorized"}), 401
-    try:
-        stack_dir = os.path.join(STACKS_PATH, name)
-        compose_file = os.path.join(stack_dir, 'docker-compose.yml')
 
-        if os.path.exists(compose_file):
-            result = subprocess.run(
-                ['docker', 'compose', '-p', name, '-f', compose_file, 'start'],
+    def start():
+        if stacks.compose(name) is None:
+            # Stack nie ma pliku compose - uruchom kontenery z projektu
+            return stack_bulk_response(name, 'start', f"Stack {name} uruchomiony")
+        with metrics.timed('subprocess docker compose'):
+            subprocess.run(
+                ['docker', 'compose', '-p', name, '-f', stacks.compose_path(name), 'start'],
                 capture_output=True, text=True
             )
-        else:
-            # Stack nie ma pliku compose - uruchom kontenery z projektu
-            containers = client.containers.list(all=True, filters={'label': f'com.docker.compose.project={name}'})
-            for c in containers:
-                c.start()
-
         return jsonify({"status": "ok", "message": f"Stack {name} uruchomiony"})
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
+
+    return stack_operation(name, start)
 
 
 @app.route('/stack/<name>/stop', methods=['POST'])
 def stack_stop(name):
     if 'user' not in session:
         return jsonify({"error": "unauthorized"}), 401
-    try:
-        containers = client.containers.list(filters={'label': f'com.docker.compose.project={name}'})
-        for c in containers:
-            c.stop()
-        return jsonify({"status": "ok", "message": f"Stack {name} zatrzymany"})
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
+    return stack_operation(name, lambda: stack_bulk_response(name, 'stop', f"Stack {name} zatrzymany"))
 
 
 @app.route('/stack/<name>/restart', methods=['POST'])
 def stack_restart(name):
     if 'user' not in session:
         return jsonify({"error": "unauthorized"}), 401
-    try:
-        containers = client.containers.list(filters={'label': f'com.docker.compose.project={name}'})
-        for c in containers:
-            c.restart()
-        return jsonify({"status": "ok", "message": f"Stack {name} zrestartowany"})
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
+    return stack_operation(name, lambda: stack_bulk_response(name, 'restart', f"Stack {name} zrestartowany"))
 
 
 @app.route('/stack/<name>/remove', methods=['POST'])
 def stack_remove(name):
     if 'user' not in session:
         return jsonify({"error": "unauthorized"}), 401
-    try:
-        stack_dir = os.path.join(STACKS_PATH, name)
-        compose_file = os.path.join(stack_dir, 'docker-compose.yml')
 
-        if os.path.exists(compose_file):
+    def remove():
+        if stacks.compose(name) is None:
+            return stack_bulk_response(name, 'remove', f"Stack {name} usunięty")
+        with metrics.timed('subprocess docker compose'):
             subprocess.run(
-                ['docker', 'compose', '-p', name, '-f', compose_file, 'down', '-v'],
+                ['docker', 'compose', '-p', name, '-f', stacks.compose_path(name), 'down', '-v'],
                 capture_output=True, text=True
             )
-            os.remove(compose_file)
-            os.rmdir(stack_dir)
-        else:
-            containers = client.containers.list(all=True, filters={'label': f'com.docker.compose.project={name}'})
-            for c in containers:
-                c.remove(force=True)
-
+        stacks.delete(name)
         return jsonify({"status": "ok", "message": f"Stack {name} usunięty"})
-    except Exception as e:
-        return jsonify({"status": "error", "message": str(e)}), 500
+
+    return stack_operation(name, remove)
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000)
+    create_app(sys.argv[1] if len(sys.argv) > 1 else None)
+    if app.config['ORBIT_ROLE'] == 'collector':
+        # Kolektor nie obsługuje HTTP - utrzymuje inwentarz, statystyki i snapshoty
+        threading.Event().wait()
+    else:
+        app.run(host='0.0.0.0', port=5000)
@@ -0,0 +1,449 @@
+import json
+import os
+import queue
+import random
+import re
+import socketserver
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+
+API_VERSION = '1.45'
+# Warstwa bazowa wspólna dla wszystkich obrazów (SharedSize w /system/df)
+BASE_LAYER = 5 * 1024 * 1024
+
+# Historia logów każdego kontenera (linie co sekundę przed startem floty)
+# i odstęp między nowymi liniami przy follow=1
+LOG_HISTORY = 50
+LOG_INTERVAL = 0.1
+# Czas "pobierania" jednej warstwy w POST /images/create
+PULL_LAYER_DELAY = 0.1
+PULL_LAYERS = 3
+
+# /v1.45/containers/json -> /containers/json
+VERSION_PREFIX = re.compile(r'^/v[0-9.]+')
+
+
+class FakeFleet:
+    """Zasoby udawanego silnika Dockera w kształcie odpowiedzi Engine API.
+
+    Kontenery dzielą się na projekty compose po równo, część z nich działa
+    (running_ratio). Akcje zmieniają stan i wysyłają zdarzenia do /events,
+    tak jak prawdziwy silnik.
+    """
+
+    def __init__(self, containers=10, images=5, volumes=5, networks=3, projects=2,
+                 running_ratio=0.5, seed=1):
+        rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._subscribers = []
+        now = int(time.time())
+        self.started = time.time()
+
+        self.images = {}
+        for i in range(max(images, 1)):
+            image_id = 'sha256:' + f'{rng.getrandbits(256):064x}'
+            self.images[image_id] = {
+                'Id': image_id,
+                'RepoTags': [f'bench/image-{i}:latest'],
+                'RepoDigests': [],
+                'Size': rng.randint(5, 900) * 1024 * 1024,
+                'Created': now - rng.randint(0, 90 * 86400),
+                'Labels': {}
+            }
+        image_ids = list(self.images)
+
+        self.containers = {}
+        for i in range(containers):
+            container_id = f'{rng.getrandbits(256):064x}'
+            labels = {}
+            if projects:
+                project = f'stack{i % projects}'
+                labels = {
+                    'com.docker.compose.project': project,
+                    'com.docker.compose.project.working_dir': f'/srv/{project}',
+                    'com.docker.compose.service': f'svc{i // projects % 5}'
+                }
+            image_id = image_ids[i % len(image_ids)]
+            self.containers[container_id] = {
+                'Id': container_id,
+                'Names': [f'/bench-{i}'],
+                'Image': self.images[image_id]['RepoTags'][0],
+                'ImageID': image_id,
+                'State': 'running' if rng.random() < running_ratio else 'exited',
+                'Status': '',
+                'Created': now - rng.randint(0, 30 * 86400),
+                'Labels': labels
+            }
+
+        self.volumes = [{'Name': f'bench-volume-{i}', 'Driver': 'local',
+                         'Mountpoint': f'/var/lib/docker/volumes/bench-volume-{i}/_data', 'Labels': {}}
+                        for i in range(volumes)]
+        self.networks = [{'Id': f'{rng.getrandbits(256):064x}', 'Name': name,
+                          'Driver': 'bridge' if i else 'host', 'Scope': 'local'}
+                         for i, name in enumerate(['host', 'bridge'] + [f'bench-net-{i}' for i in range(max(networks - 2, 0))])]
+
+    # ---- system df ----
+
+    def system_df(self):
+        """GET /system/df: każdy obraz dzieli z pozostałymi warstwę bazową BASE_LAYER"""
+        base = BASE_LAYER if len(self.images) > 1 else 0
+        with self._lock:
+            containers = list(self.containers.values())
+        in_use = {}
+        for c in containers:
+            in_use[c['ImageID']] = in_use.get(c['ImageID'], 0) + 1
+        images = [dict(img, SharedSize=base, Containers=in_use.get(img['Id'], 0)) for img in self.images.values()]
+        volume_names = [v['Name'] for v in self.volumes]
+        mounts = {c['Id']: volume_names[i] for i, c in enumerate(containers[:len(volume_names)])}
+        return {
+            'LayersSize': sum(img['Size'] - base for img in images) + base,
+            'Images': images,
+            'Containers': [dict(c, SizeRw=4096 * (i + 1), SizeRootFs=self.images[c['ImageID']]['Size'],
+                                Mounts=[{'Type': 'volume', 'Name': mounts[c['Id']]}] if c['Id'] in mounts else [])
+                           for i, c in enumerate(containers)],
+            'Volumes': [dict(v, UsageData={'Size': 1024 * 1024 * (i + 1),
+                                           'RefCount': int(v['Name'] in mounts.values())})
+                        for i, v in enumerate(self.volumes)],
+            'BuildCache': []
+        }
+
+    # ---- kontenery ----
+
+    def find(self, ref):
+        with self._lock:
+            if ref in self.containers:
+                return self.containers[ref]
+            for c in self.containers.values():
+                if c['Id'].startswith(ref) or c['Names'][0] == '/' + ref:
+                    return c
+        return None
+
+    def list_containers(self, filters):
+        ids = filters.get('id') or []
+        with self._lock:
+            containers = list(self.containers.values())
+        if ids:
+            containers = [c for c in containers if any(c['Id'].startswith(ref) for ref in ids)]
+        return containers
+
+    def inspect(self, c):
+        return {
+            'Id': c['Id'],
+            'Name': c['Names'][0],
+            'Image': c['ImageID'],
+            'Created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(c['Created'])),
+            'State': {'Status': c['State'], 'Running': c['State'] == 'running'},
+            'Config': {'Image': c['Image'], 'Labels': c['Labels'], 'Tty': False}
+        }
+
+    def act(self, c, action):
+        with self._lock:
+            if action == 'destroy':
+                self.containers.pop(c['Id'], None)
+            else:
+                c['State'] = 'exited' if action == 'stop' else 'running'
+        if action in ('stop', 'restart'):
+            # Jak dockerd: "kill" z sygnałem, potem "die" z kodem wyjścia przed "stop"/"restart"
+            self.emit(c, 'kill', signal='15')
+            self.emit(c, 'die', exitCode='0')
+        self.emit(c, action)
+
+    def emit(self, c, action, **attributes):
+        """Zdarzenie kontenera z atrybutami jak w dockerd (name, image, etykiety compose);
+        np. emit(c, 'die', exitCode='1'), emit(c, 'oom'), emit(c, 'health_status: unhealthy')"""
+        attributes = dict(c['Labels'], name=c['Names'][0][1:], image=c['Image'], **attributes)
+        self.publish({'Type': 'container', 'Action': action, 'Actor': {'ID': c['Id'], 'Attributes': attributes}})
+
+    # ---- obrazy ----
+
+    def add_image(self, ref):
+        image_id = 'sha256:' + f'{random.getrandbits(256):064x}'
+        with self._lock:
+            if any(ref in img['RepoTags'] for img in self.images.values()):
+                return
+            self.images[image_id] = {'Id': image_id, 'RepoTags': [ref], 'RepoDigests': [],
+                                     'Size': 50 * 1024 * 1024, 'Created': int(time.time()), 'Labels': {}}
+        self.publish({'Type': 'image', 'Action': 'pull', 'Actor': {'ID': ref, 'Attributes': {}}})
+
+    # ---- logi ----
+
+    def log_line(self, c, i):
+        status = 500 if i % 7 == 0 else 200
+        return f'{c["Names"][0][1:]} GET /api/items/{i} status={status}'
+
+    def log_history(self, c):
+        return [(self.started - LOG_HISTORY + i, self.log_line(c, i)) for i in range(LOG_HISTORY)]
+
+    # ---- zdarzenia ----
+
+    def publish(self, event):
+        event = dict(event, time=int(time.time()), timeNano=time.time_ns())
+        with self._lock:
+            for subscriber in self._subscribers:
+                subscriber.put(event)
+
+    def subscribe(self):
+        events = queue.Queue()
+        with self._lock:
+            self._subscribers.append(events)
+        return events
+
+    def unsubscribe(self, events):
+        with self._lock:
+            self._subscribers.remove(events)
+
+
+class EngineHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def address_string(self):
+        return 'unix'
+
+    @property
+    def fleet(self):
+        return self.server.fleet
+
+    def send_json(self, body, status=200):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_empty(self, status=204):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def not_found(self, message='page not found'):
+        self.send_json({'message': message}, 404)
+
+    def route(self, method):
+        url = urlparse(self.path)
+        path = VERSION_PREFIX.sub('', url.path)
+        params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            self.rfile.read(length)
+
+        if path == '/events':
+            return self.stream_events(json.loads(params.get('filters') or '{}'))
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if method == 'GET' and path == '/_ping':
+            body = b'OK'
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif method == 'GET' and path == '/version':
+            self.send_json({'ApiVersion': API_VERSION, 'MinAPIVersion': '1.24', 'Version': '26.1.0',
+                            'Os': 'linux', 'Arch': 'amd64'})
+        elif method == 'GET' and path == '/containers/json':
+            filters = json.loads(params.get('filters') or '{}')
+            self.send_json(self.fleet.list_containers(filters))
+        elif method == 'GET' and path == '/images/json':
+            self.send_json(list(self.fleet.images.values()))
+        elif method == 'GET' and path == '/volumes':
+            self.send_json({'Volumes': self.fleet.volumes, 'Warnings': []})
+        elif method == 'GET' and path == '/networks':
+            self.send_json(self.fleet.networks)
+        elif method == 'GET' and path == '/system/df':
+            self.send_json(self.fleet.system_df())
+        elif method == 'GET' and re.fullmatch(r'/containers/[^/]+/logs', path):
+            container = self.fleet.find(path.split('/')[2])
+            if container is None:
+                return self.not_found('No such container')
+            self.stream_logs(container, params)
+        elif method == 'POST' and path == '/images/create':
+            self.pull_image(params.get('fromImage', ''), params.get('tag') or 'latest')
+        elif method == 'POST' and re.fullmatch(r'/containers/[^/]+/exec', path):
+            if self.fleet.find(path.split('/')[2]) is None:
+                return self.not_found('No such container')
+            self.send_json({'Id': f'{random.getrandbits(256):064x}'}, status=201)
+        elif method == 'POST' and re.fullmatch(r'/exec/[^/]+/start', path):
+            self.echo_exec()
+        elif method == 'POST' and re.fullmatch(r'/exec/[^/]+/resize', path):
+            self.send_empty(201)
+        else:
+            match = re.fullmatch(r'/containers/([^/]+)(?:/(json|start|stop|restart))?', path)
+            container = self.fleet.find(match.group(1)) if match else None
+            if container is None:
+                return self.not_found('No such container' if match else 'page not found')
+            action = match.group(2)
+            if method == 'GET' and action == 'json':
+                self.send_json(self.fleet.inspect(container))
+            elif method == 'POST' and action in ('start', 'stop', 'restart'):
+                self.fleet.act(container, action)
+                self.send_empty()
+            elif method == 'DELETE' and action is None:
+                self.fleet.act(container, 'destroy')
+                self.send_empty()
+            else:
+                self.not_found()
+
+    def stream_events(self, filters):
+        """Filtry type i event jak w dockerd; health_status pasuje też do 'health_status: healthy'"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self.wfile.flush()
+        events = self.fleet.subscribe()
+        try:
+            while not self.server.closing.is_set():
+                try:
+                    event = events.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if 'type' in filters and event['Type'] not in filters['type']:
+                    continue
+                if 'event' in filters and event['Action'].split(':')[0] not in filters['event']:
+                    continue
+                chunk = (json.dumps(event) + '\n').encode()
+                self.wfile.write(f'{len(chunk):x}\r\n'.encode() + chunk + b'\r\n')
+                self.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            self.fleet.unsubscribe(events)
+            self.close_connection = True
+
+    def pull_image(self, repository, tag):
+        """Strumień postępu jak przy `docker pull`: PULL_LAYERS warstw po PULL_LAYER_DELAY s; repo 'missing/*' nie istnieje"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def write(event):
+            chunk = (json.dumps(event) + '\r\n').encode()
+            self.wfile.write(f'{len(chunk):x}\r\n'.encode() + chunk + b'\r\n')
+            self.wfile.flush()
+
+        ref = f'{repository}{"@" if tag.startswith("sha256:") else ":"}{tag}'
+        try:
+            write({'status': f'Pulling from {repository}', 'id': tag})
+            if repository.startswith('missing/'):
+                write({'error': f'pull access denied for {repository}'})
+            else:
+                for layer in range(PULL_LAYERS):
+                    time.sleep(PULL_LAYER_DELAY)
+                    write({'status': 'Pull complete', 'progressDetail': {}, 'id': f'{layer:012x}'})
+                self.fleet.add_image(ref)
+                write({'status': f'Status: Downloaded newer image for {ref}'})
+            self.wfile.write(b'0\r\n\r\n')
+        except OSError:
+            pass
+        finally:
+            self.close_connection = True
+
+    def stream_logs(self, container, params):
+        """Logi w formacie multipleksowanym (stdout); follow=1 dopisuje linię co LOG_INTERVAL, póki kontener działa"""
+        since = float(params.get('since') or 0)
+        until = float(params.get('until') or 0)
+        follow = params.get('follow') in ('1', 'true', 'True')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/vnd.docker.multiplexed-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def write(ts, line):
+            stamp = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(ts)) + f'.{int(ts % 1 * 1e9):09d}Z'
+            payload = f'{stamp} {line}\n'.encode()
+            chunk = struct.pack('>BxxxL', 1, len(payload)) + payload
+            self.wfile.write(f'{len(chunk):x}\r\n'.encode() + chunk + b'\r\n')
+            self.wfile.flush()
+
+        history = self.fleet.log_history(container)
+        lines = [(ts, line) for ts, line in history if ts > since]
+        if params.get('tail', 'all') != 'all':
+            lines = lines[-int(params['tail']):] if int(params['tail']) else []
+        if until:
+            # Jak dockerd: until odcina linie dopiero z tego, co zostało po tail
+            lines = [(ts, line) for ts, line in lines if ts <= until]
+        try:
+            for ts, line in lines:
+                write(ts, line)
+            i = len(history)
+            while follow and container['State'] == 'running' and not self.server.closing.is_set():
+                time.sleep(LOG_INTERVAL)
+                write(time.time(), self.fleet.log_line(container, i))
+                i += 1
+            self.wfile.write(b'0\r\n\r\n')
+        except OSError:
+            pass
+        finally:
+            self.close_connection = True
+
+    def echo_exec(self):
+        """Sesja exec z TTY, w której "proces" odsyła wszystko, co dostanie; Ctrl-D kończy"""
+        self.send_response(101)
+        self.send_header('Content-Type', 'application/vnd.docker.raw-stream')
+        self.send_header('Connection', 'Upgrade')
+        self.send_header('Upgrade', 'tcp')
+        self.end_headers()
+        self.wfile.flush()
+        try:
+            while not self.server.closing.is_set():
+                data = self.connection.recv(65536)
+                if not data:
+                    break
+                self.connection.sendall(data.split(b'\x04', 1)[0])
+                if b'\x04' in data:
+                    break
+        except OSError:
+            pass
+        finally:
+            self.close_connection = True
+
+    def do_GET(self):
+        self.route('GET')
+
+    def do_POST(self):
+        self.route('POST')
+
+    def do_DELETE(self):
+        self.route('DELETE')
+
+
+class FakeEngine(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Serwer Engine API na gnieździe unix z opóźnieniem każdego wywołania"""
+
+    daemon_threads = True
+    # Jak dockerd: wiele jednoczesnych połączeń (strumienie logów, statystyk) nie dostaje EAGAIN
+    request_queue_size = 128
+
+    def __init__(self, socket_path, fleet, latency=0.0):
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        super().__init__(socket_path, EngineHandler)
+        self.socket_path = socket_path
+        self.fleet = fleet
+        self.latency = latency
+        self.closing = threading.Event()
+
+    @property
+    def url(self):
+        return f'unix://{self.socket_path}'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='fake-engine', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.closing.set()
+        self.shutdown()
+        self.server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
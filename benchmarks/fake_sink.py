@@ -0,0 +1,73 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class SinkHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        status, retry_after = self.server.next_status()
+        if status == 200:
+            self.server.record(json.loads(body or b'null'))
+        self.send_response(status)
+        if retry_after is not None:
+            self.send_header('Retry-After', str(retry_after))
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+class FakeSink(ThreadingHTTPServer):
+    """Odbiorca webhooków na 127.0.0.1 zapisujący przyjęte wiadomości.
+
+    fail(n, status, retry_after) odrzuca n kolejnych żądań - do sprawdzania
+    ponowień i Retry-After bez prawdziwego Discorda czy Slacka. attempts to
+    (czas monotoniczny, status) każdego żądania - z nich widać odstępy ponowień.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, port=0):
+        super().__init__(('127.0.0.1', port), SinkHandler)
+        self.messages = []
+        self.requests = 0
+        self.attempts = []
+        self._failures = []
+        self._lock = threading.Condition()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}/hook'
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name='fake-sink', daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def fail(self, times=1, status=500, retry_after=None):
+        with self._lock:
+            self._failures.extend([(status, retry_after)] * times)
+
+    def next_status(self):
+        with self._lock:
+            self.requests += 1
+            status, retry_after = self._failures.pop(0) if self._failures else (200, None)
+            self.attempts.append((time.monotonic(), status))
+            return status, retry_after
+
+    def record(self, payload):
+        with self._lock:
+            self.messages.append(payload)
+            self._lock.notify_all()
+
+    def wait_for(self, count, timeout=10):
+        """Czeka, aż przyjdzie `count` wiadomości; zwraca je"""
+        with self._lock:
+            self._lock.wait_for(lambda: len(self.messages) >= count, timeout)
+            return list(self.messages)
@@ -0,0 +1,157 @@
+"""Sprawdzenie wysyłki powiadomień na udawanym odbiorcy.
+
+    python -m benchmarks.notify_check
+
+Zdarzenia idą przez Notifier.dispatch (reguły z prawdziwej bazy SQLite) do
+FakeSink. Sprawdzamy trzy rzeczy: podział na paczki (BATCH_MAX), token bucket
+z wyrzucaniem zdarzeń z pełnej kolejki oraz odstępy ponowień (backoff,
+Retry-After, błędy trwałe). Czasy są skrócone, więc całość trwa kilkanaście sekund;
+przy niezgodności kończy się AssertionError.
+"""
+import os
+import tempfile
+import time
+
+import notify
+from benchmarks.fake_sink import FakeSink
+from storage import Storage
+
+# Skrócone czasy z notify - oczekiwane wartości liczymy z tych samych stałych
+BATCH_WINDOW = 0.2
+BATCH_MAX = 10
+SINK_QUEUE = 30
+RETRY_BACKOFF = 0.2
+# Odbiorca do testu limitu: token co 60 / RATE_LIMITED s
+RATE_LIMITED = 30
+# Odbiorcy bez limitu w praktyce
+RATE_UNLIMITED = 6000
+# Zapas na opóźnienia wątków i HTTP przy porównywaniu odstępów
+SLACK = 0.5
+TIMEOUT = 15
+
+
+def event(project, n):
+    return {"kind": 'die', "host": 1, "host_name": "bench", "container_id": f'{n:012x}',
+            "container": f'{project}-{n}', "project": project, "service": None, "image": None,
+            "exit_code": '1', "time": int(time.time())}
+
+
+def burst(notifier, project, count, start=0):
+    for n in range(start, start + count):
+        notifier.dispatch(event(project, n))
+
+
+def wait_until(predicate, timeout=TIMEOUT):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("Przekroczony czas oczekiwania")
+        time.sleep(0.02)
+
+
+def batch_sizes(sink):
+    return [len(message['events']) for message in sink.messages]
+
+
+def gaps(times):
+    return [round(b - a, 3) for a, b in zip(times, times[1:])]
+
+
+def check_batching(notifier, fake):
+    """BATCH_MAX * 2 + 3 zdarzeń naraz (mieści się w SINK_QUEUE): dwie pełne paczki i reszta po BATCH_WINDOW"""
+    total = BATCH_MAX * 2 + 3
+    burst(notifier, 'batch', total)
+    fake.wait_for(3)
+    time.sleep(BATCH_WINDOW + SLACK)
+    assert batch_sizes(fake) == [BATCH_MAX, BATCH_MAX, 3], batch_sizes(fake)
+    return {"events": total, "messages": batch_sizes(fake)}
+
+
+def check_rate_limit(notifier, fake, sink):
+    """Po wyczerpaniu RATE_BURST tokenów wątek czeka na token, a kolejka się przepełnia"""
+    interval = 60 / RATE_LIMITED
+    burst(notifier, 'rate', BATCH_MAX * notify.RATE_BURST)
+    fake.wait_for(notify.RATE_BURST)
+    # Jedno zdarzenie: wątek bierze je do paczki i staje na tokenie z pustą kolejką
+    burst(notifier, 'rate', 1, start=100)
+    time.sleep(BATCH_WINDOW + 0.3)
+    overflow = 15
+    burst(notifier, 'rate', SINK_QUEUE + overflow, start=200)
+    assert sink.dropped == overflow, sink.dropped
+
+    queued = SINK_QUEUE // BATCH_MAX
+    messages = fake.wait_for(notify.RATE_BURST + 1 + queued, timeout=interval * (queued + 1) + TIMEOUT)
+    sizes = batch_sizes(fake)
+    assert sizes == [BATCH_MAX] * notify.RATE_BURST + [1] + [BATCH_MAX] * queued, sizes
+    assert f"Pominięto {overflow} zdarzeń" in messages[notify.RATE_BURST]['text']
+    times = [at for at, status in fake.attempts if status == 200]
+    limited = gaps(times[notify.RATE_BURST - 1:])
+    assert all(gap >= interval - 0.1 for gap in limited), limited
+    assert sum(sizes) + sink.dropped == BATCH_MAX * notify.RATE_BURST + 1 + SINK_QUEUE + overflow
+    return {"messages": sizes, "dropped": sink.dropped, "limited_gaps_s": limited}
+
+
+def check_retries(notifier, fake, sink):
+    """Backoff RETRY_BACKOFF * 2^n, Retry-After przy 429, brak ponowień przy 4xx, limit MAX_RETRIES"""
+    result = {}
+
+    def attempt(name, failures, expected_delays, delivered):
+        fake.attempts.clear()
+        messages, failed = len(fake.messages), sink.failed_events
+        for status, times, retry_after in failures:
+            fake.fail(times, status, retry_after)
+        burst(notifier, 'retry', 1)
+        wait_until(lambda: len(fake.messages) > messages or sink.failed_events > failed)
+        time.sleep(SLACK)
+        delays = gaps([at for at, _status in fake.attempts])
+        assert len(delays) == len(expected_delays), (name, delays)
+        for delay, expected in zip(delays, expected_delays):
+            assert expected - 0.05 <= delay <= expected + SLACK, (name, delays, expected_delays)
+        assert (len(fake.messages) > messages) == delivered, name
+        result[name] = {"requests": len(fake.attempts), "delays_s": delays}
+
+    attempt('backoff', [(500, 2, None)], [RETRY_BACKOFF, RETRY_BACKOFF * 2], True)
+    attempt('retry_after', [(429, 1, 0.6)], [0.6], True)
+    attempt('permanent', [(404, 1, None)], [], False)
+    attempt('exhausted', [(503, notify.MAX_RETRIES + 1, None)],
+            [RETRY_BACKOFF * 2 ** n for n in range(notify.MAX_RETRIES)], False)
+    assert sink.failed_events == 2, sink.failed_events
+    return result
+
+
+def main():
+    notify.BATCH_WINDOW = BATCH_WINDOW
+    notify.BATCH_MAX = BATCH_MAX
+    notify.SINK_QUEUE = SINK_QUEUE
+    notify.RETRY_BACKOFF = RETRY_BACKOFF
+
+    fakes = {name: FakeSink().start() for name in ('batch', 'rate', 'retry')}
+    rates = {'batch': RATE_UNLIMITED, 'rate': RATE_LIMITED, 'retry': RATE_UNLIMITED}
+    notifier = None
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = Storage(os.path.join(tmp, 'orbit.db'))
+        storage.migrate()
+        try:
+            sink_ids = {}
+            for name, fake in fakes.items():
+                sink_ids[name] = storage.add_notification_sink(name, 'webhook', fake.url, {}, rates[name])
+                storage.add_notification_rule(name, ['die'], sink_ids[name], project=name)
+            notifier = notify.Notifier(None, storage)
+            notifier.reload()
+            sinks = {name: notifier.sinks[sink_id] for name, sink_id in sink_ids.items()}
+
+            print("🚀 Paczki...")
+            print(f"✅ {check_batching(notifier, fakes['batch'])}")
+            print("🚀 Limit wiadomości i przepełniona kolejka...")
+            print(f"✅ {check_rate_limit(notifier, fakes['rate'], sinks['rate'])}")
+            print("🚀 Ponowienia...")
+            print(f"✅ {check_retries(notifier, fakes['retry'], sinks['retry'])}")
+        finally:
+            if notifier is not None:
+                notifier.stop()
+            for fake in fakes.values():
+                fake.stop()
+
+
+if __name__ == '__main__':
+    main()
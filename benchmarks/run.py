@@ -0,0 +1,213 @@
+"""Benchmark tras Orbit na udawanym silniku Dockera.
+
+    python -m benchmarks.run --sizes 10,100,1000,10000 --output bench.json
+
+Każdy rozmiar floty idzie w osobnym procesie (czysta pamięć i inwentarz):
+proces startuje FakeEngine na gnieździe unix, importuje app z DOCKER_HOST
+wskazującym na to gniazdo i odpytuje trasy przez klienta testowego Flaska.
+Wynik to jeden dokument JSON - do porównywania między wersjami.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import psutil
+
+from benchmarks.fake_engine import FakeEngine, FakeFleet
+
+DEFAULT_SIZES = (10, 100, 1000, 10000)
+DEFAULT_REQUESTS = 200
+WARMUP_REQUESTS = 5
+# Akcje zmieniają stan floty i są wolniejsze - robimy ich mniej
+ACTION_REQUESTS = 20
+READY_TIMEOUT = 300
+
+
+def fleet_shape(containers, args):
+    """Liczby zasobów dla rozmiaru floty; jawne flagi wygrywają z proporcjami"""
+    return {
+        'containers': containers,
+        'images': args.images if args.images is not None else max(5, containers // 20),
+        'volumes': args.volumes if args.volumes is not None else max(5, containers // 10),
+        'networks': args.networks if args.networks is not None else max(3, containers // 100),
+        'projects': args.projects if args.projects is not None else max(1, containers // 10),
+        'running_ratio': args.running_ratio
+    }
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, round(p / 100 * (len(sorted_values) - 1)))]
+
+
+def rss_mb():
+    return round(psutil.Process().memory_info().rss / (1024 * 1024), 1)
+
+
+def measure(name, count, request, api_calls):
+    """Wykonuje request `count` razy; zwraca rozkład czasu i koszt w wywołaniach Dockera"""
+    for _ in range(WARMUP_REQUESTS):
+        request()
+
+    timings = []
+    errors = 0
+    calls_before = api_calls.total
+    for _ in range(count):
+        started = time.perf_counter()
+        response = request()
+        # Odpowiedzi strumieniowe (NDJSON) liczymy do ostatniego bajtu
+        response.get_data()
+        timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code >= 400:
+            errors += 1
+    calls = api_calls.total - calls_before
+
+    timings.sort()
+    return {
+        "route": name,
+        "requests": count,
+        "errors": errors,
+        "p50_ms": round(percentile(timings, 50), 3),
+        "p99_ms": round(percentile(timings, 99), 3),
+        "mean_ms": round(sum(timings) / len(timings), 3),
+        "max_ms": round(timings[-1], 3),
+        # Razem z wywołaniami, które request wywołał w tle (zdarzenia -> odświeżenie)
+        "docker_calls_per_request": round(calls / count, 2)
+    }
+
+
+def run_size(shape, args):
+    """Jeden rozmiar floty - wywoływane w procesie potomnym"""
+    workdir = tempfile.mkdtemp(prefix='orbit-bench-')
+    fleet = FakeFleet(**shape, seed=args.seed)
+    engine = FakeEngine(os.path.join(workdir, 'docker.sock'), fleet, latency=args.latency_ms / 1000).start()
+
+    os.environ['DOCKER_HOST'] = engine.url
+    os.environ['ORBIT_DB_PATH'] = os.path.join(workdir, 'orbit.db')
+    os.environ['ORBIT_STACKS_PATH'] = os.path.join(workdir, 'stacks')
+    rss_before = rss_mb()
+
+    started = time.perf_counter()
+    import app as orbit
+    orbit.create_app()
+    # Strumienie statystyk (jeden na kontener) mierzyłyby sampler, nie trasy
+    if orbit.stats_sampler is not None:
+        orbit.stats_sampler.stop()
+    if orbit.inventory is None or not orbit.inventory.wait_ready(READY_TIMEOUT):
+        raise RuntimeError("Inwentarz nie wstał na FakeEngine")
+    startup_ms = (time.perf_counter() - started) * 1000
+    rss_ready = rss_mb()
+
+    from docker_calls import api_calls
+
+    client = orbit.app.test_client()
+    with client.session_transaction() as s:
+        s['user'] = 'bench@orbit'
+
+    rng = random.Random(args.seed)
+    ids = [c['Id'][:12] for c in fleet.list_containers({})]
+    stacks = sorted({c['Labels']['com.docker.compose.project']
+                     for c in fleet.list_containers({}) if c['Labels']})
+
+    def status_etag():
+        etag = client.get('/status').headers['ETag']
+        return client.get('/status', headers={'If-None-Match': etag})
+
+    routes = [
+        ('GET /status', args.requests, lambda: client.get('/status')),
+        ('GET /status (If-None-Match)', args.requests, status_etag),
+        ('GET /status?since', args.requests,
+         lambda: client.get(f'/status?since={orbit.inventory.version - 1}')),
+        ('GET /api/containers', args.requests, lambda: client.get('/api/containers?limit=100')),
+        ('GET /api/containers?status&sort', args.requests,
+         lambda: client.get('/api/containers?status=running&sort=-created&limit=100')),
+        ('GET /api/stacks', args.requests, lambda: client.get('/api/stacks?limit=100')),
+        ('GET /hosts/status', args.requests, lambda: client.get('/hosts/status')),
+        ('POST /container/<id>/restart', args.action_requests,
+         lambda: client.post(f'/container/{rng.choice(ids)}/restart')),
+    ]
+    if stacks:
+        routes.append(('POST /stack/<name>/restart', args.action_requests,
+                       lambda: client.post(f'/stack/{rng.choice(stacks)}/restart')))
+
+    results = [measure(name, count, request, api_calls) for name, count, request in routes]
+
+    result = {
+        "orbit_version": orbit.VERSION,
+        "fleet": shape,
+        "latency_ms": args.latency_ms,
+        "startup_ms": round(startup_ms, 1),
+        "reconcile_calls": orbit.inventory.reconcile_calls,
+        "rss_mb": {"baseline": rss_before, "ready": rss_ready, "after": rss_mb()},
+        "routes": results
+    }
+    engine.stop()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tras Orbit na udawanym silniku Dockera")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help="liczby kontenerów, po przecinku")
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help="requestów na trasę odczytu")
+    parser.add_argument('--action-requests', type=int, default=ACTION_REQUESTS, help="requestów na trasę akcji")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="opóźnienie każdego wywołania Engine API")
+    parser.add_argument('--images', type=int)
+    parser.add_argument('--volumes', type=int)
+    parser.add_argument('--networks', type=int)
+    parser.add_argument('--projects', type=int)
+    parser.add_argument('--running-ratio', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="plik wynikowy JSON (domyślnie stdout)")
+    parser.add_argument('--worker', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker is not None:
+        # app pisze logi na stdout, więc wynik procesu potomnego idzie do pliku
+        result = run_size(fleet_shape(args.worker, args), args)
+        with open(args.output, 'w') as f:
+            json.dump(result, f)
+        return
+
+    worker_args = [sys.executable, '-m', 'benchmarks.run', '--requests', str(args.requests),
+                   '--action-requests', str(args.action_requests), '--latency-ms', str(args.latency_ms),
+                   '--running-ratio', str(args.running_ratio), '--seed', str(args.seed)]
+    for name in ('images', 'volumes', 'networks', 'projects'):
+        if getattr(args, name) is not None:
+            worker_args += [f'--{name}', str(getattr(args, name))]
+
+    results = []
+    for size in (int(s) for s in args.sizes.split(',') if s.strip()):
+        print(f"⏱️ Flota {size} kontenerów...", file=sys.stderr)
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            completed = subprocess.run(worker_args + ['--worker', str(size), '--output', output.name],
+                                       capture_output=True, text=True)
+            if completed.returncode != 0:
+                print(completed.stdout + completed.stderr, file=sys.stderr)
+                raise SystemExit(f"❌ Benchmark dla {size} kontenerów nie powiódł się")
+            results.append(json.load(output))
+
+    report = json.dumps({
+        "orbit_version": results[0]['orbit_version'] if results else None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        "results": results
+    }, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+        print(f"✅ Wyniki zapisane w {args.output}", file=sys.stderr)
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Domyślna i maksymalna liczba operacji wykonywanych równolegle
+BULK_PARALLELISM = 8
+MAX_BULK_PARALLELISM = 32
+# Czas na łagodne zatrzymanie kontenera (jak domyślnie w docker stop)
+STOP_TIMEOUT = 10
+
+ACTIONS = ('start', 'stop', 'restart', 'remove')
+# Przy zatrzymywaniu i usuwaniu najpierw idą zależne serwisy, potem ich zależności
+REVERSED_ACTIONS = ('stop', 'remove')
+
+
+def compose_dependencies(config):
+    """{serwis: zbiór serwisów z depends_on} ze sparsowanego pliku compose; {} gdy go brak"""
+    if not config:
+        return {}
+
+    dependencies = {}
+    for name, service in (config.get('services') or {}).items():
+        depends_on = (service or {}).get('depends_on') or []
+        # depends_on bywa listą albo słownikiem z warunkami
+        dependencies[name] = set(depends_on)
+    return dependencies
+
+
+def dependency_levels(dependencies):
+    """Poziom serwisu w grafie depends_on: 0 - bez zależności, n - zależy od poziomu n-1"""
+    levels = {}
+
+    def level(service, path=()):
+        if service in levels:
+            return levels[service]
+        if service in path:
+            # Cykl w depends_on - compose i tak by go odrzucił, tu po prostu go przerywamy
+            return 0
+        deps = dependencies.get(service) or ()
+        levels[service] = max((level(dep, path + (service,)) + 1 for dep in deps), default=0)
+        return levels[service]
+
+    for service in dependencies:
+        level(service)
+    return levels
+
+
+def plan_waves(containers, action, dependencies_for):
+    """Dzieli kontenery na fale wykonywane kolejno; w obrębie fali - równolegle.
+
+    `containers` to lista słowników z kluczami id/name/project/service,
+    `dependencies_for(project)` zwraca graf depends_on stacka.
+    """
+    levels_by_project = {}
+    waves = {}
+    for c in containers:
+        project = c.get('project')
+        if project and project not in levels_by_project:
+            levels_by_project[project] = dependency_levels(dependencies_for(project))
+        level = levels_by_project.get(project, {}).get(c.get('service'), 0)
+        waves.setdefault(level, []).append(c)
+
+    ordered = [waves[level] for level in sorted(waves)]
+    if action in REVERSED_ACTIONS:
+        ordered.reverse()
+    return ordered
+
+
+def perform(client, container_id, action, stop_timeout=STOP_TIMEOUT):
+    api = client.api
+    if action == 'start':
+        api.start(container_id)
+    elif action == 'stop':
+        api.stop(container_id, timeout=stop_timeout)
+    elif action == 'restart':
+        api.restart(container_id, timeout=stop_timeout)
+    elif action == 'remove':
+        api.remove_container(container_id, force=True)
+    else:
+        raise ValueError(f"Nieznana akcja: {action}")
+
+
+def run_bulk(client, waves, action, parallelism=BULK_PARALLELISM, stop_timeout=STOP_TIMEOUT):
+    """Wykonuje akcję falami; zwraca generator wyników w kolejności ukończenia"""
+    parallelism = max(1, min(parallelism, MAX_BULK_PARALLELISM))
+
+    def run(c):
+        started = time.time()
+        try:
+            perform(client, c['id'], action, stop_timeout)
+            status, message = 'ok', None
+        except Exception as e:
+            status, message = 'error', str(e)
+        return {
+            "id": c['id'][:12],
+            "name": c.get('name'),
+            "action": action,
+            "status": status,
+            "message": message,
+            "elapsed": round(time.time() - started, 3)
+        }
+
+    with ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix='orbit-bulk') as executor:
+        for wave in waves:
+            futures = [executor.submit(run, c) for c in wave]
+            for future in as_completed(futures):
+                yield future.result()
@@ -0,0 +1,276 @@
+import threading
+import time
+
+# Co ile sekund odświeżamy `docker system df` w tle - liczenie rozmiarów wolumenów jest drogie
+DF_INTERVAL = 300
+# Odświeżenie na żądanie najwyżej raz na tyle sekund
+MIN_REFRESH_INTERVAL = 30
+# Ile sekund czekamy na pierwszy wynik, zanim odpowiemy "jeszcze liczę"
+FIRST_REPORT_TIMEOUT = 10
+# Ile największych obiektów pokazujemy w każdej sekcji raportu
+TOP_ITEMS = 20
+
+ANONYMOUS_VOLUME_LABEL = 'com.docker.volume.anonymous'
+
+
+def short_id(object_id):
+    return (object_id or '').split(':')[-1][:12]
+
+
+def container_name(raw):
+    names = raw.get('Names') or []
+    return names[0].lstrip('/') if names else short_id(raw.get('Id'))
+
+
+def is_dangling(raw_image):
+    tags = [tag for tag in raw_image.get('RepoTags') or [] if tag != '<none>:<none>']
+    return not tags
+
+
+def analyze(df):
+    """Raport miejsca na dysku z jednej odpowiedzi GET /system/df.
+
+    Warstwy dzielone przez obrazy liczymy raz (LayersSize), rozmiar obrazu
+    rozbijamy na bajty unikalne i dzielone. Plan czyszczenia idzie w kolejności,
+    w jakiej robi to `docker system prune`: kontenery, obrazy, wolumeny, cache.
+    Żadnych dodatkowych inspect - wszystko jest w tej jednej odpowiedzi.
+    """
+    raw_images = df.get('Images') or []
+    raw_containers = df.get('Containers') or []
+    raw_volumes = df.get('Volumes') or []
+    raw_cache = df.get('BuildCache') or []
+
+    # ---- kontenery ----
+    containers = []
+    volume_users = {}
+    running_volumes = set()
+    for raw in raw_containers:
+        name = container_name(raw)
+        for mount in raw.get('Mounts') or []:
+            if mount.get('Type') == 'volume' and mount.get('Name'):
+                volume_users.setdefault(mount['Name'], []).append(name)
+                if raw.get('State') == 'running':
+                    running_volumes.add(mount['Name'])
+        containers.append({
+            "id": short_id(raw['Id']),
+            "name": name,
+            "image": raw.get('Image', ''),
+            "state": raw.get('State', ''),
+            "writable_bytes": max(raw.get('SizeRw') or 0, 0),
+            "rootfs_bytes": max(raw.get('SizeRootFs') or 0, 0)
+        })
+    stopped = [c for c in containers if c['state'] != 'running']
+    # Po usunięciu zatrzymanych kontenerów obraz albo wolumen trzymają już tylko działające
+    running_images = {raw.get('ImageID') for raw in raw_containers if raw.get('State') == 'running'}
+
+    # ---- obrazy ----
+    images = []
+    for raw in raw_images:
+        size = max(raw.get('Size') or 0, 0)
+        # -1 = silnik nie policzył warstw dzielonych; wtedy traktujemy obraz jako całkowicie unikalny
+        shared = max(raw.get('SharedSize') or 0, 0)
+        in_use = raw.get('Containers', -1)
+        images.append({
+            "id": short_id(raw['Id']),
+            "tags": [tag for tag in raw.get('RepoTags') or [] if tag != '<none>:<none>'],
+            "size_bytes": size,
+            "unique_bytes": size - shared,
+            "shared_bytes": shared,
+            "containers": in_use if in_use >= 0 else None,
+            "running": raw['Id'] in running_images,
+            "dangling": is_dangling(raw)
+        })
+    layers_bytes = df.get('LayersSize') or sum(img['unique_bytes'] for img in images)
+
+    # ---- wolumeny ----
+    volumes = []
+    for raw in raw_volumes:
+        usage = raw.get('UsageData') or {}
+        volumes.append({
+            "name": raw['Name'],
+            "driver": raw.get('Driver', 'local'),
+            "size_bytes": max(usage.get('Size', -1), 0),
+            # -1 = rozmiar nieznany (np. sterownik inny niż local)
+            "size_known": usage.get('Size', -1) >= 0,
+            "ref_count": usage.get('RefCount', -1),
+            "containers": volume_users.get(raw['Name'], []),
+            "anonymous": ANONYMOUS_VOLUME_LABEL in (raw.get('Labels') or {})
+        })
+
+    # ---- build cache ----
+    cache_bytes = sum(max(entry.get('Size') or 0, 0) for entry in raw_cache)
+    cache_unused = [entry for entry in raw_cache if not entry.get('InUse') and not entry.get('Shared')]
+
+    # ---- plan czyszczenia ----
+    # Każdy krok zakłada, że poprzednie już wykonano (tak jak `docker system prune`)
+    unused_images = [img for img in images if not img['running']]
+    used_images = [img for img in images if img['running']]
+    dangling_images = [img for img in unused_images if img['dangling']]
+    unused_volumes = [v for v in volumes if v['name'] not in running_volumes]
+
+    # Warstwy dzielone obrazu, który zostaje, zostają na dysku. Dokładnie wiemy tylko tyle:
+    # unikalne bajty nieużywanych obrazów zwolnią się na pewno, a zostanie co najmniej
+    # suma unikalnych bajtów używanych obrazów plus największa ich część dzielona.
+    kept_at_least = sum(img['unique_bytes'] for img in used_images) + \
+        max((img['shared_bytes'] for img in used_images), default=0)
+    images_reclaimable = sum(img['unique_bytes'] for img in unused_images)
+    images_reclaimable_max = max(layers_bytes - kept_at_least, images_reclaimable)
+
+    steps = [
+        {
+            "command": "docker container prune",
+            "objects": len(stopped),
+            "reclaimable_bytes": sum(c['writable_bytes'] for c in stopped),
+            "items": [c['name'] for c in stopped][:TOP_ITEMS]
+        },
+        {
+            "command": "docker image prune",
+            "objects": len(dangling_images),
+            "reclaimable_bytes": sum(img['unique_bytes'] for img in dangling_images),
+            "items": [img['id'] for img in dangling_images][:TOP_ITEMS]
+        },
+        {
+            "command": "docker image prune -a",
+            "objects": len(unused_images),
+            "reclaimable_bytes": images_reclaimable,
+            # Górna granica: gdy warstwy dzielone mają tylko nieużywane obrazy
+            "reclaimable_bytes_max": images_reclaimable_max,
+            "items": [img['tags'][0] if img['tags'] else img['id'] for img in unused_images][:TOP_ITEMS]
+        },
+        {
+            "command": "docker volume prune",
+            "objects": sum(1 for v in unused_volumes if v['anonymous']),
+            "reclaimable_bytes": sum(v['size_bytes'] for v in unused_volumes if v['anonymous']),
+            "items": [v['name'] for v in unused_volumes if v['anonymous']][:TOP_ITEMS]
+        },
+        {
+            "command": "docker volume prune -a",
+            "objects": len(unused_volumes),
+            "reclaimable_bytes": sum(v['size_bytes'] for v in unused_volumes),
+            "items": [v['name'] for v in unused_volumes][:TOP_ITEMS]
+        },
+        {
+            "command": "docker builder prune",
+            "objects": len(cache_unused),
+            "reclaimable_bytes": sum(max(entry.get('Size') or 0, 0) for entry in cache_unused),
+            "items": [entry.get('Description') or entry.get('ID', '') for entry in cache_unused][:TOP_ITEMS]
+        },
+    ]
+    # Pełne czyszczenie to kroki z -a; te bez -a zawierają się w nich
+    full = [step for step in steps if step['command'] not in ('docker image prune', 'docker volume prune')]
+
+    return {
+        "totals": {
+            "images_bytes": layers_bytes,
+            "containers_bytes": sum(c['writable_bytes'] for c in containers),
+            "volumes_bytes": sum(v['size_bytes'] for v in volumes),
+            "build_cache_bytes": cache_bytes,
+        },
+        "reclaimable_bytes": sum(step['reclaimable_bytes'] for step in full),
+        "reclaimable_bytes_max": sum(step.get('reclaimable_bytes_max', step['reclaimable_bytes']) for step in full),
+        "prune_plan": steps,
+        "dangling": {
+            "images": len(dangling_images),
+            # Jak `docker volume prune`: tylko anonimowe; nazwane bez kontenera zostają
+            "volumes": sum(1 for v in unused_volumes if v['anonymous']),
+            "containers": len(stopped),
+            "build_cache": len(cache_unused)
+        },
+        "images": sorted(images, key=lambda img: img['unique_bytes'], reverse=True)[:TOP_ITEMS],
+        "volumes": sorted(volumes, key=lambda v: v['size_bytes'], reverse=True)[:TOP_ITEMS],
+        "containers": sorted(containers, key=lambda c: c['writable_bytes'], reverse=True)[:TOP_ITEMS],
+        "counts": {
+            "images": len(images),
+            "containers": len(containers),
+            "volumes": len(volumes),
+            "build_cache": len(raw_cache)
+        }
+    }
+
+
+class DiskUsage:
+    """Raport `docker system df` jednego hosta, liczony w tle i trzymany w pamięci.
+
+    Wątek startuje przy pierwszym zapytaniu - hosty, których nikt nie ogląda,
+    nie liczą rozmiarów wolumenów. Zapytania nigdy nie czekają na Dockera
+    dłużej niż przy pierwszym raporcie.
+    """
+
+    def __init__(self, client, interval=DF_INTERVAL):
+        self.client = client
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._report = None
+        self._updated_at = None
+        self._duration = None
+        self.error = None
+        self._started = False
+        self._ready = threading.Event()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._loop, name='disk-usage', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.refresh_now()
+            self._wait()
+            self._wake.clear()
+
+    def _wait(self):
+        self._wake.wait(self.interval)
+
+    def refresh_now(self):
+        started = time.time()
+        try:
+            report = analyze(self.client.api.df())
+        except Exception as e:
+            self.error = str(e)
+            print(f"⚠️ Błąd docker system df: {e}")
+        else:
+            with self._lock:
+                self._report = report
+                self._updated_at = time.time()
+                self._duration = self._updated_at - started
+            self.error = None
+        self._ready.set()
+
+    def refresh(self):
+        """Prosi wątek o nowy odczyt; False, gdy ostatni jest świeższy niż MIN_REFRESH_INTERVAL"""
+        self.start()
+        if self._updated_at and time.time() - self._updated_at < MIN_REFRESH_INTERVAL:
+            return False
+        self._wake.set()
+        return True
+
+    def export(self):
+        """Ostatni raport z czasem odczytu - do publikacji dla innych procesów"""
+        with self._lock:
+            return {
+                "report": self._report,
+                "updated_at": self._updated_at,
+                "duration": round(self._duration, 3) if self._duration is not None else None,
+                "error": self.error
+            }
+
+    def report(self, timeout=FIRST_REPORT_TIMEOUT):
+        """Ostatni raport z metadanymi świeżości; None, gdy pierwszy jeszcze się liczy"""
+        self.start()
+        self._ready.wait(timeout)
+        with self._lock:
+            if self._report is None:
+                return None
+            return dict(self._report,
+                        updated_at=self._updated_at,
+                        age=round(time.time() - self._updated_at, 3),
+                        duration=round(self._duration, 3),
+                        error=self.error)
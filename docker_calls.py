@@ -0,0 +1,83 @@
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from metrics import docker_duration, docker_requests, record
+
+VERSION_PREFIX = re.compile(r'^/v[0-9.]+/')
+# Drugi segment ścieżki, który nie jest identyfikatorem (containers/json, images/create...)
+COLLECTION_ACTIONS = {'json', 'create', 'prune', 'search', 'load', 'get', 'df'}
+# Ostatni segment po identyfikatorze, który zachowujemy w nazwie endpointu
+RESOURCE_ACTIONS = {
+    'json', 'start', 'stop', 'restart', 'kill', 'pause', 'unpause', 'logs', 'stats', 'top', 'wait',
+    'exec', 'attach', 'resize', 'archive', 'changes', 'export', 'rename', 'update', 'history', 'push',
+    'tag', 'connect', 'disconnect'
+}
+
+
+def endpoint_name(url):
+    """/v1.45/containers/3f2a.../json -> containers/{id}/json (niska kardynalność etykiet)"""
+    path = VERSION_PREFIX.sub('', urlsplit(url).path).strip('/')
+    parts = path.split('/')
+    if len(parts) < 2 or parts[1] in COLLECTION_ACTIONS:
+        return path
+    name = parts[0] + '/{id}'
+    if len(parts) > 2 and parts[-1] in RESOURCE_ACTIONS:
+        name += '/' + parts[-1]
+    return name
+
+
+class ApiCallCounter:
+    """Liczy zapytania HTTP, które klient Dockera faktycznie wysyła do silnika.
+
+    Licznik podpina się pod APIClient.send, więc widzi też wywołania robione
+    wewnątrz docker-py (np. inspect po list()). Liczniki są per wątek, żeby
+    tło (zdarzenia, rekonsyliacja) nie zaśmiecało pomiaru pojedynczego requestu.
+    Każde wywołanie trafia też do metryk per endpoint i do spanów requestu.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def install(self, client):
+        api = client.api
+        send = api.send
+
+        def counted_send(request, **kwargs):
+            self._local.calls = self.thread_calls + 1
+            with self._lock:
+                self.total += 1
+            endpoint = endpoint_name(request.url)
+            started = time.perf_counter()
+            try:
+                return send(request, **kwargs)
+            finally:
+                # Dla strumieni (events, stats, logs) to czas do nagłówków odpowiedzi
+                elapsed = time.perf_counter() - started
+                docker_requests.inc(request.method, endpoint)
+                docker_duration.observe(elapsed, request.method, endpoint)
+                record(f"docker {request.method} {endpoint}", elapsed)
+
+        api.send = counted_send
+        return client
+
+    @property
+    def thread_calls(self):
+        return getattr(self._local, 'calls', 0)
+
+    @contextmanager
+    def measure(self):
+        """Liczy wywołania wykonane w bloku przez bieżący wątek"""
+        result = {'calls': 0}
+        start = self.thread_calls
+        try:
+            yield result
+        finally:
+            result['calls'] = self.thread_calls - start
+
+
+api_calls = ApiCallCounter()
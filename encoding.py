@@ -0,0 +1,203 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Mniejszych odpowiedzi nie opłaca się kompresować
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Ile skompresowanych odpowiedzi (snapshot per wersja, pliki statyczne) trzymamy w pamięci
+COMPRESSED_CACHE_SIZE = 32
+# Kawałki, w jakich memoryview trafia do serwera WSGI - PEP 3333 wymaga bytes, nie widoków
+VIEW_CHUNK = 256 * 1024
+COMPRESSIBLE_TYPES = ('application/json', 'application/javascript', 'text/javascript', 'text/css', 'text/html',
+                      'text/plain', 'image/svg+xml')
+
+
+# ============ JSON ============
+
+def dumps(obj):
+    """Zwarty JSON; orjson, gdy jest zainstalowany"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(obj, separators=(',', ':'))
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify przez orjson; bez orjson (albo z indent w trybie debug) - standardowo"""
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and set(kwargs) <= {'separators'}:
+            try:
+                return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+
+# ============ FORMAT KOMPAKTOWY ============
+# Sekcja jako {"fields": [...], "rows": [[...], ...]} - klucze raz na sekcję
+# zamiast raz na element, rozmiary jako liczby bajtów.
+
+COMPACT_FIELDS = {
+    'containers': ('id', 'name', 'status', 'image'),
+    'images': ('id', 'tags', 'size'),
+    'volumes': ('name', 'driver', 'mountpoint'),
+    'networks': ('id', 'name', 'driver', 'scope'),
+    'stacks': ('name', 'path', 'containers'),
+}
+
+
+def compact_row(section, item):
+    if section == 'images':
+        return [item['id'], item['tags'], item['size_bytes']]
+    if section == 'stacks':
+        return [item['name'], item['path'], [[c['name'], c['status']] for c in item['containers']]]
+    return [item.get(field) for field in COMPACT_FIELDS[section]]
+
+
+def compact_section(section, items):
+    return {"fields": COMPACT_FIELDS[section], "rows": [compact_row(section, item) for item in items]}
+
+
+# ============ PLIKI STATYCZNE ============
+# URL-e plików statycznych dostają ?v=<hash treści>, więc można je cache'ować
+# bez końca - po zmianie pliku zmienia się URL.
+
+# Jak długo przeglądarka trzyma plik z hashem w URL-u (rok)
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+_static_hashes = {}
+
+
+def static_hash(folder, filename):
+    """Krótki hash treści pliku; liczony ponownie tylko po zmianie mtime"""
+    path = os.path.join(folder, filename)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    cached = _static_hashes.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'rb') as f:
+            cached = _static_hashes[path] = (mtime, hashlib.sha256(f.read()).hexdigest()[:12])
+    return cached[1]
+
+
+# ============ KOMPRESJA ============
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def choose_encoding(accept_encodings):
+    """br, gdy klient go przyjmuje i jest moduł brotli, inaczej gzip (albo None)"""
+    if brotli is not None and accept_encodings['br']:
+        return 'br'
+    if accept_encodings['gzip']:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_response(response, accept_encodings, cache_key=None):
+    """Kompresuje gotową odpowiedź w miejscu.
+
+    Odpowiedzi z silnym ETagiem trafiają do cache pod (cache_key, ETag), więc
+    ten sam snapshot czy plik statyczny kompresujemy tylko raz.
+    """
+    if response.status_code != 200 or response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    if 'Content-Encoding' in response.headers or response.is_streamed and not response.direct_passthrough:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None:
+        return response
+
+    etag, weak = response.get_etag()
+    key = (cache_key, etag, encoding) if etag and not weak else None
+    body = None
+    if key is not None:
+        with _cache_lock:
+            body = _cache.get(key)
+            if body is not None:
+                _cache.move_to_end(key)
+    if body is not None:
+        # Nieprzeczytany strumień (plik statyczny) nie będzie już potrzebny
+        close = getattr(response.response, 'close', None)
+        if close is not None:
+            close()
+    else:
+        # Pliki statyczne (send_file) i widoki snapshotu przychodzą jako strumień - czytamy je
+        # w całości, ale tylko gdy w cache nie ma już skompresowanej wersji
+        response.direct_passthrough = False
+        data = response.get_data()
+        if len(data) < MIN_COMPRESS_BYTES:
+            return response
+        body = compress(data, encoding)
+        if key is not None:
+            with _cache_lock:
+                _cache[key] = body
+                while len(_cache) > COMPRESSED_CACHE_SIZE:
+                    _cache.popitem(last=False)
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        # Inna reprezentacja tych samych danych - ETag staje się słaby
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def view_response(body, mimetype='application/json'):
+    """Odpowiedź z gotowego ciała; memoryview (segment zmapowanego snapshotu) idzie do
+    serwera kawałkami prosto z pamięci, bez dekodowania i sklejania całości.
+    """
+    if not isinstance(body, memoryview):
+        return Response(body, mimetype=mimetype)
+
+    def chunks():
+        for start in range(0, len(body), VIEW_CHUNK):
+            yield body[start:start + VIEW_CHUNK].tobytes()
+
+    response = Response(chunks(), mimetype=mimetype, direct_passthrough=True)
+    response.content_length = len(body)
+    return response
+
+
+def compress_stream(chunks, encoding):
+    """Kompresuje strumień (SSE) kawałek po kawałku, z flushem po każdym"""
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+    else:
+        # wbits 16+ - nagłówek i stopka gzip zamiast surowego zlib
+        compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
@@ -0,0 +1,15 @@
+# Konfiguracja workerów HTTP w trybie produkcyjnym; gunicorn czyta ten plik sam z katalogu roboczego:
+#   python app.py collector &
+#   gunicorn 'app:create_app("worker")'
+import os
+
+bind = os.environ.get('ORBIT_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('ORBIT_WORKERS', 4))
+
+# /status/stream (SSE), /container/<id>/logs/stream?follow=1, NDJSON z /containers/bulk i terminale
+# trzymają wątek przez cały czas trwania. Worker sync obsługuje jeden request naraz i zabija
+# każdy dłuższy niż timeout - cztery otwarte panele zajęłyby wszystkie workery.
+worker_class = 'gthread'
+threads = int(os.environ.get('ORBIT_WORKER_THREADS', 32))
+# W gthread timeout pilnuje tylko, czy proces workera żyje - nie przerywa długich odpowiedzi
+timeout = 60
@@ -0,0 +1,126 @@
+import threading
+import time
+
+from urllib3.util import Timeout
+
+# Domyślne limity czasu klienta hosta: nawiązanie połączenia (tylko TCP) i czekanie na odpowiedź.
+# Odczyt zostaje długi jak domyślne 60 s docker-py - /system/df, run czy rm -f na obciążonym
+# silniku trwają dłużej niż kilka sekund. Krótki limit ma tylko sonda.
+CONNECT_TIMEOUT = 2
+READ_TIMEOUT = 60
+PROBE_TIMEOUT = 5
+# Po tylu kolejnych błędach przestajemy wołać silnik
+BREAKER_FAILURES = 3
+# Pierwsza przerwa po otwarciu bezpiecznika; każda nieudana próba ją podwaja
+BREAKER_BACKOFF = 5
+BREAKER_MAX_BACKOFF = 300
+# Co ile sekund sprawdzamy wszystkie hosty w tle
+PROBE_INTERVAL = 10
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Schematy, przy których docker-py łączy się po TCP - tylko tam limit połączenia jest osobny
+TCP_SCHEMES = ('tcp://', 'http://', 'https://')
+
+
+class HostUnavailable(ConnectionError):
+    """Host bez połączenia albo z otwartym bezpiecznikiem - 503 od razu, bez czekania na timeout"""
+
+
+class CircuitOpen(HostUnavailable):
+    pass
+
+
+class HostTimeout(Timeout):
+    """Osobny limit połączenia i odczytu dla docker-py.
+
+    docker-py przy stop/restart/wait dodaje do timeoutu klienta sekundy
+    operacji - dodajemy je do limitu odczytu, połączenie zostaje krótkie.
+    """
+
+    def __add__(self, seconds):
+        return HostTimeout(connect=self._connect, read=self._read + seconds)
+
+    __radd__ = __add__
+
+
+def client_timeout(url, connect=None, read=None):
+    """Timeout do konstruktora klienta: HostTimeout dla TCP, liczba dla gniazd unix/ssh"""
+    read = read or READ_TIMEOUT
+    if url and url.startswith(TCP_SCHEMES):
+        return HostTimeout(connect=connect or CONNECT_TIMEOUT, read=read)
+    return read
+
+
+class CircuitBreaker:
+    """Bezpiecznik hosta: po BREAKER_FAILURES błędach z rzędu otwiera się i
+    przez czas backoffu nikt nie woła silnika. Po backoffie jedna próba
+    (half-open) decyduje, czy zamknąć go z powrotem, czy czekać dwa razy dłużej.
+    """
+
+    def __init__(self, failures=BREAKER_FAILURES, backoff=BREAKER_BACKOFF, max_backoff=BREAKER_MAX_BACKOFF):
+        self.threshold = failures
+        self.initial_backoff = backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.backoff = backoff
+        self.retry_at = None
+        self.opened_at = None
+        self.last_error = None
+        self.last_success_at = None
+
+    @property
+    def closed(self):
+        return self.state == CLOSED
+
+    def allow(self):
+        """Czy można teraz zawołać silnik; po backoffie przepuszcza dokładnie jedną próbę"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() >= self.retry_at:
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                print(f"✅ Host znów odpowiada (przerwa {time.time() - self.opened_at:.0f}s)")
+            self.state = CLOSED
+            self.failures = 0
+            self.backoff = self.initial_backoff
+            self.retry_at = self.opened_at = None
+            self.last_error = None
+            self.last_success_at = time.time()
+
+    def failure(self, error):
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            if self.state == HALF_OPEN:
+                # Próba nieudana - następna za dwa razy dłuższą przerwę
+                self.backoff = min(self.backoff * 2, self.max_backoff)
+            elif self.state == CLOSED and self.failures < self.threshold:
+                return
+            elif self.state == OPEN:
+                return
+            if self.opened_at is None:
+                self.opened_at = time.time()
+            self.state = OPEN
+            self.retry_at = time.monotonic() + self.backoff
+
+    def describe(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "failures": self.failures,
+                "retry_in": round(max(self.retry_at - time.monotonic(), 0), 1) if self.retry_at else None,
+                "down_since": self.opened_at,
+                "last_success_at": self.last_success_at,
+                "last_error": self.last_error
+            }
@@ -0,0 +1,296 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import docker
+
+from diskusage import DiskUsage
+from docker_calls import api_calls
+from health import PROBE_INTERVAL, PROBE_TIMEOUT, CircuitBreaker, CircuitOpen, HostUnavailable, client_timeout
+from inventory import Inventory, SECTIONS
+
+# Ile czekamy na snapshot hosta przy fan-oucie
+HOST_TIMEOUT = 5
+# Ile hostów obsługujemy równolegle przy fan-oucie
+FANOUT_WORKERS = 16
+# Wielkość puli połączeń HTTP w kliencie każdego hosta
+CLIENT_POOL_SIZE = 10
+
+
+def local_inventory(host, client):
+    """Domyślnie każdy host ma własny inwentarz zasilany zdarzeniami Dockera.
+
+    Przy otwartym bezpieczniku inwentarz nie woła silnika - trzyma ostatni stan.
+    """
+    inventory = Inventory(client, gate=lambda: host.breaker.closed)
+    inventory.start()
+    return inventory
+
+
+class Host:
+    """Zarejestrowany silnik Dockera z jednym, długo żyjącym klientem i inwentarzem.
+
+    Każdy host ma własne limity czasu i bezpiecznik: gdy silnik przestaje
+    odpowiadać, zapytania dostają od razu błąd (albo ostatni dobry snapshot),
+    a o powrocie hosta decyduje sonda w tle.
+    """
+
+    # Czy sync() łączy host od razu (lokalny) - worker łączy się dopiero przy pierwszej akcji
+    eager = True
+
+    def __init__(self, host_id, name, url, is_local, make_inventory=local_inventory,
+                 connect_timeout=None, read_timeout=None):
+        self.id = host_id
+        self.name = name
+        self.url = url
+        self.is_local = bool(is_local)
+        self.make_inventory = make_inventory
+        self.timeouts = (connect_timeout, read_timeout)
+        self.timeout = client_timeout(None if self.is_local else url, connect_timeout, read_timeout)
+        self.probe_timeout = client_timeout(None if self.is_local else url, connect_timeout, PROBE_TIMEOUT)
+        self.breaker = CircuitBreaker()
+        self.client = None
+        # Osobny, lekki klient API z limitem sondy - ping nie czeka limitu odczytu głównego klienta
+        self.probe_api = None
+        self.inventory = None
+        self.disk = None
+        self.error = None
+        # (snapshot, kiedy) - podawany jako nieaktualny, gdy host nie odpowiada
+        self.last_good = None
+        self._lock = threading.Lock()
+
+    def connect(self):
+        with self._lock:
+            if self.client is not None:
+                return self.client
+            if not self.breaker.allow():
+                return None
+            try:
+                # Klient sondy ustala wersję API w limicie sondy; główny dostaje ją gotową,
+                # więc połączenie z martwym hostem nie czeka pełnego limitu odczytu
+                if self.is_local:
+                    probe_api = docker.from_env(timeout=self.probe_timeout).api
+                    client = docker.from_env(version=probe_api.api_version, timeout=self.timeout,
+                                             max_pool_size=CLIENT_POOL_SIZE)
+                else:
+                    probe_api = docker.APIClient(base_url=self.url, timeout=self.probe_timeout)
+                    client = docker.DockerClient(base_url=self.url, version=probe_api.api_version,
+                                                 timeout=self.timeout, max_pool_size=CLIENT_POOL_SIZE)
+            except Exception as e:
+                self.error = str(e)
+                self.breaker.failure(e)
+                print(f"⚠️ Błąd połączenia z hostem {self.name}: {e}")
+                return None
+
+            api_calls.install(client)
+            self._attach(client)
+            self.client = client
+            self.probe_api = probe_api
+            self.error = None
+            self.breaker.success()
+            return client
+
+    def _attach(self, client):
+        """Inwentarz i raport dysku zasilane nowym klientem"""
+        self.inventory = self.make_inventory(self, client)
+        self.disk = DiskUsage(client)
+
+    @property
+    def connected(self):
+        return self.client is not None
+
+    def probe(self):
+        """Ping silnika w tle; przy otwartym bezpieczniku tylko, gdy minął backoff"""
+        if self.client is None:
+            self.connect()
+            return
+        if not self.breaker.allow():
+            return
+        try:
+            self.probe_api.ping()
+        except Exception as e:
+            self.error = str(e)
+            self.breaker.failure(e)
+        else:
+            self.error = None
+            self.breaker.success()
+
+    def close(self):
+        with self._lock:
+            if self.inventory is not None:
+                self.inventory.stop()
+            if self.disk is not None:
+                self.disk.stop()
+            if self.client is not None:
+                self.client.close()
+                self.probe_api.close()
+            self.client = self.probe_api = self.inventory = self.disk = None
+
+    def require_client(self):
+        """Klient do akcji; przy otwartym bezpieczniku od razu CircuitOpen zamiast czekania na timeout"""
+        if not self.breaker.closed:
+            raise CircuitOpen(f"Host {self.name} nie odpowiada: {self.breaker.last_error}")
+        client = self.connect()
+        if client is None:
+            raise HostUnavailable(self.error or f"Brak połączenia z hostem {self.name}")
+        return client
+
+    def snapshot(self, timeout=HOST_TIMEOUT):
+        if not self.breaker.closed:
+            raise CircuitOpen(f"Host {self.name} nie odpowiada: {self.breaker.last_error}")
+        if self.inventory is None and self.connect() is None:
+            raise HostUnavailable(self.error or f"Brak połączenia z hostem {self.name}")
+        if not self.inventory.wait_ready(timeout):
+            raise TimeoutError(self.inventory.error or "Inwentarz nie jest jeszcze gotowy")
+        snapshot = self.inventory.snapshot()
+        self.last_good = (snapshot, time.time())
+        return snapshot
+
+    def describe(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "url": self.url,
+            "is_local": self.is_local,
+            "connected": self.connected,
+            "error": self.error,
+            "health": self.breaker.describe()
+        }
+
+
+class HostRegistry:
+    """Rejestr hostów z tabeli `hosts` - jeden klient na host, zapytania równolegle.
+
+    `load_hosts` zwraca wiersze (id, name, url, is_local); po zmianach w tabeli
+    wystarczy wywołać sync(). `host_class` decyduje, skąd host bierze inwentarz
+    i zdrowie - z własnego klienta (Host) albo od kolektora (shared.SharedHost).
+    """
+
+    def __init__(self, load_hosts, max_workers=FANOUT_WORKERS, host_class=Host):
+        self._load_hosts = load_hosts
+        self._host_class = host_class
+        self._lock = threading.Lock()
+        self._hosts = {}
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='orbit-hosts')
+        self._probing = False
+
+    def sync(self):
+        """Dopasowuje rejestr do tabeli hosts: nowe łączy w tle, usunięte zamyka"""
+        rows = {row['id']: row for row in self._load_hosts()}
+        with self._lock:
+            removed = [self._hosts.pop(host_id) for host_id in list(self._hosts) if host_id not in rows]
+            for host_id, row in rows.items():
+                host = self._hosts.get(host_id)
+                timeouts = (row.get('connect_timeout'), row.get('read_timeout'))
+                if host is not None and (host.url, host.timeouts) == (row['url'], timeouts):
+                    host.name = row['name']
+                    continue
+                if host is not None:
+                    removed.append(host)
+                host = self._host_class(host_id, row['name'], row['url'], row['is_local'],
+                                        connect_timeout=timeouts[0], read_timeout=timeouts[1])
+                self._hosts[host_id] = host
+                if not host.eager:
+                    continue
+                if host.is_local:
+                    # Lokalny silnik łączymy od razu - to domyślny host panelu
+                    host.connect()
+                else:
+                    self._pool.submit(host.connect)
+        for host in removed:
+            host.close()
+
+    def hosts(self):
+        with self._lock:
+            return list(self._hosts.values())
+
+    def start_probing(self, interval=PROBE_INTERVAL):
+        """Sonda w tle: ping każdego hosta co `interval` sekund, równolegle"""
+        if self._probing:
+            return
+        self._probing = True
+        threading.Thread(target=self._probe_loop, args=(interval,), name='hosts-probe', daemon=True).start()
+
+    def _probe_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            try:
+                hosts = self.hosts()
+                # Sonda sama zapisuje wynik w bezpieczniku - fan_out nie dolicza drugiego błędu za timeout
+                results = self.fan_out(Host.probe, timeout=interval, hosts=hosts, record_timeouts=False)
+                for host in hosts:
+                    error = results[host.id][1]
+                    if error:
+                        print(f"⚠️ Sonda hosta {host.name}: {error}")
+            except Exception as e:
+                print(f"⚠️ Błąd sondy hostów: {e}")
+
+    def get(self, host_id):
+        with self._lock:
+            return self._hosts.get(host_id)
+
+    def local(self):
+        return next((host for host in self.hosts() if host.is_local), None)
+
+    def client(self, host_id=None):
+        host = self.get(host_id) if host_id else self.local()
+        return host.connect() if host else None
+
+    def fan_out(self, fn, timeout=HOST_TIMEOUT, hosts=None, record_timeouts=True):
+        """Wywołuje fn(host) dla wszystkich hostów równolegle.
+
+        Zwraca {host_id: (wynik, błąd)}. Łączny czas ogranicza najwolniejszy
+        host i `timeout`, a nie suma czasów wszystkich hostów. Przekroczenie
+        czasu liczy się jako błąd w bezpieczniku hosta, chyba że fn robi to
+        sama (record_timeouts=False).
+        """
+        hosts = self.hosts() if hosts is None else hosts
+        futures = {self._pool.submit(fn, host): host for host in hosts}
+        done, _pending = wait(futures, timeout=timeout)
+
+        results = {}
+        for future, host in futures.items():
+            if future not in done:
+                future.cancel()
+                results[host.id] = (None, f"Przekroczono czas odpowiedzi ({timeout}s)")
+                if record_timeouts:
+                    host.breaker.failure(results[host.id][1])
+                continue
+            try:
+                results[host.id] = (future.result(), None)
+            except Exception as e:
+                results[host.id] = (None, str(e))
+        return results
+
+    def merged_status(self, timeout=HOST_TIMEOUT):
+        """Inwentarz wszystkich hostów w jednym dokumencie; elementy oznaczone hostem.
+
+        Host, który nie odpowiedział, wchodzi z ostatnim dobrym snapshotem
+        oznaczonym jako nieaktualny (stale) - nie opóźnia i nie znika z panelu.
+        """
+        hosts = self.hosts()
+        results = self.fan_out(lambda host: host.snapshot(timeout), timeout=timeout, hosts=hosts)
+
+        document = {"counts": {section: 0 for section in SECTIONS}, "hosts": []}
+        for section in SECTIONS:
+            document[section] = []
+
+        for host in hosts:
+            snapshot, error = results[host.id]
+            summary = host.describe()
+            summary["ok"] = error is None
+            summary["error"] = error
+            summary["stale"] = False
+            marks = {"host": host.id, "host_name": host.name}
+            if snapshot is None and host.last_good is not None:
+                snapshot, good_at = host.last_good
+                summary["stale"] = True
+                summary["stale_age"] = round(time.time() - good_at, 3)
+                marks["stale"] = True
+            if snapshot is not None:
+                summary["version"] = snapshot["version"]
+                for section in SECTIONS:
+                    document["counts"][section] += snapshot["counts"][section]
+                    document[section].extend(dict(item, **marks) for item in snapshot[section])
+            document["hosts"].append(summary)
+        return document
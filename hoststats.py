@@ -0,0 +1,300 @@
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+
+import psutil
+
+from shared import SNAPSHOT_DIR
+from stats import RETENTION_1H, RETENTION_1M
+
+# Co ile sekund odczytujemy metryki hosta; jeden odczyt to kilka plików z /proc
+SAMPLE_INTERVAL = float(os.environ.get('ORBIT_HOST_METRICS_INTERVAL', 5))
+# Ile minut surowych próbek trzymamy w buforze
+RING_MINUTES = 60
+# Orbit w kontenerze: zamontowany /proc hosta (np. -v /proc:/host/proc:ro)
+HOST_PROC = os.environ.get('ORBIT_HOST_PROC')
+if HOST_PROC:
+    psutil.PROCFS_PATH = HOST_PROC
+
+HOST_FIELDS = ('cpu', 'load1', 'mem_used', 'mem_percent', 'swap_used', 'disk_percent',
+               'disk_read', 'disk_write', 'net_rx', 'net_tx')
+
+RESOLUTIONS = {'1m': ('host_metrics_1m', 60), '1h': ('host_metrics_1h', 3600)}
+
+# Interfejsy wirtualne dublowałyby ruch kontenerów (veth + mostek) albo liczyły ruch lokalny
+VIRTUAL_NICS = ('lo', 'veth', 'docker', 'br-')
+
+# Plik bufora: nagłówek (magic, rozmiar, liczba pól, sekwencja, następny, liczba próbek), rekordy
+RING_MAGIC = b'ORBITHM1'
+RING_HEADER = struct.Struct('<8sIIQII')
+READ_RETRIES = 100
+
+
+def ring_path(directory=SNAPSHOT_DIR):
+    return os.path.join(directory, 'host-metrics.ring')
+
+
+class SharedRingBuffer:
+    """RingBuffer w pliku zmapowanym w pamięci: pisze jeden proces, czytają wszystkie.
+
+    Zapis otacza licznik sekwencji (nieparzysty = zapis w toku); czytelnik,
+    który na niego trafi albo zobaczy zmianę licznika, powtarza odczyt.
+    Workery czytają historię bez blokad i bez własnego próbkowania.
+    """
+
+    def __init__(self, path, size=None, fields=HOST_FIELDS):
+        self.path = path
+        self.fields = fields
+        self.record = struct.Struct(f'<{1 + len(fields)}d')
+        self.writable = size is not None
+        if self.writable:
+            self.size = size
+            tmp = f'{path}.{os.getpid()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(RING_HEADER.pack(RING_MAGIC, size, len(fields), 0, 0, 0))
+                f.write(bytes(self.record.size * size))
+            os.replace(tmp, path)
+            with open(path, 'r+b') as f:
+                self._map = mmap.mmap(f.fileno(), 0)
+            self._seq = self._next = self._count = 0
+        else:
+            with open(path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.inode = os.fstat(f.fileno()).st_ino
+            magic, self.size, count, *_ = RING_HEADER.unpack_from(self._map, 0)
+            if magic != RING_MAGIC or count != len(fields):
+                raise ValueError(f"Nieprawidłowy plik bufora metryk: {path}")
+
+    @classmethod
+    def open(cls, path, fields=HOST_FIELDS):
+        """Bufor do odczytu albo None, gdy nikt go jeszcze nie utworzył"""
+        try:
+            return cls(path, fields=fields)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def stale(self):
+        """Czy proces piszący utworzył w międzyczasie nowy plik"""
+        try:
+            return os.stat(self.path).st_ino != self.inode
+        except FileNotFoundError:
+            return True
+
+    def append(self, ts, values):
+        i = self._next
+        self._seq += 1
+        RING_HEADER.pack_into(self._map, 0, RING_MAGIC, self.size, len(self.fields), self._seq, i, self._count)
+        self.record.pack_into(self._map, RING_HEADER.size + i * self.record.size,
+                              ts, *(values[name] for name in self.fields))
+        self._next = (i + 1) % self.size
+        self._count = min(self._count + 1, self.size)
+        self._seq += 1
+        RING_HEADER.pack_into(self._map, 0, RING_MAGIC, self.size, len(self.fields), self._seq,
+                              self._next, self._count)
+
+    def _read(self):
+        """Spójna kopia (następny, liczba próbek, rekordy)"""
+        for _ in range(READ_RETRIES):
+            seq, next_index, count = RING_HEADER.unpack_from(self._map, 0)[3:]
+            if seq % 2 == 0:
+                data = self._map[RING_HEADER.size:]
+                if RING_HEADER.unpack_from(self._map, 0)[3] == seq:
+                    return next_index, count, array('d', data)
+            time.sleep(0)
+        raise TimeoutError("Bufor metryk zmienia się zbyt szybko")
+
+    def series(self, start=0.0, end=None):
+        """Kolumny próbek z przedziału [start, end), od najstarszej - jak RingBuffer.series"""
+        next_index, count, values = self._read()
+        width = 1 + len(self.fields)
+        first = (next_index - count) % self.size
+        order = [(first + k) % self.size for k in range(count)]
+        picked = [i * width for i in order if values[i * width] >= start and (end is None or values[i * width] < end)]
+        return {name: [values[i + k] for i in picked] for k, name in enumerate(('ts',) + self.fields)}
+
+    def latest(self):
+        next_index, count, values = self._read()
+        if not count:
+            return None
+        width = 1 + len(self.fields)
+        i = (next_index - 1) % self.size * width
+        return {name: values[i + k] for k, name in enumerate(('ts',) + self.fields)}
+
+
+def read_counters():
+    """Skumulowane bajty: (disk_read, disk_write, net_rx, net_tx)"""
+    disk = psutil.disk_io_counters()
+    nics = [counters for name, counters in psutil.net_io_counters(pernic=True).items()
+            if not name.startswith(VIRTUAL_NICS)]
+    return (disk.read_bytes if disk else 0, disk.write_bytes if disk else 0,
+            sum(n.bytes_recv for n in nics), sum(n.bytes_sent for n in nics))
+
+
+def host_info(disk_path='/'):
+    memory = psutil.virtual_memory()
+    return {
+        "cpus": psutil.cpu_count(),
+        "mem_total": memory.total,
+        "swap_total": psutil.swap_memory().total,
+        "disk_total": psutil.disk_usage(disk_path).total,
+        "boot_time": psutil.boot_time()
+    }
+
+
+class HostStatsSampler:
+    """CPU, pamięć, obciążenie, dysk i sieć maszyny, na której działa Orbit.
+
+    Jeden wątek co SAMPLE_INTERVAL s czyta psutil do bufora o stałym
+    rozmiarze we współdzielonym pliku (SNAPSHOT_DIR) i co minutę agreguje
+    pełne minuty do tabel 1m/1h w SQLite. Zapytania nie wołają psutil -
+    czytają bufor albo bazę.
+    """
+
+    def __init__(self, storage, path=None, interval=SAMPLE_INTERVAL, disk_path='/'):
+        self.storage = storage
+        self.path = path or ring_path()
+        self.interval = interval
+        self.disk_path = disk_path
+        self._ring = None
+        self._info = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._rolled_until = int(time.time() // 60 * 60)
+        # Czas CPU wątku próbkującego względem czasu zegarowego
+        self._started_at = None
+        self._cpu_time = 0.0
+        self.sampling = False
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._ring = SharedRingBuffer(self.path, size=int(RING_MINUTES * 60 // self.interval))
+        self.sampling = True
+        threading.Thread(target=self._loop, name='host-stats', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    # ---- próbkowanie ----
+
+    def _loop(self):
+        self._started_at = time.monotonic()
+        # Pierwsze wywołanie cpu_percent() ustala punkt odniesienia i zwraca 0
+        psutil.cpu_percent(interval=None)
+        previous = (time.time(), read_counters())
+        while not self._stop.wait(self.interval):
+            cpu_started = time.thread_time()
+            try:
+                previous = self.sample(previous)
+                if time.time() - self._rolled_until >= 60:
+                    self.rollup()
+            except Exception as e:
+                print(f"⚠️ Błąd odczytu metryk hosta: {e}")
+            self._cpu_time += time.thread_time() - cpu_started
+
+    def sample(self, previous):
+        now = time.time()
+        counters = read_counters()
+        elapsed = now - previous[0]
+        rates = [max(cur - old, 0) / elapsed for cur, old in zip(counters, previous[1])]
+        memory = psutil.virtual_memory()
+        self._ring.append(now, {
+            'cpu': psutil.cpu_percent(interval=None),
+            'load1': os.getloadavg()[0],
+            'mem_used': memory.total - memory.available,
+            'mem_percent': memory.percent,
+            'swap_used': psutil.swap_memory().used,
+            'disk_percent': psutil.disk_usage(self.disk_path).percent,
+            'disk_read': rates[0],
+            'disk_write': rates[1],
+            'net_rx': rates[2],
+            'net_tx': rates[3]
+        })
+        return now, counters
+
+    @property
+    def overhead(self):
+        """Procent jednego rdzenia zużywany przez wątek próbkujący"""
+        if not self._started_at:
+            return None
+        return round(self._cpu_time / max(time.monotonic() - self._started_at, 1e-9) * 100, 4)
+
+    # ---- agregacja do SQLite ----
+
+    def rollup(self, now=None):
+        """Zapisuje pełne minuty z bufora do tabeli 1m, pełne godziny do 1h"""
+        now = now or time.time()
+        start, end = self._rolled_until, int(now // 60 * 60)
+        if end <= start:
+            return
+
+        series = self._ring.series(start, end)
+        buckets = {}
+        for i, ts in enumerate(series['ts']):
+            buckets.setdefault(int(ts // 60 * 60), []).append(i)
+        rows = [(bucket,) + tuple(sum(series[name][i] for i in indexes) / len(indexes) for name in HOST_FIELDS)
+                for bucket, indexes in buckets.items()]
+
+        columns = ', '.join(HOST_FIELDS)
+        with self.storage.transaction() as conn:
+            conn.executemany(f"INSERT OR REPLACE INTO host_metrics_1m (ts, {columns}) "
+                             f"VALUES (?, {', '.join('?' for _ in HOST_FIELDS)})", rows)
+            hour_start, hour_end = start // 3600 * 3600, end // 3600 * 3600
+            if hour_end > hour_start:
+                averages = ', '.join(f'AVG({name})' for name in HOST_FIELDS)
+                conn.execute(f"INSERT OR REPLACE INTO host_metrics_1h (ts, {columns}) "
+                             f"SELECT ts / 3600 * 3600 AS hour, {averages} "
+                             f"FROM host_metrics_1m WHERE ts >= ? AND ts < ? GROUP BY hour",
+                             (hour_start, hour_end))
+            conn.execute("DELETE FROM host_metrics_1m WHERE ts < ?", (now - RETENTION_1M,))
+            conn.execute("DELETE FROM host_metrics_1h WHERE ts < ?", (now - RETENTION_1H,))
+        self._rolled_until = end
+
+    # ---- odczyt ----
+
+    def ring(self):
+        """Bufor tego procesu albo zmapowany bufor procesu próbkującego (worker)"""
+        if self.sampling:
+            return self._ring
+        with self._lock:
+            if self._ring is None or self._ring.stale():
+                self._ring = SharedRingBuffer.open(self.path)
+            return self._ring
+
+    def info(self):
+        if self._info is None:
+            self._info = host_info(self.disk_path)
+        return self._info
+
+    def current(self):
+        ring = self.ring()
+        latest = ring.latest() if ring else None
+        if latest is None:
+            row = self.storage.query_one(f"SELECT ts, {', '.join(HOST_FIELDS)} FROM host_metrics_1m "
+                                         f"ORDER BY ts DESC LIMIT 1")
+            latest = dict(row) if row else None
+        return latest
+
+    def series(self, start, end=None, resolution=None):
+        """Serie w układzie kolumnowym; rozdzielczość dobierana do zakresu"""
+        end = end or time.time()
+        ring = self.ring()
+        if resolution is None:
+            if ring and start >= time.time() - RING_MINUTES * 60:
+                resolution = 'raw'
+            elif end - start <= RETENTION_1M:
+                resolution = '1m'
+            else:
+                resolution = '1h'
+
+        if resolution == 'raw':
+            data = ring.series(start, end) if ring else {name: [] for name in ('ts',) + HOST_FIELDS}
+            return {"resolution": 'raw', "interval": self.interval, "series": data}
+
+        table, interval = RESOLUTIONS[resolution]
+        rows = self.storage.query(f"SELECT ts, {', '.join(HOST_FIELDS)} FROM {table} "
+                                  f"WHERE ts >= ? AND ts < ? ORDER BY ts", (start, end))
+        data = {name: [row[i] for row in rows] for i, name in enumerate(('ts',) + HOST_FIELDS)}
+        return {"resolution": resolution, "interval": interval, "series": data}
@@ -0,0 +1,137 @@
+import base64
+import json
+import threading
+from bisect import bisect_left, bisect_right
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+# Ile ostatnich fraz wyszukiwania trzymamy z gotowym zbiorem trafień
+SEARCH_CACHE = 32
+
+# Po czym można sortować i filtrować każdą sekcję
+SORT_FIELDS = {
+    'containers': ('name', 'status', 'image', 'created', 'id'),
+    'images': ('tag', 'size', 'created', 'id'),
+    'volumes': ('name', 'driver'),
+    'networks': ('name', 'driver', 'scope', 'id'),
+    'stacks': ('name', 'containers', 'running'),
+}
+FILTER_FIELDS = {
+    'containers': ('status', 'project', 'label', 'image'),
+    'images': ('dangling',),
+    'volumes': ('driver',),
+    'networks': ('driver', 'scope'),
+    'stacks': ('status',),
+}
+
+
+def encode_cursor(value, key):
+    raw = json.dumps([value, key], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        value, key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return value, key
+    except Exception:
+        raise ValueError("Nieprawidłowy kursor")
+
+
+class SectionIndex:
+    """Indeksy jednej sekcji inwentarza zbudowane raz na wersję.
+
+    Filtry (status, projekt, etykiety...) to gotowe zbiory kluczy, a każde
+    pole sortowania ma posortowaną listę (wartość, klucz), więc strona wyników
+    to bisect + przejście po kilkuset elementach zamiast skanu całej listy.
+    Trafienia wyszukiwania są liczone raz na frazę, bo indeks żyje tylko
+    w obrębie jednej wersji inwentarza.
+    """
+
+    def __init__(self, section, rows):
+        """rows: (klucz, element publiczny, {pole sortowania: wartość},
+        {pole filtra: zbiór wartości}, tekst do wyszukiwania)"""
+        self.section = section
+        self.items = {}
+        self._sort_values = {field: [] for field in SORT_FIELDS[section]}
+        self._value_of = {field: {} for field in SORT_FIELDS[section]}
+        self._postings = {field: {} for field in FILTER_FIELDS[section]}
+        self._search = {}
+        self._search_hits = {}
+        self._search_lock = threading.Lock()
+        for key, item, sort_values, filter_values, search in rows:
+            self.items[key] = item
+            self._search[key] = search.lower()
+            for field in SORT_FIELDS[section]:
+                self._sort_values[field].append((sort_values[field], key))
+                self._value_of[field][key] = sort_values[field]
+            for field, values in filter_values.items():
+                for value in values:
+                    self._postings[field].setdefault(value, set()).add(key)
+        for entries in self._sort_values.values():
+            entries.sort()
+
+    def candidates(self, filters):
+        """Klucze spełniające wszystkie filtry (None - brak filtrów)"""
+        result = None
+        for field, values in filters.items():
+            postings = self._postings.get(field)
+            if postings is None:
+                raise ValueError(f"Nie można filtrować {self.section} po {field}")
+            for value in values:
+                keys = postings.get(value, set())
+                result = set(keys) if result is None else result & keys
+        return result
+
+    def search(self, needle):
+        """Zbiór kluczy, których tekst zawiera frazę; skan tylko przy pierwszym pytaniu"""
+        with self._search_lock:
+            hits = self._search_hits.get(needle)
+        if hits is not None:
+            return hits
+        hits = frozenset(key for key, text in self._search.items() if needle in text)
+        with self._search_lock:
+            if len(self._search_hits) >= SEARCH_CACHE:
+                self._search_hits.pop(next(iter(self._search_hits)))
+            self._search_hits[needle] = hits
+        return hits
+
+    def query(self, filters=None, q=None, sort='name', descending=False, limit=DEFAULT_LIMIT, cursor=None):
+        if sort not in self._sort_values:
+            raise ValueError(f"Nie można sortować {self.section} po {sort}")
+        limit = max(1, min(limit, MAX_LIMIT))
+        allowed = self.candidates(filters or {})
+        if q:
+            hits = self.search(q.lower())
+            allowed = hits if allowed is None else allowed & hits
+
+        entries = self._sort_values[sort]
+        # Mały zbiór po filtrach - sortujemy tylko jego zamiast iść po całym indeksie
+        if allowed is not None and len(allowed) * 8 < len(entries):
+            value_of = self._value_of[sort]
+            entries = sorted((value_of[key], key) for key in allowed)
+
+        if cursor:
+            position = tuple(decode_cursor(cursor))
+            start = bisect_left(entries, position) - 1 if descending else bisect_right(entries, position)
+        else:
+            start = len(entries) - 1 if descending else 0
+
+        page = []
+        step = -1 if descending else 1
+        i = start
+        while 0 <= i < len(entries) and len(page) <= limit:
+            value, key = entries[i]
+            if allowed is None or key in allowed:
+                page.append((value, key))
+            i += step
+
+        has_more = len(page) > limit
+        page = page[:limit]
+        total = len(self.items) if allowed is None else len(allowed)
+
+        return {
+            "items": [self.items[key] for _value, key in page],
+            "total": total,
+            "next_cursor": encode_cursor(*page[-1]) if has_more else None
+        }
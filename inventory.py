@@ -0,0 +1,550 @@
+import threading
+import time
+from collections import deque
+
+from docker_calls import api_calls
+from encoding import compact_section, dumps
+from indexes import FILTER_FIELDS, SORT_FIELDS, SectionIndex
+
+# Co ile sekund pełna rekonsyliacja (na wypadek zgubionych zdarzeń)
+RECONCILE_INTERVAL = 60
+# Ile czekać na pierwszy snapshot zanim /status odda błąd
+READY_TIMEOUT = 10
+# Przerwa przed ponownym podłączeniem do strumienia zdarzeń
+EVENTS_RETRY_DELAY = 2
+
+# Akcje, które nie zmieniają niczego widocznego w panelu
+IGNORED_CONTAINER_ACTIONS = ('exec_create', 'exec_start', 'exec_die', 'exec_detach', 'top', 'attach',
+                             'resize', 'archive-path', 'extract-to-dir', 'export', 'commit', 'copy')
+IMAGE_ACTIONS = ('pull', 'tag', 'untag', 'delete', 'import', 'load', 'push', 'save')
+VOLUME_ACTIONS = ('create', 'destroy', 'prune')
+NETWORK_ACTIONS = ('create', 'destroy', 'remove', 'prune')
+
+# Ile ostatnich zmian trzymać dla klientów pobierających różnice
+CHANGELOG_SIZE = 5000
+# Stan świeżości przenoszony razem ze snapshotem do innych procesów
+FRESHNESS_FIELDS = ('updated_at', 'reconciled_at', 'last_event_at', 'events_connected', 'reconcile_calls', 'error')
+
+SECTIONS = ('containers', 'images', 'volumes', 'networks', 'stacks')
+# Po czym klient rozpoznaje element danej sekcji
+SECTION_KEYS = {'containers': 'id', 'images': 'id', 'volumes': 'name', 'networks': 'id', 'stacks': 'name'}
+# Które widoki trzeba przeliczyć po zmianie surowej sekcji
+DEPENDENTS = {
+    'containers': ('containers', 'stacks'),
+    'images': ('images', 'containers'),
+    'volumes': ('volumes',),
+    'networks': ('networks',),
+}
+
+
+# ============ FORMATOWANIE ============
+# Wszystko budowane jest z odpowiedzi list (containers/json, images/json, ...),
+# bez inspect/reload per obiekt - liczba wywołań nie rośnie z liczbą kontenerów.
+
+CONTAINER_STATES = ('running', 'paused', 'restarting', 'dead')
+
+
+def container_status(state):
+    """Mapuje State z containers/json na status wyświetlany w panelu"""
+    return state if state in CONTAINER_STATES else 'stopped'
+
+
+def image_short_id(image_id):
+    return image_id[:19] if image_id.startswith('sha256:') else image_id[:12]
+
+
+def image_tags(raw):
+    return [tag for tag in (raw.get('RepoTags') or []) if tag != '<none>:<none>']
+
+
+def format_container(raw):
+    labels = raw.get('Labels') or {}
+    names = raw.get('Names') or []
+    return {
+        "id": raw['Id'][:12],
+        "name": names[0].lstrip('/') if names else raw['Id'][:12],
+        "status": container_status(raw.get('State')),
+        "image_id": raw.get('ImageID', ''),
+        "project": labels.get('com.docker.compose.project'),
+        "project_dir": labels.get('com.docker.compose.project.working_dir', ''),
+        "service": labels.get('com.docker.compose.service'),
+        "labels": labels,
+        "created": raw.get('Created', 0)
+    }
+
+
+def format_image(raw):
+    tags = image_tags(raw)
+    size_mb = round(raw.get('Size', 0) / (1024 * 1024), 1)
+    return {
+        "id": image_short_id(raw['Id']).replace("sha256:", ""),
+        "tags": tags if tags else ["<none>:<none>"],
+        "size": f"{size_mb} MB",
+        "repo_tags": tags,
+        "size_bytes": raw.get('Size', 0),
+        "created": raw.get('Created', 0)
+    }
+
+
+def format_volume(raw):
+    return {
+        "name": raw['Name'],
+        "driver": raw.get('Driver', 'unknown'),
+        "mountpoint": (raw.get('Mountpoint') or '')[:50]
+    }
+
+
+def format_network(raw):
+    return {
+        "id": raw['Id'][:12],
+        "name": raw['Name'],
+        "driver": raw.get('Driver', 'unknown'),
+        "scope": raw.get('Scope', 'unknown')
+    }
+
+
+def build_stacks(containers):
+    """Składa listę stacków z etykiet compose kontenerów"""
+    stacks = {}
+    for c in containers:
+        project = c.get('project')
+        if not project:
+            continue
+        if project not in stacks:
+            stacks[project] = {
+                'name': project,
+                'containers': [],
+                'path': c.get('project_dir', '')
+            }
+        stacks[project]['containers'].append({
+            'name': c['name'],
+            'status': 'running' if c['status'] == 'running' else 'stopped'
+        })
+    return list(stacks.values())
+
+
+def public_image(img):
+    return {k: img[k] for k in ('id', 'tags', 'size', 'size_bytes')}
+
+
+def public_container(c, images):
+    image = images.get(c['image_id'])
+    tags = image['repo_tags'] if image else None
+    return {
+        "id": c['id'],
+        "name": c['name'],
+        "status": c['status'],
+        "image": tags[0] if tags else image_short_id(c['image_id'])
+    }
+
+
+# ============ ZBIERANIE ============
+# Jedno wywołanie list na typ zasobu.
+
+def collect_containers(client):
+    return {raw['Id']: format_container(raw) for raw in client.api.containers(all=True)}
+
+
+def collect_images(client):
+    return {raw['Id']: format_image(raw) for raw in client.api.images()}
+
+
+def collect_volumes(client):
+    volumes = client.api.volumes().get('Volumes') or []
+    return {raw['Name']: format_volume(raw) for raw in volumes}
+
+
+def collect_networks(client):
+    return {raw['Id']: format_network(raw) for raw in client.api.networks()}
+
+
+COLLECTORS = {
+    'containers': collect_containers,
+    'images': collect_images,
+    'volumes': collect_volumes,
+    'networks': collect_networks,
+}
+
+
+def collect_all(client):
+    """Pełny zrzut inwentarza; zwraca (sekcje, liczba wywołań API Dockera)"""
+    with api_calls.measure() as measured:
+        sections = {name: collect(client) for name, collect in COLLECTORS.items()}
+    return sections, measured['calls']
+
+
+# ============ INWENTARZ ============
+
+class Inventory:
+    """Model kontenerów, obrazów, volume'ów, sieci i stacków trzymany w pamięci.
+
+    Pełny snapshot budowany jest raz, potem aktualizowany zdarzeniami z
+    client.events(). Okresowa rekonsyliacja łata ewentualnie zgubione zdarzenia.
+    Każda zmiana podbija wersję i trafia do dziennika zmian, z którego
+    strumień /status/stream wysyła klientom same różnice.
+    """
+
+    def __init__(self, client, reconcile_interval=RECONCILE_INTERVAL, gate=None):
+        self.client = client
+        self.reconcile_interval = reconcile_interval
+        # Gdy zwraca False (host nie odpowiada), pętle nie wołają Dockera i trzymamy ostatni stan
+        self.gate = gate
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._raw = {name: {} for name in COLLECTORS}
+        self._views = {name: {} for name in SECTIONS}
+        self._changes = deque(maxlen=CHANGELOG_SIZE)
+        # Wersja startuje od znacznika czasu w ms, żeby rosła także między restartami
+        self.version = int(time.time() * 1000)
+        self._serialized = {}
+        self._indexes = {}
+        self._projects = (None, {})
+        self._ready = threading.Event()
+        self._stop = threading.Event()
+        self._events = None
+        self.error = None
+        self.updated_at = None
+        self.reconciled_at = None
+        self.last_event_at = None
+        self.events_connected = False
+        self.reconcile_calls = None
+
+    # ---- cykl życia ----
+
+    def start(self):
+        threading.Thread(target=self._watch_events, name='inventory-events', daemon=True).start()
+        threading.Thread(target=self._reconcile_loop, name='inventory-reconcile', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        if self._events is not None:
+            self._events.close()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def _available(self):
+        return self.gate is None or self.gate()
+
+    def _reconcile_loop(self):
+        while not self._stop.is_set():
+            if not self._available():
+                self._stop.wait(EVENTS_RETRY_DELAY)
+                continue
+            try:
+                self.reconcile()
+            except Exception as e:
+                self.error = str(e)
+                print(f"⚠️ Błąd rekonsyliacji inwentarza: {e}")
+            self._stop.wait(self.reconcile_interval)
+
+    def _watch_events(self):
+        since = None
+        while not self._stop.is_set():
+            if not self._available():
+                self._stop.wait(EVENTS_RETRY_DELAY)
+                continue
+            try:
+                self._events = self.client.events(decode=True, since=since)
+                self.events_connected = True
+                for event in self._events:
+                    since = event.get('time', since)
+                    self.apply_event(event)
+            except Exception as e:
+                print(f"⚠️ Strumień zdarzeń Dockera przerwany: {e}")
+            self.events_connected = False
+            if self._stop.wait(EVENTS_RETRY_DELAY):
+                break
+            # Mogliśmy zgubić zdarzenia - przebuduj wszystko
+            try:
+                self.reconcile()
+            except Exception as e:
+                self.error = str(e)
+
+    # ---- aktualizacja ----
+
+    def reconcile(self):
+        """Pełna przebudowa snapshotu z Dockera"""
+        sections, calls = collect_all(self.client)
+        with self._lock:
+            self._raw = sections
+            self._publish(SECTIONS)
+            self.error = None
+            self.reconcile_calls = calls
+            self.reconciled_at = self.updated_at
+        self._ready.set()
+
+    def refresh_section(self, name):
+        items = COLLECTORS[name](self.client)
+        with self._lock:
+            self._raw[name] = items
+            self._publish(DEPENDENTS[name])
+
+    def refresh_container(self, container_id):
+        # containers/json z filtrem id - ten sam format co pełna lista, jedno wywołanie
+        found = self.client.api.containers(all=True, filters={'id': container_id})
+        if not found:
+            self.remove_container(container_id)
+            return
+        with self._lock:
+            self._raw['containers'][container_id] = format_container(found[0])
+            self._publish(DEPENDENTS['containers'])
+
+    def remove_container(self, container_id):
+        with self._lock:
+            if self._raw['containers'].pop(container_id, None) is not None:
+                self._publish(DEPENDENTS['containers'])
+
+    def _render(self, section):
+        raw = self._raw
+        if section == 'containers':
+            images = raw['images']
+            return {c['id']: public_container(c, images) for c in raw['containers'].values()}
+        if section == 'images':
+            return {img['id']: public_image(img) for img in raw['images'].values()}
+        if section == 'stacks':
+            return {s['name']: s for s in build_stacks(raw['containers'].values())}
+        return {item[SECTION_KEYS[section]]: item for item in raw[section].values()}
+
+    def _publish(self, sections):
+        """Przelicza widoki sekcji i zapisuje różnice w dzienniku (wywoływać pod lockiem)"""
+        changes = []
+        for section in sections:
+            old = self._views[section]
+            new = self._render(section)
+            for key, item in new.items():
+                previous = old.get(key)
+                if previous is None:
+                    changes.append((section, 'add', key))
+                elif previous != item:
+                    changes.append((section, 'update', key))
+            changes.extend((section, 'remove', key) for key in old.keys() - new.keys())
+            self._views[section] = new
+
+        self.updated_at = time.time()
+        if changes:
+            self.version += 1
+            self._changes.extend((self.version, section, op, key) for section, op, key in changes)
+            self._changed.notify_all()
+
+    def apply_event(self, event):
+        """Nanosi pojedyncze zdarzenie Dockera na model"""
+        kind = event.get('Type')
+        action = (event.get('Action') or '').split(':')[0]
+        actor_id = (event.get('Actor') or {}).get('ID')
+        self.last_event_at = time.time()
+
+        try:
+            if kind == 'container' and actor_id:
+                if action == 'destroy':
+                    self.remove_container(actor_id)
+                elif action not in IGNORED_CONTAINER_ACTIONS:
+                    self.refresh_container(actor_id)
+            elif kind == 'image' and action in IMAGE_ACTIONS:
+                self.refresh_section('images')
+            elif kind == 'volume' and action in VOLUME_ACTIONS:
+                self.refresh_section('volumes')
+            elif kind == 'network' and action in NETWORK_ACTIONS:
+                self.refresh_section('networks')
+        except Exception as e:
+            print(f"⚠️ Nie udało się przetworzyć zdarzenia {kind}/{action}: {e}")
+
+    # ---- stan dla innych procesów ----
+
+    def export_state(self):
+        """Surowe sekcje, dziennik zmian i wersja - wszystko, z czego da się odtworzyć inwentarz"""
+        with self._lock:
+            state = {
+                "version": self.version,
+                "raw": {name: dict(items) for name, items in self._raw.items()},
+                "changes": list(self._changes)
+            }
+            state.update({field: getattr(self, field) for field in FRESHNESS_FIELDS})
+        return state
+
+    @classmethod
+    def from_state(cls, state):
+        """Inwentarz tylko do odczytu odtworzony z export_state() (bez klienta i wątków)"""
+        inventory = cls(None)
+        inventory._raw = state['raw']
+        inventory._views = {section: inventory._render(section) for section in SECTIONS}
+        inventory._changes.extend(tuple(change) for change in state['changes'])
+        inventory.version = state['version']
+        for field in FRESHNESS_FIELDS:
+            setattr(inventory, field, state[field])
+        inventory._ready.set()
+        return inventory
+
+    # ---- odczyt ----
+
+    def wait_ready(self, timeout=READY_TIMEOUT):
+        return self._ready.wait(timeout)
+
+    def wait_for_change(self, version, timeout):
+        """Czeka aż wersja inwentarza przekroczy `version`; zwraca bieżącą wersję"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version > version or self._stop.is_set(), timeout)
+            return self.version
+
+    def container_ids(self, status=None):
+        """Pełne id kontenerów (opcjonalnie tylko o danym statusie), bez pytania Dockera"""
+        with self._lock:
+            return [container_id for container_id, c in self._raw['containers'].items()
+                    if status is None or c['status'] == status]
+
+    def projects(self):
+        """{projekt compose: [kontenery z pełnym id]} budowane raz na wersję"""
+        with self._lock:
+            version, projects = self._projects
+            if version != self.version:
+                projects = {}
+                for container_id, c in self._raw['containers'].items():
+                    if c['project']:
+                        projects.setdefault(c['project'], []).append(dict(c, id=container_id))
+                self._projects = (self.version, projects)
+            return projects
+
+    def image_tags(self):
+        """Tagi (repo:tag) obrazów obecnych na hoście, bez pytania Dockera"""
+        with self._lock:
+            return {tag for image in self._raw['images'].values() for tag in image['repo_tags']}
+
+    def containers(self, refs=None, project=None):
+        """Kontenery (pełne id, nazwa, projekt, serwis, status) wybrane po id/nazwie lub projekcie"""
+        if refs is None and project is not None:
+            return list(self.projects().get(project, ()))
+        with self._lock:
+            items = list(self._raw['containers'].items())
+        if refs is not None:
+            wanted = set(refs)
+            items = [(cid, c) for cid, c in items
+                     if c['name'] in wanted or cid in wanted or cid[:12] in wanted]
+        if project is not None:
+            items = [(cid, c) for cid, c in items if c['project'] == project]
+        return [dict(c, id=cid) for cid, c in items]
+
+    def resolve_container(self, ref):
+        """Pełne id kontenera po id, prefiksie id albo nazwie"""
+        with self._lock:
+            containers = self._raw['containers']
+            if ref in containers:
+                return ref
+            for container_id, c in containers.items():
+                if c['name'] == ref or container_id.startswith(ref):
+                    return container_id
+        return None
+
+    def _index_rows(self, section):
+        """Wiersze dla SectionIndex: (klucz, element, wartości sortowania, wartości filtrów, tekst)"""
+        view = self._views[section]
+        if section == 'containers':
+            for c in self._raw['containers'].values():
+                item = view[c['id']]
+                labels = c['labels']
+                label_values = set(labels) | {f"{k}={v}" for k, v in labels.items()}
+                yield (c['id'], item,
+                       {'name': c['name'], 'status': c['status'], 'image': item['image'],
+                        'created': c['created'] or 0, 'id': c['id']},
+                       {'status': {c['status']}, 'project': {c['project'] or ''}, 'label': label_values,
+                        'image': {item['image']}},
+                       c['name'])
+        elif section == 'images':
+            for img in self._raw['images'].values():
+                yield (img['id'], view[img['id']],
+                       {'tag': img['tags'][0], 'size': img['size_bytes'], 'created': img['created'] or 0,
+                        'id': img['id']},
+                       {'dangling': {'true' if not img['repo_tags'] else 'false'}},
+                       ' '.join(img['tags']))
+        elif section == 'stacks':
+            for stack in view.values():
+                running = sum(1 for c in stack['containers'] if c['status'] == 'running')
+                total = len(stack['containers'])
+                status = 'running' if running == total else ('partial' if running else 'stopped')
+                yield (stack['name'], stack,
+                       {'name': stack['name'], 'containers': total, 'running': running},
+                       {'status': {status}},
+                       stack['name'])
+        else:
+            for key, item in view.items():
+                yield (key, item,
+                       {field: item.get(field, '') for field in SORT_FIELDS[section]},
+                       {field: {item.get(field, '')} for field in FILTER_FIELDS[section]},
+                       item['name'])
+
+    def index(self, section):
+        """(wersja, SectionIndex) sekcji; indeks budowany raz na zmianę inwentarza"""
+        with self._lock:
+            cached = self._indexes.get(section)
+            if cached is None or cached[0] != self.version:
+                cached = self._indexes[section] = (self.version, SectionIndex(section, list(self._index_rows(section))))
+            return cached
+
+    def _counts(self):
+        return {section: len(self._views[section]) for section in SECTIONS}
+
+    def freshness(self):
+        now = time.time()
+        return {
+            "version": self.version,
+            "updated_at": self.updated_at,
+            "reconciled_at": self.reconciled_at,
+            "last_event_at": self.last_event_at,
+            "age": round(now - self.updated_at, 3) if self.updated_at else None,
+            "reconcile_age": round(now - self.reconciled_at, 3) if self.reconciled_at else None,
+            "events_connected": self.events_connected,
+            "reconcile_docker_calls": self.reconcile_calls,
+            "error": self.error
+        }
+
+    def snapshot(self, compact=False):
+        """Dokument w formacie /status, zbudowany wyłącznie z pamięci"""
+        with self._lock:
+            document = {"counts": self._counts()}
+            for section in SECTIONS:
+                items = list(self._views[section].values())
+                document[section] = compact_section(section, items) if compact else items
+            document["version"] = self.version
+        return document
+
+    def snapshot_json(self, compact=False):
+        """Zserializowany snapshot; serializacja odbywa się raz na wersję i format"""
+        version, body = self._serialized.get(compact, (None, None))
+        if version != self.version:
+            document = self.snapshot(compact)
+            body = dumps(document)
+            version = document['version']
+            self._serialized[compact] = (version, body)
+        return version, body
+
+    def changes_since(self, version, compact=False):
+        """Różnice od wersji `version`: {sekcja: {"upsert": [...], "remove": [...]}}.
+
+        Zwraca None, jeśli dziennik nie sięga już tak daleko - wtedy klient
+        potrzebuje pełnego snapshotu. W formacie kompaktowym upsert to
+        {"fields", "rows"} jak w snapshotcie.
+        """
+        with self._lock:
+            # Najstarsza wersja w dzienniku mogła zostać przycięta tylko częściowo
+            if version > self.version or (self._changes and self._changes[0][0] > version):
+                return None
+
+            touched = {}
+            for change_version, section, _op, key in self._changes:
+                if change_version > version:
+                    touched.setdefault(section, set()).add(key)
+
+            sections = {}
+            for section, keys in touched.items():
+                view = self._views[section]
+                upsert = [view[key] for key in keys if key in view]
+                sections[section] = {
+                    "upsert": compact_section(section, upsert) if compact else upsert,
+                    "remove": [key for key in keys if key not in view]
+                }
+            return {
+                "version": self.version,
+                "since": version,
+                "counts": self._counts(),
+                "sections": sections
+            }
@@ -0,0 +1,354 @@
+import itertools
+import json
+import subprocess
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from docker.utils import parse_repository_tag
+
+from metrics import timed
+
+# Ile zadań wykonuje się naraz
+JOB_WORKERS = 4
+# Ile zadań może czekać w kolejce, zanim odrzucimy nowe
+JOB_QUEUE_LIMIT = 32
+# Ile zakończonych zadań trzymamy do podglądu
+JOB_HISTORY = 100
+# Ile ostatnich linii wyjścia trzyma jedno zadanie
+JOB_OUTPUT_LINES = 500
+# Co ile sekund trwające zadania są zapisywane do bazy (tryb wielu workerów)
+JOB_PERSIST_INTERVAL = 1
+# Zadanie innego workera bez zapisu od tylu sekund uznajemy za porzucone (proces zginął)
+JOB_STALE_AFTER = 30
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class Job:
+    """Zadanie w tle: stan, postęp warstw przy pull i przyrostowe wyjście"""
+
+    def __init__(self, kind, target):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.target = target
+        self.status = 'queued'
+        self.message = None
+        self.result = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.layers = {}
+        # Zadanie, na które czekamy (np. wspólne pobieranie obrazu) - jego postęp pokazujemy jako swój
+        self.waiting_for = None
+        self.dedup_key = None
+        self._output = deque(maxlen=JOB_OUTPUT_LINES)
+        self._line_numbers = itertools.count(1)
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'error')
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def log(self, line):
+        with self._lock:
+            self._output.append((next(self._line_numbers), line.rstrip('\n')))
+
+    def pull_progress(self, event):
+        """Aktualizuje postęp warstwy na podstawie zdarzenia ze strumienia pull"""
+        layer = event.get('id')
+        status = event.get('status', '')
+        if not layer or 'progressDetail' not in event:
+            # Komunikaty spoza warstw ("Pulling from ...", "Digest: ...") idą do wyjścia
+            self.log(' '.join(filter(None, (layer, status))))
+            return
+        detail = event.get('progressDetail') or {}
+        with self._lock:
+            entry = self.layers.setdefault(layer, {'status': status, 'current': 0, 'total': 0})
+            entry['status'] = status
+            if detail.get('total'):
+                entry['current'] = detail.get('current', 0)
+                entry['total'] = detail['total']
+            elif status in ('Download complete', 'Pull complete', 'Already exists'):
+                entry['current'] = entry['total']
+
+    def wait_for(self, other):
+        """Czeka na inne zadanie; do tego czasu progress() pokazuje jego warstwy"""
+        self.waiting_for = other
+        other.wait()
+
+    def progress(self):
+        if self.waiting_for is not None:
+            return self.waiting_for.progress()
+        with self._lock:
+            layers = list(self.layers.values())
+        if not layers:
+            return None
+        total = sum(layer['total'] for layer in layers)
+        current = sum(min(layer['current'], layer['total']) for layer in layers)
+        return {
+            "layers": len(layers),
+            "layers_done": sum(1 for layer in layers if layer['status'] in ('Pull complete', 'Already exists')),
+            "bytes_current": current,
+            "bytes_total": total,
+            "percent": round(current * 100 / total, 1) if total else None
+        }
+
+    def record(self):
+        """Pełny stan z numerowanym wyjściem - do zapisu w bazie"""
+        with self._lock:
+            output = list(self._output)
+        return dict(self.to_dict(), output_lines=output)
+
+    def to_dict(self, output_after=None):
+        data = {
+            "id": self.id,
+            "kind": self.kind,
+            "target": self.target,
+            "status": self.status,
+            "message": self.message,
+            "result": self.result,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": self.progress()
+        }
+        if output_after is not None:
+            with self._lock:
+                lines = [(n, line) for n, line in self._output if n > output_after]
+            data["output"] = [line for _n, line in lines]
+            data["output_offset"] = lines[-1][0] if lines else output_after
+        return data
+
+
+class StoredJob:
+    """Zadanie innego procesu odczytane z bazy; ze `store` da się na nie czekać"""
+
+    def __init__(self, record, store=None):
+        self._record = record
+        self._store = store
+        self.id = record['id']
+        self.status = record['status']
+        self.created_at = record['created_at']
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'error')
+
+    @property
+    def message(self):
+        return self._record['message']
+
+    def progress(self):
+        return self._record.get('progress')
+
+    def wait(self, timeout=None):
+        """Śledzi zapis w bazie, aż zadanie się skończy (albo jego proces przestanie je zapisywać)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.finished:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(JOB_PERSIST_INTERVAL)
+            self._refresh()
+        return True
+
+    def _refresh(self):
+        record = self._store.get_job(self.id)
+        if record is None or record['status'] not in ('done', 'error') and \
+                (self._store.job_updated_at(self.id) or 0) < time.time() - JOB_STALE_AFTER:
+            record = dict(record or self._record, status='error',
+                          message="Zadanie przerwane - proces, który je wykonywał, przestał odpowiadać")
+        self._record = record
+        self.status = record['status']
+
+    def to_dict(self, output_after=None):
+        data = {k: v for k, v in self._record.items() if k != 'output_lines'}
+        if output_after is not None:
+            lines = [(n, line) for n, line in self._record['output_lines'] if n > output_after]
+            data["output"] = [line for _n, line in lines]
+            data["output_offset"] = lines[-1][0] if lines else output_after
+        return data
+
+
+class JobManager:
+    """Ograniczona pula wykonawcza dla długich operacji (pull, create, compose up).
+
+    Route zwraca od razu id zadania; postęp i wyjście odpytuje się przez /jobs.
+    Równoczesne pobrania tego samego obrazu dostają to samo zadanie.
+    Z `store` (Storage) zadania trafiają też do bazy, więc przy kilku
+    workerach /jobs/<id> odpowie niezależnie od tego, który je przyjął,
+    a klucz deduplikacji obowiązuje we wszystkich workerach naraz.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, queue_limit=JOB_QUEUE_LIMIT, store=None):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='orbit-jobs')
+        self._queue_limit = queue_limit
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._active_keys = {}
+        self._store = store
+        if store is not None:
+            threading.Thread(target=self._persist_loop, name='jobs-persist', daemon=True).start()
+
+    @staticmethod
+    def _stored_key(job):
+        """Klucz deduplikacji w bazie - tylko dopóki zadanie trwa"""
+        if job.dedup_key is None or job.finished:
+            return None
+        return json.dumps(job.dedup_key)
+
+    def _persist(self, job):
+        if self._store is None:
+            return
+        try:
+            self._store.save_job(job.record(), self._stored_key(job))
+        except Exception as e:
+            print(f"⚠️ Nie udało się zapisać zadania {job.id}: {e}")
+
+    def _persist_loop(self):
+        while True:
+            time.sleep(JOB_PERSIST_INTERVAL)
+            for job in list(self._jobs.values()):
+                # Zadania z kluczem zapisujemy też w kolejce - inne workery po świeżości zapisu
+                # odróżniają czekające zadanie od porzuconego
+                if job.status == 'running' or job.status == 'queued' and job.dedup_key is not None:
+                    self._persist(job)
+
+    def submit(self, kind, target, fn, *args, dedup_key=None):
+        """Kolejkuje fn(job, *args); zwraca (job, czy_nowe).
+
+        Gdy aktywne zadanie z tym samym `dedup_key` ma inny worker, zwraca
+        jego StoredJob - można na nie czekać jak na własne.
+        """
+        with self._lock:
+            if dedup_key is not None and dedup_key in self._active_keys:
+                return self._active_keys[dedup_key], False
+            if self.queue_depth() >= self._queue_limit:
+                raise JobQueueFull("Zbyt wiele zadań w kolejce, spróbuj za chwilę")
+
+            job = Job(kind, target)
+            job.dedup_key = dedup_key
+            if self._store is not None and dedup_key is not None:
+                # Sprawdzenie i zajęcie klucza pod blokadą zapisu bazy - dwa workery nie pobiorą
+                # tego samego obrazu. Pod self._lock, żeby ten proces nie zajmował klucza dwa razy
+                owner = self._store.claim_job(job.record(), self._stored_key(job), JOB_STALE_AFTER)
+                if owner is not None:
+                    return StoredJob(owner, self._store), False
+            self._jobs[job.id] = job
+            if dedup_key is not None:
+                self._active_keys[dedup_key] = job
+            self._prune()
+
+        if self._store is not None and dedup_key is None:
+            self._persist(job)
+        self._executor.submit(self._run, job, fn, args, dedup_key)
+        return job, True
+
+    def cancel(self, job):
+        """Anuluje zadanie, które jeszcze czeka w kolejce; False, gdy już ruszyło"""
+        with self._lock:
+            if job.status != 'queued':
+                return False
+            job.status = 'error'
+            job.message = "Zadanie anulowane"
+            job.finished_at = time.time()
+            if job.dedup_key is not None and self._active_keys.get(job.dedup_key) is job:
+                del self._active_keys[job.dedup_key]
+        self._persist(job)
+        job._done.set()
+        return True
+
+    def _run(self, job, fn, args, dedup_key):
+        with self._lock:
+            # Anulowane, zanim pula do niego doszła
+            if job.status != 'queued':
+                return
+            job.status = 'running'
+        job.started_at = time.time()
+        self._persist(job)
+        try:
+            job.result = fn(job, *args)
+            job.status = 'done'
+        except Exception as e:
+            job.status = 'error'
+            job.message = str(e)
+            job.log(f"❌ {e}")
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if dedup_key is not None and self._active_keys.get(dedup_key) is job:
+                    del self._active_keys[dedup_key]
+            self._persist(job)
+            job._done.set()
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.finished]
+        for job in sorted(finished, key=lambda j: j.finished_at)[:max(0, len(finished) - JOB_HISTORY)]:
+            del self._jobs[job.id]
+        if self._store is not None and len(finished) > JOB_HISTORY:
+            self._store.prune_jobs(JOB_HISTORY)
+
+    def active(self, dedup_key):
+        with self._lock:
+            return self._active_keys.get(dedup_key)
+
+    def queue_depth(self):
+        return self.count('queued')
+
+    def count(self, status):
+        # Kopia listy, bo metryki czytają to z innego wątku niż submit()
+        return sum(1 for job in list(self._jobs.values()) if job.status == status)
+
+    def get(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None and self._store is not None:
+            record = self._store.get_job(job_id)
+            job = StoredJob(record) if record else None
+        return job
+
+    def list(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+        if self._store is not None:
+            local = {job.id for job in jobs}
+            jobs += [StoredJob(record) for record in self._store.list_jobs(JOB_HISTORY) if record['id'] not in local]
+        return sorted(jobs, key=lambda job: job.created_at, reverse=True)[:JOB_HISTORY]
+
+
+# ============ ZADANIA ============
+
+def pull_key(image):
+    repository, tag = parse_repository_tag(image)
+    return ('pull', repository, tag or 'latest')
+
+
+def pull_image(job, client, image):
+    """Pobiera obraz strumieniowo, raportując postęp każdej warstwy"""
+    repository, tag = parse_repository_tag(image)
+    job.log(f"📥 Pobieranie obrazu: {image}")
+    for event in client.api.pull(repository, tag=tag or 'latest', stream=True, decode=True):
+        if 'error' in event:
+            raise RuntimeError(event['error'])
+        job.pull_progress(event)
+    job.message = f"Obraz {image} pobrany"
+    return {"image": image}
+
+
+def run_command(job, command):
+    """Uruchamia polecenie, przekazując jego wyjście linia po linii do zadania"""
+    job.log('$ ' + ' '.join(command))
+    with timed(f"subprocess {' '.join(command[:2])}"):
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+        for line in process.stdout:
+            job.log(line)
+        returncode = process.wait()
+    if returncode != 0:
+        raise RuntimeError(f"Polecenie zakończone kodem {returncode}")
@@ -0,0 +1,430 @@
+import os
+import queue
+import re
+import threading
+import time
+import zlib
+
+from logstream import format_timestamp, log_entries
+from metrics import timed
+from storage import Storage
+
+# Co ile sekund zapisujemy zebrane linie jako segmenty
+FLUSH_INTERVAL = 2
+# Najwięcej linii w jednym segmencie; rowid w indeksie to (id segmentu << LINE_BITS) | numer linii
+SEGMENT_LINES = 4096
+LINE_BITS = 20
+# Ile linii może czekać na zapis, zanim wątki czytające logi zaczną czekać
+QUEUE_LINES = 100_000
+# Co ile sekund dopasowujemy śledzone kontenery do źródeł i inwentarza
+SYNC_INTERVAL = 5
+# Ile linii historii bierzemy z kontenera, którego jeszcze nie archiwizowaliśmy
+INITIAL_TAIL = 1000
+# Retencja: wiek i łączny rozmiar skompresowanych segmentów; sprawdzana co RETENTION_INTERVAL s
+RETENTION_DAYS = float(os.environ.get('ORBIT_LOG_ARCHIVE_DAYS', 7))
+MAX_ARCHIVE_MB = float(os.environ.get('ORBIT_LOG_ARCHIVE_MAX_MB', 1024))
+RETENTION_INTERVAL = 60
+RETENTION_BATCH = 64
+# Wyniki wyszukiwania
+SEARCH_LIMIT = 200
+MAX_SEARCH_LIMIT = 5000
+
+SELECTOR_KINDS = ('project', 'service', 'container', 'label')
+QUERY_TOKEN = re.compile(r'\w+\*?')
+
+
+# ============ SCHEMAT ============
+# Osobny plik obok orbit.db - archiwum rośnie i jest czyszczone niezależnie od reszty danych.
+# Indeks FTS5 jest bezzawartościowy (content=''): treść linii leży tylko w skompresowanych
+# segmentach, a rowid wskazuje segment i numer linii w nim.
+
+LOG_MIGRATIONS = [
+    (1, "archiwum logów", [
+        '''CREATE TABLE IF NOT EXISTS log_segments
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            container_id TEXT,
+            container TEXT,
+            project TEXT,
+            service TEXT,
+            first_ts INTEGER,
+            last_ts INTEGER,
+            lines INTEGER,
+            raw_bytes INTEGER,
+            stored_bytes INTEGER,
+            data BLOB)''',
+        "CREATE INDEX IF NOT EXISTS idx_log_segments_last_ts ON log_segments (last_ts)",
+        "CREATE INDEX IF NOT EXISTS idx_log_segments_project ON log_segments (project, last_ts)",
+        "CREATE VIRTUAL TABLE IF NOT EXISTS log_lines USING fts5(line, content='', tokenize='unicode61')",
+        '''CREATE TABLE IF NOT EXISTS log_cursors
+           (container_id TEXT PRIMARY KEY,
+            ts INTEGER)''',
+        '''CREATE TABLE IF NOT EXISTS log_sources
+           (selector TEXT PRIMARY KEY,
+            created_at REAL)''',
+    ]),
+]
+
+
+def archive_path(db_path):
+    return os.path.join(os.path.dirname(db_path) or '.', 'orbit-logs.db')
+
+
+def parse_selector(value):
+    """'*', 'project:web', 'service:api', 'container:nginx', 'label:klucz=wartość' -> (rodzaj, wartość)"""
+    value = (value or '').strip()
+    if value == '*':
+        return '*', None
+    kind, _, target = value.partition(':')
+    if kind not in SELECTOR_KINDS or not target or (kind == 'label' and target.startswith('=')):
+        raise ValueError(f"Nieprawidłowe źródło logów: {value} (np. project:web, container:nginx, label:k=v, *)")
+    return kind, target
+
+
+def selector_matches(selector, c):
+    kind, target = selector
+    if kind == '*':
+        return True
+    if kind == 'label':
+        key, _, expected = target.partition('=')
+        labels = c.get('labels') or {}
+        return key in labels and (not expected or labels[key] == expected)
+    return c.get('name' if kind == 'container' else kind) == target
+
+
+def fts_query(text):
+    """Tekst z pola wyszukiwania -> zapytanie FTS5: wszystkie słowa (słowo* = prefiks)"""
+    tokens = QUERY_TOKEN.findall(text or '')
+    if not tokens:
+        raise ValueError("Zapytanie nie zawiera żadnego słowa")
+    return ' '.join(f'"{token[:-1]}"*' if token.endswith('*') else f'"{token}"' for token in tokens)
+
+
+def pack_segment(lines):
+    raw = '\n'.join(f'{ts_ns}\t{message}' for ts_ns, message in lines).encode()
+    return raw, zlib.compress(raw, 6)
+
+
+def unpack_segment(data):
+    entries = []
+    for row in zlib.decompress(data).decode().split('\n'):
+        ts_ns, _, message = row.partition('\t')
+        entries.append((int(ts_ns), message))
+    return entries
+
+
+class LogArchive:
+    """Archiwum logów w SQLite: skompresowane segmenty, indeks FTS5, retencja.
+
+    Wyszukiwanie czyta tylko bazę - nie woła Dockera, więc działa w każdym
+    procesie (także w workerach) i dla kontenerów, których już nie ma.
+    """
+
+    def __init__(self, path, max_bytes=MAX_ARCHIVE_MB * 1024 * 1024, max_age=RETENTION_DAYS * 86400):
+        self.storage = Storage(path, migrations=LOG_MIGRATIONS)
+        self.storage.migrate()
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    # ---- źródła ----
+
+    def sources(self):
+        return [row['selector'] for row in self.storage.query("SELECT selector FROM log_sources ORDER BY selector")]
+
+    def add_source(self, selector):
+        parse_selector(selector)
+        self.storage.execute("INSERT OR IGNORE INTO log_sources (selector, created_at) VALUES (?, ?)",
+                             (selector.strip(), time.time()))
+
+    def remove_source(self, selector):
+        return self.storage.execute("DELETE FROM log_sources WHERE selector = ?", (selector,))
+
+    def cursors(self):
+        return {row['container_id']: row['ts'] for row in self.storage.query("SELECT container_id, ts FROM log_cursors")}
+
+    # ---- zapis ----
+
+    def write(self, batches):
+        """Zapisuje {container_id: (metadane, [(ts_ns, linia)])} w jednej transakcji razem z kursorami"""
+        with self.storage.transaction() as conn:
+            for container_id, (meta, lines) in batches.items():
+                for start in range(0, len(lines), SEGMENT_LINES):
+                    chunk = lines[start:start + SEGMENT_LINES]
+                    raw, data = pack_segment(chunk)
+                    segment_id = conn.execute(
+                        "INSERT INTO log_segments (container_id, container, project, service, first_ts, last_ts, "
+                        "lines, raw_bytes, stored_bytes, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        (container_id, meta.get('name'), meta.get('project'), meta.get('service'),
+                         min(ts for ts, _ in chunk), max(ts for ts, _ in chunk),
+                         len(chunk), len(raw), len(data), data)).lastrowid
+                    conn.executemany("INSERT INTO log_lines (rowid, line) VALUES (?, ?)",
+                                     [((segment_id << LINE_BITS) | i, message)
+                                      for i, (_, message) in enumerate(chunk)])
+                conn.execute("INSERT OR REPLACE INTO log_cursors (container_id, ts) VALUES (?, ?)",
+                             (container_id, lines[-1][0]))
+
+    # ---- retencja ----
+
+    def _delete_segments(self, conn, rows):
+        for row in rows:
+            # Bezzawartościowy FTS5 usuwa wpisy tylko po podaniu oryginalnej treści
+            conn.executemany("INSERT INTO log_lines (log_lines, rowid, line) VALUES ('delete', ?, ?)",
+                             [((row['id'] << LINE_BITS) | i, message)
+                              for i, (_, message) in enumerate(unpack_segment(row['data']))])
+        conn.executemany("DELETE FROM log_segments WHERE id = ?", [(row['id'],) for row in rows])
+
+    def enforce_retention(self, now=None):
+        """Usuwa segmenty starsze niż max_age, potem najstarsze ponad max_bytes; zwraca liczbę usuniętych"""
+        cutoff = int(((now or time.time()) - self.max_age) * 1e9)
+        removed = 0
+        while True:
+            with self.storage.transaction() as conn:
+                rows = conn.execute("SELECT id, data FROM log_segments WHERE last_ts < ? ORDER BY id LIMIT ?",
+                                    (cutoff, RETENTION_BATCH)).fetchall()
+                if not rows:
+                    excess = conn.execute("SELECT COALESCE(SUM(stored_bytes), 0) FROM log_segments").fetchone()[0] \
+                        - self.max_bytes
+                    if excess <= 0:
+                        break
+                    rows = []
+                    for row in conn.execute("SELECT id, data, stored_bytes FROM log_segments ORDER BY id LIMIT ?",
+                                            (RETENTION_BATCH,)):
+                        rows.append(row)
+                        excess -= row['stored_bytes']
+                        if excess <= 0:
+                            break
+                self._delete_segments(conn, rows)
+                removed += len(rows)
+        if removed:
+            with self.storage.transaction() as conn:
+                # Scala segmenty indeksu, żeby znaczniki usunięcia nie zostawały w nim na długo
+                conn.execute("INSERT INTO log_lines (log_lines, rank) VALUES ('merge', 500)")
+            print(f"🗄️ Retencja archiwum logów: usunięto {removed} segmentów")
+        return removed
+
+    # ---- odczyt ----
+
+    def stats(self):
+        row = self.storage.query_one(
+            "SELECT COUNT(*) AS segments, COALESCE(SUM(lines), 0) AS lines, COALESCE(SUM(raw_bytes), 0) AS raw_bytes, "
+            "COALESCE(SUM(stored_bytes), 0) AS stored_bytes, MIN(first_ts) AS oldest, MAX(last_ts) AS newest "
+            "FROM log_segments")
+        stats = dict(row)
+        stats['oldest'] = format_timestamp(stats['oldest']) if stats['oldest'] else None
+        stats['newest'] = format_timestamp(stats['newest']) if stats['newest'] else None
+        stats['max_bytes'] = int(self.max_bytes)
+        stats['max_age'] = self.max_age
+        return stats
+
+    def search(self, query=None, project=None, service=None, container=None, since=None, until=None,
+               limit=SEARCH_LIMIT):
+        """Linie pasujące do zapytania w oknie czasu, od najnowszych.
+
+        Najpierw wybieramy segmenty po metadanych (projekt, serwis, kontener,
+        czas), potem pytamy indeks FTS5 tylko o zakres rowid tych segmentów.
+        Rozpakowujemy wyłącznie segmenty z trafieniami.
+        """
+        started = time.perf_counter()
+        limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+        match = fts_query(query) if query else None
+        since = since or 0
+        until = until or time.time_ns()
+
+        where, params = ["last_ts >= ?", "first_ts <= ?"], [since, until]
+        for column, value in (('project', project), ('service', service)):
+            if value:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if container:
+            where.append("(container = ? OR container_id LIKE ?)")
+            params += [container, f'{container}%']
+
+        with timed('sqlite log search'), self.storage.connection() as conn:
+            segments = {row['id']: row for row in conn.execute(
+                f"SELECT id, container_id, container, project, service FROM log_segments "
+                f"WHERE {' AND '.join(where)} ORDER BY id DESC", params)}
+            if match:
+                hits = self._index_hits(conn, match, segments)
+            else:
+                hits = ((segment_id, None) for segment_id in segments)
+
+            results, unpacked = [], {}
+            for segment_id, index in hits:
+                if segment_id not in unpacked:
+                    data = conn.execute("SELECT data FROM log_segments WHERE id = ?", (segment_id,)).fetchone()
+                    unpacked[segment_id] = unpack_segment(data[0]) if data else []
+                entries = unpacked[segment_id]
+                if index is None:
+                    picked = [entry for entry in reversed(entries)]
+                elif index < len(entries):
+                    picked = [entries[index]]
+                else:
+                    picked = []
+                for ts_ns, message in picked:
+                    if since <= ts_ns <= until:
+                        results.append((ts_ns, segments[segment_id], message))
+                if len(results) >= limit:
+                    break
+
+        results.sort(key=lambda item: item[0], reverse=True)
+        return {
+            "lines": [{
+                "ts": format_timestamp(ts_ns),
+                "container": segment['container'],
+                "container_id": segment['container_id'][:12],
+                "project": segment['project'],
+                "service": segment['service'],
+                "line": message
+            } for ts_ns, segment, message in results[:limit]],
+            "truncated": len(results) >= limit,
+            "segments": len(segments),
+            "segments_read": len(unpacked),
+            "took_ms": round((time.perf_counter() - started) * 1000, 2)
+        }
+
+    def _index_hits(self, conn, match, segments):
+        """(segment, numer linii) z indeksu, od najnowszych, tylko dla wybranych segmentów"""
+        if not segments:
+            return
+        low, high = min(segments) << LINE_BITS, ((max(segments) + 1) << LINE_BITS) - 1
+        rows = conn.execute("SELECT rowid FROM log_lines WHERE log_lines MATCH ? AND rowid BETWEEN ? AND ? "
+                            "ORDER BY rowid DESC", (match, low, high))
+        for (rowid,) in rows:
+            segment_id = rowid >> LINE_BITS
+            if segment_id in segments:
+                yield segment_id, rowid & ((1 << LINE_BITS) - 1)
+
+
+class LogIngester:
+    """Wątki śledzące logi wybranych kontenerów i jeden wątek zapisujący segmenty.
+
+    Każdy kontener czyta od swojego kursora (znacznik czasu ostatniej
+    zapisanej linii), więc restart kontenera ani Orbita nie gubi i nie
+    dubluje linii. Kursor zapisujemy w tej samej transakcji co segment i
+    dopiero po commicie przesuwamy go w pamięci - linie z kolejki, które nie
+    trafiły do bazy, strumień otwarty na nowo przeczyta jeszcze raz.
+    """
+
+    def __init__(self, client, inventory, archive):
+        self.client = client
+        self.inventory = inventory
+        self.archive = archive
+        self._lock = threading.Lock()
+        self._queue = queue.Queue(maxsize=QUEUE_LINES)
+        self._followed = {}
+        self._cursors = archive.cursors()
+        self._stop = threading.Event()
+        self.flushed_at = None
+
+    def start(self):
+        threading.Thread(target=self._sync_loop, name='logs-sync', daemon=True).start()
+        threading.Thread(target=self._write_loop, name='logs-writer', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def followed(self):
+        with self._lock:
+            return sorted(c['name'] for c in self._followed.values())
+
+    # ---- strumienie ----
+
+    def _sync_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"⚠️ Błąd synchronizacji archiwum logów: {e}")
+            self._stop.wait(SYNC_INTERVAL)
+
+    def selected(self):
+        """Działające kontenery pasujące do któregoś ze źródeł"""
+        selectors = []
+        for value in self.archive.sources():
+            try:
+                selectors.append(parse_selector(value))
+            except ValueError:
+                continue
+        if not selectors or not self.inventory.wait_ready(0):
+            return []
+        return [c for c in self.inventory.containers()
+                if c['status'] == 'running' and any(selector_matches(s, c) for s in selectors)]
+
+    def sync(self):
+        with self._lock:
+            # Strumień kończy się razem z kontenerem; po starcie otwieramy go od kursora
+            for c in self.selected():
+                if c['id'] not in self._followed:
+                    self._followed[c['id']] = c
+                    threading.Thread(target=self._follow, args=(c,),
+                                     name=f'logs-{c["id"][:12]}', daemon=True).start()
+
+    def _follow(self, c):
+        container_id = c['id']
+        meta = {'name': c['name'], 'project': c.get('project'), 'service': c.get('service')}
+        cursor = self._cursors.get(container_id)
+        try:
+            entries = log_entries(self.client, container_id, follow=True, since=cursor,
+                                  tail='all' if cursor else INITIAL_TAIL)
+            for _, ts_ns, message in entries:
+                if self._stop.is_set():
+                    break
+                ts_ns = ts_ns or time.time_ns()
+                self._queue.put((container_id, meta, ts_ns, message))
+        except Exception as e:
+            if not self._stop.is_set():
+                print(f"⚠️ Archiwizacja logów {container_id[:12]} przerwana: {e}")
+        finally:
+            with self._lock:
+                self._followed.pop(container_id, None)
+
+    # ---- zapis ----
+
+    def _write_loop(self):
+        last_retention = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.flush(self._drain())
+                if time.monotonic() - last_retention >= RETENTION_INTERVAL:
+                    last_retention = time.monotonic()
+                    self.archive.enforce_retention()
+            except Exception as e:
+                print(f"⚠️ Błąd zapisu archiwum logów: {e}")
+
+    def _drain(self):
+        """Linie zebrane przez FLUSH_INTERVAL, pogrupowane po kontenerze"""
+        deadline = time.monotonic() + FLUSH_INTERVAL
+        batches = {}
+        while True:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                container_id, meta, ts_ns, message = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batches.setdefault(container_id, (meta, []))[1].append((ts_ns, message))
+        return batches
+
+    def flush(self, batches):
+        batches = self._unseen(batches)
+        if batches:
+            self.archive.write(batches)
+            for container_id, (_meta, lines) in batches.items():
+                self._cursors[container_id] = lines[-1][0]
+            self.flushed_at = time.time()
+
+    def _unseen(self, batches):
+        """Pomija linie nie nowsze niż zapisany kursor - strumień otwarty ponownie od kursora
+        powtarza te, które czekały jeszcze w kolejce"""
+        fresh = {}
+        for container_id, (meta, lines) in batches.items():
+            last = self._cursors.get(container_id) or 0
+            kept = []
+            for ts_ns, message in lines:
+                if ts_ns > last:
+                    kept.append((ts_ns, message))
+                    last = ts_ns
+            if kept:
+                fresh[container_id] = (meta, kept)
+        return fresh
@@ -0,0 +1,159 @@
+import calendar
+import json
+import re
+import time
+from collections import deque
+
+# Dłuższe linie są przycinane - bufor na niepełną linię nie rośnie bez końca
+MAX_LINE_BYTES = 16 * 1024
+DEFAULT_TAIL = 100
+MAX_TAIL = 5000
+
+TIMESTAMP_RE = re.compile(r'(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.(\d{1,9}))?Z')
+
+
+def timestamp_ns(value):
+    """Kursor (RFC3339 z logów albo sekundy unix) -> nanosekundy od epoki"""
+    value = value.strip()
+    match = TIMESTAMP_RE.fullmatch(value)
+    if match:
+        seconds = calendar.timegm(time.strptime(match.group(1), '%Y-%m-%dT%H:%M:%S'))
+        return seconds * 1_000_000_000 + int((match.group(2) or '0').ljust(9, '0'))
+    try:
+        ts_ns = int(float(value) * 1_000_000_000)
+    except (ValueError, OverflowError):
+        raise ValueError(f"Nieprawidłowy znacznik czasu: {value}")
+    if ts_ns < 0:
+        raise ValueError(f"Znacznik czasu nie może być ujemny: {value}")
+    return ts_ns
+
+
+def format_timestamp(ts_ns):
+    """Nanosekundy od epoki -> RFC3339 w formacie Dockera"""
+    seconds, fraction = divmod(ts_ns, 1_000_000_000)
+    return time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(seconds)) + f'.{fraction:09d}Z'
+
+
+class LineFilter:
+    """Filtr linii wykonywany po stronie serwera: podciąg albo wyrażenie regularne"""
+
+    def __init__(self, pattern=None, regex=False, ignore_case=False):
+        self.active = bool(pattern)
+        self._search = None
+        if not self.active:
+            return
+        if regex:
+            try:
+                self._search = re.compile(pattern, re.IGNORECASE if ignore_case else 0).search
+            except re.error as e:
+                raise ValueError(f"Nieprawidłowe wyrażenie regularne: {e}")
+        elif ignore_case:
+            needle = pattern.lower()
+            self._search = lambda text: needle in text.lower()
+        else:
+            self._search = lambda text: pattern in text
+
+    def match(self, text):
+        return not self.active or bool(self._search(text))
+
+
+def iter_lines(chunks, max_line=MAX_LINE_BYTES):
+    """Dzieli strumień bajtów na linie, trzymając w pamięci co najwyżej jedną linię"""
+    pending = b''
+    overflow = False
+    for chunk in chunks:
+        pending += chunk
+        lines = pending.split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            if overflow:
+                # Reszta przyciętej linii
+                overflow = False
+                continue
+            yield line
+        if len(pending) > max_line:
+            if not overflow:
+                yield pending[:max_line]
+            overflow = True
+            pending = b''
+    if pending and not overflow:
+        yield pending
+
+
+def split_timestamp(line):
+    text = line.decode('utf-8', errors='replace').rstrip('\r')
+    ts, _, message = text.partition(' ')
+    return ts, message
+
+
+def log_entries(client, container_id, follow=False, tail=DEFAULT_TAIL, since=None, until=None,
+                stdout=True, stderr=True):
+    """Generator krotek (ts, ts_ns, linia) z logów kontenera.
+
+    `since` i `until` to kursory w nanosekundach; linie leżące dokładnie na
+    kursorze są pomijane, więc kursor można podawać wprost z ostatniej linii.
+    ts_ns jest None, gdy linia nie ma znacznika czasu.
+    """
+    if until is None or tail is None:
+        yield from _read_entries(client, container_id, follow, tail, since, until, stdout, stderr)
+        return
+    # Docker bierze `tail` ostatnich linii całego logu i dopiero z nich odrzuca te po `until` -
+    # przy stronicowaniu wstecz strona byłaby pusta. Czytamy wszystko do kursora, zostawiamy ostatnie `tail`.
+    yield from deque(_read_entries(client, container_id, False, None, since, until, stdout, stderr), maxlen=tail)
+
+
+def _read_entries(client, container_id, follow, tail, since, until, stdout, stderr):
+    params = {
+        'stdout': stdout,
+        'stderr': stderr,
+        'timestamps': True,
+        'follow': follow,
+        'stream': True,
+        'tail': tail if tail is not None else 'all'
+    }
+    # Docker porównuje włącznie i z precyzją floata - bierzemy szersze okno i docinamy sami.
+    # Kursor w pierwszej mikrosekundzie epoki to "od początku" - docker-py nie przyjmie since <= 0
+    if since is not None and since / 1e9 - 1e-6 > 0:
+        params['since'] = since / 1e9 - 1e-6
+    if until is not None:
+        params['until'] = until / 1e9 + 1e-6
+
+    chunks = client.api.logs(container_id, **params)
+    try:
+        for line in iter_lines(chunks):
+            ts, message = split_timestamp(line)
+            try:
+                ts_ns = timestamp_ns(ts)
+            except ValueError:
+                ts_ns = None
+            if ts_ns is not None:
+                if since is not None and ts_ns <= since:
+                    continue
+                if until is not None and ts_ns >= until:
+                    continue
+            yield ts, ts_ns, message
+    finally:
+        close = getattr(chunks, 'close', None)
+        if close:
+            close()
+
+
+def stream_logs(client, container_id, follow=False, tail=DEFAULT_TAIL, since=None, until=None,
+                stdout=True, stderr=True, line_filter=None):
+    """Generator linii NDJSON {"ts", "line"} z logów kontenera (kursory jak w log_entries)"""
+    line_filter = line_filter or LineFilter()
+    entries = log_entries(client, container_id, follow=follow, tail=tail, since=since, until=until,
+                          stdout=stdout, stderr=stderr)
+    try:
+        batch = []
+        for ts, _, message in entries:
+            if not line_filter.match(message):
+                continue
+            batch.append(json.dumps({"ts": ts, "line": message}, ensure_ascii=False))
+            if follow or len(batch) >= 100:
+                yield '\n'.join(batch) + '\n'
+                batch = []
+        if batch:
+            yield '\n'.join(batch) + '\n'
+    finally:
+        entries.close()
@@ -0,0 +1,207 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Progi histogramów czasu (sekundy) - od pojedynczego zapytania SQLite po wolny compose
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Progi histogramu liczby wywołań Dockera na jeden request
+CALL_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100)
+# Requesty wolniejsze niż tyle ms trafiają do logu z rozbiciem na spany
+SLOW_REQUEST_MS = 500
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f"{self.name}{format_labels(self.labels, values)} {format_value(value)}"
+                     for values, value in items)
+        return lines
+
+
+class Histogram:
+    """Histogram o stałych progach: licznik na próg, suma i liczba obserwacji"""
+
+    def __init__(self, name, help, labels=(), buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((values, (list(counts), total, count)) for values, (counts, total, count) in self._series.items())
+        for values, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += bucket_count
+                le = bound if bound == '+Inf' else format_value(float(bound))
+                labels = format_labels(self.labels + ('le',), values + (le,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labels, values)
+            lines.append(f"{self.name}_sum{labels} {format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Gauge:
+    """Wartość odczytywana w chwili scrape'u z funkcji zwracającej liczbę albo {etykiety: liczba}"""
+
+    def __init__(self, name, help, read, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.read = read
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            value = self.read()
+        except Exception:
+            return lines
+        if value is None:
+            return lines
+        if isinstance(value, dict):
+            lines.extend(f"{self.name}{format_labels(self.labels, key)} {format_value(v)}"
+                         for key, v in sorted(value.items()))
+        else:
+            lines.append(f"{self.name} {format_value(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DURATION_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge(self, name, help, read, labels=()):
+        return self.register(Gauge(name, help, read, labels))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+http_duration = registry.histogram(
+    'orbit_http_request_duration_seconds', "Czas obsługi requestu (do nagłówków odpowiedzi)",
+    ('method', 'route', 'status'))
+http_docker_calls = registry.histogram(
+    'orbit_http_request_docker_calls', "Wywołania Engine API wykonane przez jeden request",
+    ('method', 'route'), buckets=CALL_BUCKETS)
+docker_requests = registry.counter(
+    'orbit_docker_api_requests_total', "Wywołania Engine API wg endpointu", ('method', 'endpoint'))
+docker_duration = registry.histogram(
+    'orbit_docker_api_request_duration_seconds', "Czas wywołania Engine API (do nagłówków odpowiedzi)",
+    ('method', 'endpoint'))
+span_duration = registry.histogram(
+    'orbit_span_duration_seconds', "Czas operacji w hot-pathach: SQLite, compose, ...", ('span',))
+
+
+# ============ SPANY REQUESTU ============
+# Ślad bieżącego requestu trzymany per wątek; poza requestem (wątki w tle)
+# spany trafiają tylko do histogramów.
+
+_local = threading.local()
+
+
+def start_trace():
+    _local.trace = {}
+    _local.started = time.perf_counter()
+
+
+def current_trace():
+    return getattr(_local, 'trace', None)
+
+
+def record(span, seconds):
+    """Dolicza czas spanu do bieżącego requestu (jeśli jest)"""
+    trace = current_trace()
+    if trace is not None:
+        entry = trace.get(span)
+        if entry is None:
+            trace[span] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+
+@contextmanager
+def timed(span):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        span_duration.observe(elapsed, span)
+        record(span, elapsed)
+
+
+def finish_trace(method, route, status, docker_calls):
+    """Zamyka ślad requestu: histogramy i log wolnego requestu"""
+    trace = current_trace()
+    if trace is None:
+        return
+    elapsed = time.perf_counter() - _local.started
+    _local.trace = None
+    http_duration.observe(elapsed, method, route, str(status))
+    http_docker_calls.observe(docker_calls, method, route)
+
+    if elapsed * 1000 >= SLOW_REQUEST_MS:
+        spans = ', '.join(f"{span} {seconds * 1000:.0f}ms ×{count}"
+                          for span, (count, seconds) in sorted(trace.items(), key=lambda item: -item[1][1]))
+        print(f"🐢 Wolny request {method} {route} ({status}): {elapsed * 1000:.0f}ms"
+              + (f" - {spans}" if spans else ""))
@@ -0,0 +1,546 @@
+import fnmatch
+import json
+import queue
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import deque
+
+from metrics import timed
+
+# Zdarzenia, o których powiadamiamy; restart_loop wykrywamy sami z serii "die"
+EVENT_KINDS = ('die', 'oom', 'restart_loop', 'unhealthy', 'healthy')
+SINK_KINDS = ('webhook', 'discord', 'slack', 'telegram')
+# Filtr po stronie silnika: reszta zdarzeń (exec, attach, stats...) w ogóle do nas nie płynie.
+# Docker dopasowuje "health_status" także do "health_status: healthy"; "kill" poprzedza
+# "die" przy stop i restart - z panelu i z CLI.
+DOCKER_FILTERS = {'type': ['container'], 'event': ['die', 'oom', 'health_status', 'kill']}
+
+# Pętla restartów: tyle "die" jednego kontenera w tym oknie (s)
+RESTART_LOOP_COUNT = 3
+RESTART_LOOP_WINDOW = 300
+# "die" do tylu sekund po "kill" to zatrzymanie na żądanie (stop czeka do 10 s przed SIGKILL)
+STOP_GRACE = 60
+# Co ile sekund przeładowujemy reguły z bazy i dopasowujemy subskrypcje do hostów
+SYNC_INTERVAL = 5
+# Po przerwaniu strumienia zdarzeń hosta
+EVENTS_RETRY_DELAY = 2
+# Wiadomości testowe zlecone przez workery; starsze (np. sprzed startu kolektora) przepadają
+TEST_MAX_AGE = 60
+
+# Odbiorca zbiera zdarzenia przez BATCH_WINDOW s (najwyżej BATCH_MAX) i wysyła jedną wiadomość
+BATCH_WINDOW = 5
+BATCH_MAX = 50
+# Kolejka odbiorcy; gdy się zapełni, najstarsze zdarzenia przepadają (i są liczone)
+SINK_QUEUE = 1000
+# Domyślny limit wiadomości na minutę; Discord i Slack przyjmują ~30/min na webhook
+RATE_PER_MINUTE = 20
+RATE_BURST = 3
+# Ponowienia wysyłki: przerwy RETRY_BACKOFF, 2x, 4x... (albo Retry-After przy 429)
+MAX_RETRIES = 4
+RETRY_BACKOFF = 1
+MAX_RETRY_DELAY = 60
+DELIVERY_TIMEOUT = 10
+# Ile nazw kontenerów wypisujemy w jednej linii wiadomości
+NAMES_PER_LINE = 8
+MAX_MESSAGE_CHARS = 1900
+
+KIND_LABELS = {
+    'die': ('🔴', "zatrzymane z błędem"),
+    'oom': ('💥', "brak pamięci (OOM)"),
+    'restart_loop': ('🔁', "pętla restartów"),
+    'unhealthy': ('🟠', "unhealthy"),
+    'healthy': ('🟢', "znów healthy"),
+    'test': ('🔔', "wiadomość testowa"),
+}
+# Kody wyjścia po `docker stop` (0, SIGTERM, SIGKILL po limicie czasu) - to nie awaria
+STOP_EXIT_CODES = ('0', '143', '137')
+
+
+class DeliveryError(Exception):
+    def __init__(self, message, retry_after=None, permanent=False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.permanent = permanent
+
+
+# ============ ZDARZENIA ============
+
+def event_kind(raw):
+    """Rodzaj zdarzenia Dockera w naszym słowniku albo None (np. "health_status: starting")"""
+    action = raw.get('Action') or raw.get('status') or ''
+    if action in ('die', 'oom'):
+        return action
+    if action.startswith('health_status'):
+        status = action.partition(':')[2].strip()
+        return status if status in ('healthy', 'unhealthy') else None
+    return None
+
+
+def normalize(host, raw, kind):
+    attributes = raw.get('Actor', {}).get('Attributes', {})
+    return {
+        "kind": kind,
+        "host": host.id,
+        "host_name": host.name,
+        "container_id": raw.get('Actor', {}).get('ID', raw.get('id', ''))[:12],
+        "container": attributes.get('name', ''),
+        "project": attributes.get('com.docker.compose.project'),
+        "service": attributes.get('com.docker.compose.service'),
+        "image": attributes.get('image'),
+        "exit_code": attributes.get('exitCode'),
+        "time": raw.get('time') or int(time.time())
+    }
+
+
+class RestartLoopDetector:
+    """Seria RESTART_LOOP_COUNT awarii jednego kontenera w RESTART_LOOP_WINDOW s to pętla restartów.
+
+    Po zgłoszeniu licznik startuje od zera - kolejna pętla to kolejne
+    RESTART_LOOP_COUNT awarii, a nie każda następna. "die" poprzedzone
+    przez "kill" (stop albo restart z panelu czy CLI) nie jest awarią.
+    """
+
+    def __init__(self, count=RESTART_LOOP_COUNT, window=RESTART_LOOP_WINDOW, stop_grace=STOP_GRACE):
+        self.count = count
+        self.window = window
+        self.stop_grace = stop_grace
+        self._deaths = {}
+        self._stopping = {}
+        self._lock = threading.Lock()
+
+    def stopping(self, host_id, container_id, now):
+        with self._lock:
+            self._stopping[(host_id, container_id)] = now
+
+    def died(self, host_id, container_id, now):
+        with self._lock:
+            stopping_at = self._stopping.pop((host_id, container_id), None)
+            if stopping_at is not None and now - stopping_at <= self.stop_grace:
+                return False
+            deaths = self._deaths.setdefault((host_id, container_id), deque())
+            deaths.append(now)
+            while deaths and deaths[0] < now - self.window:
+                deaths.popleft()
+            if len(deaths) < self.count:
+                return False
+            deaths.clear()
+            return True
+
+    def prune(self, now):
+        with self._lock:
+            for key in [key for key, deaths in self._deaths.items() if not deaths or deaths[-1] < now - self.window]:
+                del self._deaths[key]
+            for key in [key for key, at in self._stopping.items() if at < now - self.stop_grace]:
+                del self._stopping[key]
+
+
+# ============ REGUŁY ============
+
+def validate_rule(events, project=None, container=None, host_id=None):
+    unknown = [event for event in events if event not in EVENT_KINDS]
+    if not events or unknown:
+        raise ValueError(f"Nieznane zdarzenia: {', '.join(unknown) or 'brak'} (dostępne: {', '.join(EVENT_KINDS)})")
+    if any(value is not None and not isinstance(value, str) for value in (project, container)):
+        raise ValueError("project i container muszą być tekstem")
+    if host_id is not None and not isinstance(host_id, int):
+        raise ValueError("host_id musi być liczbą")
+
+
+class RuleIndex:
+    """Reguły skompilowane raz przy przeładowaniu: indeks rodzaj -> projekt -> [(reguła, wzorzec nazwy)].
+
+    Zdarzenie sprawdza tylko reguły swojego rodzaju i projektu (plus reguły
+    bez projektu); wzorce nazw kontenerów (fnmatch) są już wyrażeniami regularnymi.
+    """
+
+    def __init__(self, rules=()):
+        self.rules = list(rules)
+        self._index = {}
+        for rule in self.rules:
+            pattern = rule.get('container')
+            name_match = re.compile(fnmatch.translate(pattern)).match if pattern else None
+            for kind in rule['events']:
+                self._index.setdefault(kind, {}).setdefault(rule.get('project'), []).append((rule, name_match))
+
+    def __bool__(self):
+        return bool(self.rules)
+
+    def match(self, event):
+        """Id odbiorców, do których trafia zdarzenie - każdy najwyżej raz"""
+        by_project = self._index.get(event['kind'])
+        if not by_project:
+            return set()
+        candidates = by_project.get(None, [])
+        if event['project'] is not None:
+            candidates = candidates + by_project.get(event['project'], [])
+        return {rule['sink_id'] for rule, name_match in candidates
+                if (rule.get('host_id') is None or rule['host_id'] == event['host'])
+                and (name_match is None or name_match(event['container']))}
+
+
+# ============ WIADOMOŚCI ============
+
+def summarize(events, dropped=0):
+    """Jedna wiadomość na paczkę: linia na (host, rodzaj), nazwy kontenerów skrócone do NAMES_PER_LINE"""
+    groups = {}
+    for event in events:
+        groups.setdefault((event['host_name'], event['kind']), []).append(event)
+    lines = []
+    for (host_name, kind), group in groups.items():
+        icon, label = KIND_LABELS[kind]
+        names = []
+        for event in group:
+            name = event['container'] or event['container_id']
+            if kind == 'die' and event['exit_code']:
+                name += f" ({event['exit_code']})"
+            if name not in names:
+                names.append(name)
+        shown = ', '.join(names[:NAMES_PER_LINE])
+        more = f" (+{len(names) - NAMES_PER_LINE})" if len(names) > NAMES_PER_LINE else ''
+        lines.append(f"{icon} {host_name}: {label} ×{len(group)} - {shown}{more}")
+    if dropped:
+        lines.append(f"⚠️ Pominięto {dropped} zdarzeń (przepełniona kolejka)")
+    text = '\n'.join(lines)
+    if len(text) > MAX_MESSAGE_CHARS:
+        text = text[:MAX_MESSAGE_CHARS - 1] + '…'
+    return text
+
+
+def webhook_payload(text, events, options):
+    return {"text": text, "events": events}
+
+
+def discord_payload(text, events, options):
+    return {"content": text, **({"username": options['username']} if options.get('username') else {})}
+
+
+def slack_payload(text, events, options):
+    return {"text": text}
+
+
+def telegram_payload(text, events, options):
+    return {"chat_id": options['chat_id'], "text": text, "disable_web_page_preview": True}
+
+
+PAYLOADS = {
+    'webhook': webhook_payload,
+    'discord': discord_payload,
+    'slack': slack_payload,
+    'telegram': telegram_payload,
+}
+
+
+def validate_sink(kind, url, options):
+    if kind not in SINK_KINDS:
+        raise ValueError(f"Nieznany typ odbiorcy: {kind} (dostępne: {', '.join(SINK_KINDS)})")
+    if not isinstance(url, str) or not url.startswith(('http://', 'https://')):
+        raise ValueError("Adres odbiorcy musi zaczynać się od http:// lub https://")
+    if not isinstance(options, dict):
+        raise ValueError("options musi być obiektem")
+    if kind == 'telegram' and not options.get('chat_id'):
+        raise ValueError("Telegram wymaga options.chat_id (url: https://api.telegram.org/bot<token>/sendMessage)")
+
+
+def masked_url(url):
+    """Adres odbiorcy do pokazania: tylko schemat i host. Tokeny webhooków Discorda
+    i Slacka oraz bota Telegrama są w ścieżce, a dane logowania przed hostem."""
+    parts = urllib.parse.urlsplit(url)
+    host = parts.hostname or ''
+    if parts.port:
+        host = f"{host}:{parts.port}"
+    return f"{parts.scheme}://{host}/…" if parts.path not in ('', '/') or parts.query else f"{parts.scheme}://{host}"
+
+
+def post_json(url, payload, timeout=DELIVERY_TIMEOUT):
+    """POST JSON; 429 i 5xx to błędy do ponowienia, pozostałe 4xx - trwałe"""
+    request = urllib.request.Request(url, data=json.dumps(payload).encode(), method='POST',
+                                     headers={'Content-Type': 'application/json', 'User-Agent': 'orbit'})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+    except urllib.error.HTTPError as e:
+        retry_after = e.headers.get('Retry-After') if e.headers else None
+        try:
+            retry_after = float(retry_after) if retry_after else None
+        except ValueError:
+            retry_after = None
+        raise DeliveryError(f"HTTP {e.code}", retry_after=retry_after,
+                            permanent=e.code != 429 and e.code < 500) from e
+    except (urllib.error.URLError, OSError) as e:
+        raise DeliveryError(str(getattr(e, 'reason', e))) from e
+
+
+# ============ ODBIORCY ============
+
+class Sink:
+    """Odbiorca powiadomień: ograniczona kolejka, jeden wątek wysyłający i token bucket.
+
+    Wątek zbiera zdarzenia w paczki (BATCH_WINDOW s / BATCH_MAX). Gdy limit
+    wiadomości jest wyczerpany, czeka na token - a zdarzenia w tym czasie
+    trafiają do następnej paczki zamiast do osobnych wiadomości.
+    """
+
+    def __init__(self, config, send=post_json):
+        self.config = config
+        self.id = config['id']
+        self.name = config['name']
+        self.kind = config['kind']
+        self.url = config['url']
+        self.options = config.get('options') or {}
+        self.rate = config.get('rate_per_minute') or RATE_PER_MINUTE
+        self._send = send
+        self._queue = queue.Queue(maxsize=SINK_QUEUE)
+        self._stop = threading.Event()
+        self._tokens = RATE_BURST
+        self._refilled = time.monotonic()
+        self._dropped = 0
+        self.sent = 0
+        self.delivered_events = 0
+        self.failed_events = 0
+        self.dropped = 0
+        self.last_error = None
+        self.last_sent_at = None
+        self._thread = threading.Thread(target=self._loop, name=f'notify-sink-{self.id}', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def put(self, event):
+        """Nie blokuje wątku zdarzeń: przy pełnej kolejce wyrzuca najstarsze zdarzenie"""
+        while True:
+            try:
+                self._queue.put_nowait(event)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self._dropped += 1
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def describe(self):
+        return {
+            "id": self.id,
+            "name": self.name,
+            "kind": self.kind,
+            "rate_per_minute": self.rate,
+            "queued": self._queue.qsize(),
+            "sent": self.sent,
+            "delivered_events": self.delivered_events,
+            "failed_events": self.failed_events,
+            "dropped": self.dropped,
+            "last_sent_at": self.last_sent_at,
+            "last_error": self.last_error
+        }
+
+    # ---- wysyłka ----
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                batch = [self._queue.get(timeout=1)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + BATCH_WINDOW
+            while len(batch) < BATCH_MAX:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._take_token()
+            dropped, self._dropped = self._dropped, 0
+            self._deliver(batch, dropped)
+
+    def _take_token(self):
+        while not self._stop.is_set():
+            now = time.monotonic()
+            self._tokens = min(RATE_BURST, self._tokens + (now - self._refilled) * self.rate / 60)
+            self._refilled = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            self._stop.wait((1 - self._tokens) * 60 / self.rate)
+
+    def _deliver(self, batch, dropped=0):
+        payload = PAYLOADS[self.kind](summarize(batch, dropped), batch, self.options)
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                with timed('notification delivery'):
+                    self._send(self.url, payload)
+            except DeliveryError as e:
+                self.last_error = str(e)
+                if e.permanent or attempt == MAX_RETRIES:
+                    break
+                delay = e.retry_after if e.retry_after is not None else RETRY_BACKOFF * 2 ** attempt
+                if self._stop.wait(min(delay, MAX_RETRY_DELAY)):
+                    break
+            else:
+                self.sent += 1
+                self.delivered_events += len(batch)
+                self.last_sent_at = time.time()
+                self.last_error = None
+                return
+        self.failed_events += len(batch)
+        print(f"⚠️ Powiadomienie do {self.name} nie wysłane ({len(batch)} zdarzeń): {self.last_error}")
+
+
+# ============ DYSPOZYTOR ============
+
+class Notifier:
+    """Powiadomienia o awariach kontenerów na wszystkich hostach.
+
+    Jedna subskrypcja client.events() z filtrem na host; zdarzenia dopasowane
+    do reguł trafiają do kolejek odbiorców, które wysyłają je paczkami.
+    Reguły i odbiorców czyta z bazy co SYNC_INTERVAL s, więc zmiany z
+    dowolnego workera działają bez restartu. Tą samą drogą odbiera zlecone
+    wiadomości testowe i publikuje liczniki, które workery pokazują w /notifications.
+    """
+
+    def __init__(self, registry, storage):
+        self.registry = registry
+        self.storage = storage
+        self.rules = RuleIndex()
+        self.sinks = {}
+        self.restarts = RestartLoopDetector()
+        self.events_seen = 0
+        self.events_matched = 0
+        self._watchers = {}
+        self._published = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self):
+        self.reload()
+        threading.Thread(target=self._sync_loop, name='notify-sync', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for sink in self.sinks.values():
+            sink.stop()
+
+    def reload(self):
+        """Przebudowuje indeks reguł; odbiorców ze zmienioną konfiguracją wymienia"""
+        configs = {config['id']: config for config in self.storage.notification_sinks()}
+        rules = RuleIndex(self.storage.notification_rules())
+        with self._lock:
+            sinks = dict(self.sinks)
+            for sink_id in [sink_id for sink_id, sink in sinks.items() if configs.get(sink_id) != sink.config]:
+                sinks.pop(sink_id).stop()
+            for sink_id, config in configs.items():
+                if sink_id not in sinks:
+                    sinks[sink_id] = Sink(config).start()
+            self.sinks = sinks
+            self.rules = rules
+
+    def _sync_loop(self):
+        while not self._stop.wait(SYNC_INTERVAL):
+            try:
+                self.reload()
+                self._sync_watchers()
+                self.restarts.prune(time.time())
+                for sink_id in self.storage.take_notification_tests(TEST_MAX_AGE):
+                    self.test(sink_id)
+                self._publish_status()
+            except Exception as e:
+                print(f"⚠️ Błąd synchronizacji powiadomień: {e}")
+
+    def _sync_watchers(self):
+        """Subskrypcja na każdy host - tylko gdy jest jakakolwiek reguła"""
+        if not self.rules:
+            return
+        for host in self.registry.hosts():
+            with self._lock:
+                watcher = self._watchers.get(host.id)
+                if watcher is not None and watcher[0] is host and watcher[1].is_alive():
+                    continue
+                thread = threading.Thread(target=self._watch, args=(host,), name=f'notify-events-{host.id}',
+                                          daemon=True)
+                self._watchers[host.id] = (host, thread)
+            thread.start()
+
+    def _publish_status(self):
+        """Liczniki do bazy dla workerów - tylko gdy się zmieniły"""
+        status = json.dumps(self.describe(), sort_keys=True)
+        if status != self._published:
+            self.storage.save_notification_status(status)
+            self._published = status
+
+    def _watch(self, host):
+        since = int(time.time())
+        # Host usunięty albo wymieniony w rejestrze - jego klient jest zamknięty, kończymy
+        while not self._stop.is_set() and self.registry.get(host.id) is host:
+            client = host.connect() if host.breaker.closed else None
+            if client is None:
+                self._stop.wait(EVENTS_RETRY_DELAY)
+                continue
+            try:
+                for raw in client.events(decode=True, since=since, filters=DOCKER_FILTERS):
+                    since = raw.get('time', since)
+                    self.handle(host, raw)
+            except Exception as e:
+                if self.registry.get(host.id) is host:
+                    print(f"⚠️ Strumień zdarzeń hosta {host.name} (powiadomienia) przerwany: {e}")
+            self._stop.wait(EVENTS_RETRY_DELAY)
+
+    def handle(self, host, raw):
+        if raw.get('Type', 'container') != 'container':
+            return
+        if (raw.get('Action') or raw.get('status')) == 'kill':
+            event = normalize(host, raw, 'kill')
+            self.restarts.stopping(host.id, event['container_id'], event['time'])
+            return
+        kind = event_kind(raw)
+        if kind is None:
+            return
+        self.events_seen += 1
+        event = normalize(host, raw, kind)
+        if kind != 'die' or event['exit_code'] not in STOP_EXIT_CODES:
+            self.dispatch(event)
+        # Restart policy podnosi kontener także po czystym wyjściu - do pętli liczy się każde "die",
+        # które nie przyszło po "kill"
+        if kind == 'die' and self.restarts.died(host.id, event['container_id'], event['time']):
+            self.dispatch(dict(event, kind='restart_loop'))
+
+    def dispatch(self, event):
+        sink_ids = self.rules.match(event)
+        if sink_ids:
+            self.events_matched += 1
+        sinks = self.sinks
+        for sink_id in sink_ids:
+            sink = sinks.get(sink_id)
+            if sink is not None:
+                sink.put(event)
+
+    def test(self, sink_id):
+        """Wiadomość próbna do odbiorcy z pominięciem reguł"""
+        sink = self.sinks.get(sink_id)
+        if sink is None:
+            return False
+        sink.put({"kind": 'test', "host": None, "host_name": "Orbit", "container_id": '',
+                  "container": "test powiadomień", "project": None, "service": None, "image": None,
+                  "exit_code": None, "time": int(time.time())})
+        return True
+
+    def describe(self):
+        with self._lock:
+            watchers = list(self._watchers.items())
+            sinks = list(self.sinks.values())
+        return {
+            "events_seen": self.events_seen,
+            "events_matched": self.events_matched,
+            "hosts_watched": sorted(host_id for host_id, (_host, thread) in watchers if thread.is_alive()),
+            "sinks": [sink.describe() for sink in sinks]
+        }
@@ -0,0 +1,115 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from docker.utils import parse_repository_tag
+
+# Ile obrazów pobieramy naraz na jednym hoście
+PULL_PARALLELISM = 3
+# Ile hostów rozgrzewamy naraz
+PREWARM_HOSTS = 4
+
+# Tak Docker Hub zapisuje obrazy w RepoTags: bez rejestru i bez "library/"
+DOCKER_HUB_PREFIXES = ('docker.io/', 'index.docker.io/', 'registry-1.docker.io/')
+
+
+def image_ref(image):
+    """Referencja w postaci z RepoTags: 'nginx' -> 'nginx:latest', 'docker.io/library/redis:7' -> 'redis:7'"""
+    repository, tag = parse_repository_tag(image)
+    for prefix in DOCKER_HUB_PREFIXES:
+        if repository.startswith(prefix):
+            repository = repository[len(prefix):]
+            break
+    if repository.startswith('library/') and repository.count('/') == 1:
+        repository = repository[len('library/'):]
+    tag = tag or 'latest'
+    return f"{repository}{'@' if tag.startswith('sha256:') else ':'}{tag}"
+
+
+def compose_images(config):
+    """{obraz: [serwisy]} z konfiguracji compose - tylko obrazy, które compose by pobrał.
+
+    Pomijamy serwisy z `build` (compose zbuduje obraz sam), z pull_policy
+    never/build i obrazy ze zmiennymi ${...}, których wartości zna tylko compose.
+    """
+    services = config.get('services') if isinstance(config, dict) else None
+    images = {}
+    for name, service in (services or {}).items():
+        if not isinstance(service, dict):
+            continue
+        image = service.get('image')
+        if not isinstance(image, str) or '$' in image or service.get('build'):
+            continue
+        if service.get('pull_policy') in ('never', 'build'):
+            continue
+        images.setdefault(image_ref(image), []).append(name)
+    return images
+
+
+def missing_images(images, inventory):
+    """Obrazy, których nie ma w inwentarzu hosta; przypięte digestem zawsze (RepoTags ich nie pokazują)"""
+    present = inventory.image_tags() if inventory is not None else set()
+    return [image for image in images if image not in present]
+
+
+def plan(images, inventory):
+    missing = missing_images(images, inventory)
+    return {
+        "images": [{"image": image, "services": services, "present": image not in missing}
+                   for image, services in images.items()],
+        "missing": missing
+    }
+
+
+def pull_images(job, client, images, parallelism=PULL_PARALLELISM, label=None):
+    """Pobiera obrazy równolegle (najwyżej `parallelism` naraz); zwraca (pobrane, {obraz: błąd})"""
+    prefix = f'{label}: ' if label else ''
+
+    def pull(image):
+        repository, tag = parse_repository_tag(image)
+        for event in client.api.pull(repository, tag=tag or 'latest', stream=True, decode=True):
+            if 'error' in event:
+                raise RuntimeError(event['error'])
+            if label and event.get('id'):
+                # Te same warstwy na różnych hostach to osobne pobrania
+                event = dict(event, id=f"{label}/{event['id']}")
+            job.pull_progress(event)
+
+    pulled, failed = [], {}
+    if not images:
+        return pulled, failed
+    with ThreadPoolExecutor(max_workers=min(parallelism, len(images)), thread_name_prefix='orbit-pull') as pool:
+        futures = {pool.submit(pull, image): image for image in images}
+        for future in as_completed(futures):
+            image = futures[future]
+            try:
+                future.result()
+                pulled.append(image)
+                job.log(f"✅ {prefix}{image} pobrany")
+            except Exception as e:
+                failed[image] = str(e)
+                job.log(f"⚠️ {prefix}{image}: {e}")
+    return pulled, failed
+
+
+def prewarm(job, hosts, images, parallelism=PULL_PARALLELISM):
+    """Pobiera brakujące obrazy na podanych hostach, kilka hostów naraz; wynik per host"""
+    def warm(host):
+        client = host.connect()
+        if client is None:
+            raise RuntimeError(host.error or "Host nie odpowiada")
+        missing = missing_images(images, host.inventory)
+        pulled, failed = pull_images(job, client, missing, parallelism, label=host.name)
+        return {"present": len(images) - len(missing), "pulled": pulled, "failed": failed}
+
+    results = {}
+    if not hosts:
+        return results
+    with ThreadPoolExecutor(max_workers=min(PREWARM_HOSTS, len(hosts)), thread_name_prefix='orbit-prewarm') as pool:
+        futures = {pool.submit(warm, host): host for host in hosts}
+        for future in as_completed(futures):
+            host = futures[future]
+            try:
+                results[host.name] = future.result()
+            except Exception as e:
+                results[host.name] = {"error": str(e)}
+                job.log(f"⚠️ {host.name}: {e}")
+    return results
@@ -0,0 +1,491 @@
+import json
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from diskusage import FIRST_REPORT_TIMEOUT, MIN_REFRESH_INTERVAL, DiskUsage
+from encoding import dumps
+from health import CLOSED, OPEN
+from hosts import Host, local_inventory
+from inventory import READY_TIMEOUT, Inventory
+
+# Gdzie kolektor zapisuje snapshoty; /dev/shm to pamięć, nie dysk
+SNAPSHOT_DIR = os.environ.get('ORBIT_SNAPSHOT_DIR') or (
+    '/dev/shm/orbit' if os.path.isdir('/dev/shm') else os.path.join(tempfile.gettempdir(), 'orbit'))
+# Co ile sekund worker sprawdza, czy pojawił się nowy snapshot (przy czekaniu na zmianę)
+POLL_INTERVAL = 0.2
+# Co ile sekund kolektor sprawdza zmiany stanu poza wersją (błąd, połączenie zdarzeń)
+PUBLISH_INTERVAL = 5
+# Co ile sekund kolektor sprawdza, czy worker poprosił o nowy raport dysku
+REFRESH_POLL = 1
+# Plik-prośba workera o odświeżenie raportu dysku, obok samego raportu
+REFRESH_SUFFIX = '.refresh'
+
+# Plik: nagłówek (magic, wersja, liczba segmentów), tablica segmentów, dane
+MAGIC = b'ORBITSN1'
+HEADER = struct.Struct('<8sQI')
+SEGMENT = struct.Struct('<16sQQ')
+
+
+def snapshot_path(host_id, directory=SNAPSHOT_DIR):
+    return os.path.join(directory, f'host-{host_id}.snapshot')
+
+
+def health_path(host_id, directory=SNAPSHOT_DIR):
+    return os.path.join(directory, f'host-{host_id}.health')
+
+
+def disk_path(host_id, directory=SNAPSHOT_DIR):
+    return os.path.join(directory, f'host-{host_id}.disk')
+
+
+def write_json(path, document):
+    """Mały dokument JSON (zdrowie hosta, raport dysku) podmieniany atomowo, jak snapshot"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        f.write(dumps(document))
+    os.replace(tmp, path)
+
+
+def write_snapshot(path, version, segments):
+    """Zapisuje segmenty {nazwa: bajty} do nowego pliku i podmienia go atomowo.
+
+    Worker, który zmapował poprzedni plik, dalej czyta swoją (spójną) wersję -
+    stary i-węzeł znika dopiero, gdy nikt go nie mapuje.
+    """
+    offset = HEADER.size + SEGMENT.size * len(segments)
+    table = []
+    for name, data in segments.items():
+        table.append(SEGMENT.pack(name.encode(), offset, len(data)))
+        offset += len(data)
+
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, version, len(segments)))
+        f.write(b''.join(table))
+        for data in segments.values():
+            f.write(data)
+    os.replace(tmp, path)
+
+
+class MappedSnapshot:
+    """Jeden opublikowany plik zmapowany tylko do odczytu"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.version, count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Nieprawidłowy plik snapshotu: {path}")
+        self._segments = {}
+        for i in range(count):
+            name, offset, length = SEGMENT.unpack_from(self._map, HEADER.size + i * SEGMENT.size)
+            self._segments[name.rstrip(b'\0').decode()] = (offset, length)
+        self._meta = None
+
+    def segment(self, name):
+        """Segment jako memoryview na zmapowany plik - bez kopiowania i dekodowania"""
+        offset, length = self._segments[name]
+        return memoryview(self._map)[offset:offset + length]
+
+    @property
+    def meta(self):
+        """Mały segment metadanych - jedyny parsowany przy każdej wersji"""
+        if self._meta is None:
+            self._meta = json.loads(bytes(self.segment('meta')))
+        return self._meta
+
+
+class SnapshotPublisher:
+    """Kolektor: po każdej zmianie inwentarza publikuje gotowe odpowiedzi /status
+    (zwykłą i kompaktową), różnice od poprzedniej publikacji, metadane
+    świeżości i stan do odtworzenia inwentarza.
+    """
+
+    def __init__(self, inventory, path):
+        self.inventory = inventory
+        self.path = path
+        self._stop = threading.Event()
+        self._published = None
+
+    def start(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        threading.Thread(target=self._loop, name=f'publish-{os.path.basename(self.path)}', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        inventory = self.inventory
+        published = None
+        while not self._stop.is_set() and not inventory.stopped:
+            if not inventory.wait_ready(PUBLISH_INTERVAL):
+                continue
+            marker = (inventory.version, inventory.error, inventory.events_connected, inventory.reconciled_at)
+            if marker != published:
+                try:
+                    self.publish()
+                    published = marker
+                except Exception as e:
+                    print(f"⚠️ Błąd publikacji snapshotu {self.path}: {e}")
+            inventory.wait_for_change(marker[0], PUBLISH_INTERVAL)
+        # Host usunięty albo kolektor zatrzymany - workery nie powinny czytać starego stanu
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def publish(self):
+        # Wszystkie serializacje muszą dotyczyć tej samej wersji - przy zmianie w trakcie powtarzamy
+        while True:
+            state = self.inventory.export_state()
+            version, status = self.inventory.snapshot_json()
+            compact_version, compact = self.inventory.snapshot_json(compact=True)
+            deltas = [self.inventory.changes_since(self._published, as_compact) if self._published is not None else None
+                      for as_compact in (False, True)]
+            if version == compact_version == state['version'] and all(
+                    delta is None or delta['version'] == version for delta in deltas):
+                break
+
+        changes = state.pop('changes')
+        raw = state.pop('raw')
+        # Klient strumienia jest zwykle o jedną publikację w tyle - worker poda mu gotową różnicę
+        state['delta_since'] = self._published if deltas[0] is not None else None
+        write_snapshot(self.path, version, {
+            'meta': dumps(state).encode(),
+            'status': status.encode(),
+            'compact': compact.encode(),
+            'delta': dumps(deltas[0]).encode(),
+            'delta_compact': dumps(deltas[1]).encode(),
+            'state': dumps({"version": version, "raw": raw, "changes": changes}).encode()
+        })
+        self._published = version
+        return version
+
+
+class SharedInventory:
+    """Inwentarz workera czytany ze snapshotu kolektora - bez połączenia z Dockerem.
+
+    /status podaje bajty prosto z zmapowanego pliku, a różnicę od poprzedniej
+    publikacji (strumień SSE, ?since=) - z małego segmentu; parsowane są tylko
+    metadane. Dopiero zapytania potrzebujące modelu (indeksy, wyszukiwanie
+    kontenerów, starsze różnice) odtwarzają Inventory leniwie, raz na wersję.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._key = None
+        self._model = (None, None)
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def _current(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if key != self._key:
+            with self._lock:
+                if key != self._key:
+                    self._snapshot = MappedSnapshot(self.path)
+                    self._key = key
+        return self._snapshot
+
+    def _inventory(self):
+        snapshot = self._current()
+        if snapshot is None:
+            return None
+        version, model = self._model
+        if version != snapshot.version:
+            state = json.loads(bytes(snapshot.segment('state')))
+            state.update(snapshot.meta)
+            model = Inventory.from_state(state)
+            self._model = (snapshot.version, model)
+        return model
+
+    # ---- odczyt ----
+
+    @property
+    def version(self):
+        snapshot = self._current()
+        return snapshot.version if snapshot else 0
+
+    @property
+    def error(self):
+        snapshot = self._current()
+        if snapshot is None:
+            return "Kolektor nie opublikował jeszcze snapshotu"
+        return snapshot.meta['error']
+
+    def wait_ready(self, timeout=READY_TIMEOUT):
+        deadline = time.time() + (timeout or 0)
+        while self._current() is None:
+            if time.time() >= deadline:
+                return False
+            time.sleep(POLL_INTERVAL)
+        return True
+
+    def wait_for_change(self, version, timeout):
+        deadline = time.time() + timeout
+        while self.version <= version and time.time() < deadline:
+            time.sleep(POLL_INTERVAL)
+        return self.version
+
+    def snapshot_json(self, compact=False):
+        snapshot = self._current()
+        return snapshot.version, snapshot.segment('compact' if compact else 'status')
+
+    def freshness(self):
+        snapshot = self._current()
+        if snapshot is None:
+            return {"version": 0, "age": None, "error": self.error}
+        meta = snapshot.meta
+        now = time.time()
+        return {
+            "version": meta['version'],
+            "updated_at": meta['updated_at'],
+            "reconciled_at": meta['reconciled_at'],
+            "last_event_at": meta['last_event_at'],
+            "age": round(now - meta['updated_at'], 3) if meta['updated_at'] else None,
+            "reconcile_age": round(now - meta['reconciled_at'], 3) if meta['reconciled_at'] else None,
+            "events_connected": meta['events_connected'],
+            "reconcile_docker_calls": meta['reconcile_calls'],
+            "error": meta['error']
+        }
+
+    def snapshot(self):
+        return self._inventory().snapshot()
+
+    def changes_since(self, version, compact=False):
+        snapshot = self._current()
+        if version == snapshot.meta['delta_since']:
+            return json.loads(bytes(snapshot.segment('delta_compact' if compact else 'delta')))
+        return self._inventory().changes_since(version, compact)
+
+    def index(self, section):
+        return self._inventory().index(section)
+
+    def container_ids(self, status=None):
+        return self._inventory().container_ids(status)
+
+    def projects(self):
+        return self._inventory().projects()
+
+    def image_tags(self):
+        return self._inventory().image_tags()
+
+    def containers(self, refs=None, project=None):
+        return self._inventory().containers(refs, project)
+
+    def resolve_container(self, ref):
+        return self._inventory().resolve_container(ref)
+
+
+class SharedDocument:
+    """Dokument JSON od kolektora; parsowany ponownie tylko po podmianie pliku"""
+
+    def __init__(self, path):
+        self.path = path
+        self._key = None
+        self._document = None
+
+    def read(self):
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        key = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if key != self._key:
+            with open(self.path, 'rb') as f:
+                self._document = json.loads(f.read())
+            self._key = key
+        return self._document
+
+
+class SharedHealth:
+    """Bezpiecznik hosta w workerze: stan z sondy kolektora, bez własnych prób.
+
+    Dopóki kolektor nic nie opublikował, host uchodzi za dostępny - akcja
+    spróbuje i najwyżej zwróci błąd Dockera.
+    """
+
+    def __init__(self, path):
+        self._document = SharedDocument(path)
+
+    def _read(self):
+        return self._document.read() or {"health": {"state": CLOSED, "last_error": None}, "error": None,
+                                         "connected": False}
+
+    @property
+    def state(self):
+        return self._read()['health']['state']
+
+    @property
+    def closed(self):
+        return self.state == CLOSED
+
+    @property
+    def last_error(self):
+        return self._read()['health']['last_error']
+
+    @property
+    def error(self):
+        return self._read()['error']
+
+    @property
+    def connected(self):
+        return self._read()['connected']
+
+    def allow(self):
+        return self.state != OPEN
+
+    # O stanie decyduje sonda kolektora - pojedyncze błędy workera go nie zmieniają
+    def success(self):
+        pass
+
+    def failure(self, error):
+        pass
+
+    def describe(self):
+        return dict(self._read()['health'])
+
+
+class PublishedDiskUsage(DiskUsage):
+    """Raport dysku w kolektorze: po każdym odczycie zapisywany dla workerów,
+    a prośba workera o odświeżenie (plik .refresh) budzi pętlę jak refresh().
+    """
+
+    def __init__(self, client, path):
+        super().__init__(client)
+        self.path = path
+
+    def refresh_now(self):
+        super().refresh_now()
+        try:
+            write_json(self.path, self.export())
+        except OSError as e:
+            print(f"⚠️ Błąd publikacji raportu dysku {self.path}: {e}")
+
+    def _wait(self):
+        deadline = time.monotonic() + self.interval
+        while not self._stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or self._wake.wait(min(REFRESH_POLL, remaining)):
+                return
+            try:
+                os.remove(self.path + REFRESH_SUFFIX)
+                return
+            except FileNotFoundError:
+                pass
+
+
+class SharedDiskUsage:
+    """Raport dysku w workerze - ostatni opublikowany przez kolektor, bez `system df`"""
+
+    def __init__(self, path):
+        self.path = path
+        self._document = SharedDocument(path)
+
+    @property
+    def error(self):
+        document = self._document.read()
+        return document['error'] if document else None
+
+    def stop(self):
+        pass
+
+    def refresh(self):
+        """Zostawia kolektorowi prośbę o nowy odczyt; False, gdy ostatni jest świeży"""
+        document = self._document.read()
+        if document and document['updated_at'] and time.time() - document['updated_at'] < MIN_REFRESH_INTERVAL:
+            return False
+        open(self.path + REFRESH_SUFFIX, 'w').close()
+        return True
+
+    def report(self, timeout=FIRST_REPORT_TIMEOUT):
+        deadline = time.time() + (timeout or 0)
+        document = self._document.read()
+        while (document is None or document['report'] is None) and time.time() < deadline:
+            time.sleep(POLL_INTERVAL)
+            document = self._document.read()
+        if document is None or document['report'] is None:
+            return None
+        return dict(document['report'],
+                    updated_at=document['updated_at'],
+                    age=round(time.time() - document['updated_at'], 3),
+                    duration=document['duration'],
+                    error=document['error'])
+
+
+class CollectorHost(Host):
+    """Host w kolektorze: publikuje inwentarz, zdrowie i raport dysku dla workerów"""
+
+    def _attach(self, client):
+        self.inventory = local_inventory(self, client)
+        SnapshotPublisher(self.inventory, snapshot_path(self.id)).start()
+        # Workery same nie liczą `system df` - pętla dysku chodzi w kolektorze od startu
+        self.disk = PublishedDiskUsage(client, disk_path(self.id))
+        self.disk.start()
+
+    def connect(self):
+        if self.client is not None:
+            return self.client
+        client = super().connect()
+        self.publish_health()
+        return client
+
+    def probe(self):
+        super().probe()
+        self.publish_health()
+
+    def publish_health(self):
+        try:
+            write_json(health_path(self.id), {
+                "health": self.breaker.describe(),
+                "error": self.error,
+                "connected": self.connected
+            })
+        except OSError as e:
+            print(f"⚠️ Błąd publikacji stanu hosta {self.name}: {e}")
+
+    def close(self):
+        super().close()
+        for path in (health_path(self.id), disk_path(self.id)):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class SharedHost(Host):
+    """Host w workerze: inwentarz, zdrowie i raport dysku z plików kolektora.
+
+    Bez sondy i wątków w tle - klient Dockera powstaje dopiero przy pierwszej
+    akcji na hoście.
+    """
+
+    eager = False
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.breaker = SharedHealth(health_path(self.id))
+        self.inventory = SharedInventory(snapshot_path(self.id))
+        self.disk = SharedDiskUsage(disk_path(self.id))
+
+    def _attach(self, client):
+        # Inwentarz i raport dysku dalej pochodzą od kolektora; klient służy tylko do akcji
+        pass
+
+    @property
+    def connected(self):
+        return self.breaker.connected
+
+    def describe(self):
+        return dict(super().describe(), error=self.error or self.breaker.error)
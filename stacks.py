@@ -0,0 +1,204 @@
+import fcntl
+import hashlib
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import yaml
+
+from bulk import compose_dependencies
+from prepull import compose_images
+
+COMPOSE_FILE = 'docker-compose.yml'
+# Jak nazwa projektu compose: litery, cyfry, '-', '_', '.' - i nic, co wyjdzie poza STACKS_PATH
+STACK_NAME = re.compile(r'^[a-zA-Z0-9][a-zA-Z0-9_.-]*$')
+# Ile sekund czekamy na zakończenie innej operacji na tym samym stacku
+LOCK_TIMEOUT = 30
+LOCK_POLL_INTERVAL = 0.1
+LOCKS_DIR = '.locks'
+
+
+class StackBusy(Exception):
+    pass
+
+
+class ComposeFile:
+    """Sparsowany docker-compose.yml z kluczem (mtime, rozmiar) i hashem treści"""
+
+    def __init__(self, stat_key, digest, config):
+        self.stat_key = stat_key
+        self.digest = digest
+        self.config = config
+        self.dependencies = compose_dependencies(config)
+        self.images = compose_images(config)
+        self.services = list((config.get('services') or {}) if isinstance(config, dict) else {})
+
+
+class StackIndex:
+    """Stacki z katalogu STACKS_PATH i z etykiet compose kontenerów.
+
+    Pliki compose są parsowane tylko, gdy zmieni się ich treść (mtime/rozmiar,
+    potem hash), kontenery projektu przychodzą z indeksu inwentarza. Operacje
+    na jednym stacku są serializowane - także między procesami (flock) - a na
+    różnych stackach idą równolegle.
+    """
+
+    def __init__(self, root, inventory):
+        self.root = root
+        self.inventory = inventory
+        self._lock = threading.Lock()
+        self._files = {}
+        self._local = (None, [])
+        self._locks = {}
+
+    # ---- pliki ----
+
+    def validate(self, name):
+        if not name or not STACK_NAME.match(name):
+            raise ValueError(f"Nieprawidłowa nazwa stacka: {name}")
+        return name
+
+    def stack_dir(self, name):
+        return os.path.join(self.root, self.validate(name))
+
+    def compose_path(self, name):
+        return os.path.join(self.stack_dir(name), COMPOSE_FILE)
+
+    def compose(self, name):
+        """ComposeFile stacka albo None, gdy stack nie ma pliku"""
+        path = self.compose_path(name)
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            with self._lock:
+                self._files.pop(name, None)
+            return None
+
+        stat_key = (st.st_mtime_ns, st.st_size)
+        cached = self._files.get(name)
+        if cached is not None and cached.stat_key == stat_key:
+            return cached
+
+        with open(path, 'rb') as f:
+            content = f.read()
+        digest = hashlib.sha256(content).hexdigest()
+        if cached is not None and cached.digest == digest:
+            # Plik tylko "dotknięty" - treść ta sama, parsowanie zbędne
+            cached.stat_key = stat_key
+            return cached
+
+        try:
+            config = yaml.safe_load(content) or {}
+        except yaml.YAMLError as e:
+            print(f"⚠️ Nieprawidłowy {COMPOSE_FILE} stacka {name}: {e}")
+            config = {}
+        entry = ComposeFile(stat_key, digest, config)
+        with self._lock:
+            self._files[name] = entry
+        return entry
+
+    def dependencies(self, name):
+        compose = self.compose(name) if name and STACK_NAME.match(name) else None
+        return compose.dependencies if compose else {}
+
+    def local_names(self):
+        """Katalogi stacków w STACKS_PATH; lista odświeżana tylko po zmianie katalogu"""
+        try:
+            mtime = os.stat(self.root).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        if self._local[0] != mtime:
+            names = sorted(entry.name for entry in os.scandir(self.root)
+                           if entry.is_dir() and STACK_NAME.match(entry.name))
+            self._local = (mtime, names)
+        return self._local[1]
+
+    def write(self, name, content):
+        stack_dir = self.stack_dir(name)
+        os.makedirs(stack_dir, exist_ok=True)
+        path = os.path.join(stack_dir, COMPOSE_FILE)
+        tmp = f'{path}.tmp'
+        with open(tmp, 'w') as f:
+            f.write(content)
+        os.replace(tmp, path)
+        return path
+
+    def delete(self, name):
+        stack_dir = self.stack_dir(name)
+        os.remove(os.path.join(stack_dir, COMPOSE_FILE))
+        os.rmdir(stack_dir)
+        with self._lock:
+            self._files.pop(name, None)
+
+    # ---- widok ----
+
+    def containers(self, name):
+        return self.inventory.containers(project=name) if self.inventory else []
+
+    def describe(self, name):
+        """Stack z mapą serwis -> kontenery (także serwisy z pliku bez kontenerów)"""
+        compose = self.compose(name)
+        services = {service: [] for service in (compose.services if compose else ())}
+        project = self.containers(name)
+        for c in project:
+            services.setdefault(c.get('service') or c['name'], []).append(
+                {"id": c['id'][:12], "name": c['name'], "status": c['status']})
+        containers = [c for items in services.values() for c in items]
+        return {
+            "name": name,
+            "path": self.stack_dir(name) if compose or not project else project[0].get('project_dir', ''),
+            "compose": compose is not None,
+            "services": services,
+            "containers": len(containers),
+            "running": sum(1 for c in containers if c['status'] == 'running')
+        }
+
+    def list(self):
+        projects = self.inventory.projects() if self.inventory else {}
+        names = sorted(set(self.local_names()) | {name for name in projects if STACK_NAME.match(name)})
+        stacks = []
+        for name in names:
+            compose = self.compose(name)
+            containers = projects.get(name, ())
+            stacks.append({
+                "name": name,
+                "compose": compose is not None,
+                "services": len(set(compose.services if compose else ()) |
+                                {c.get('service') for c in containers if c.get('service')}),
+                "containers": len(containers),
+                "running": sum(1 for c in containers if c['status'] == 'running')
+            })
+        return stacks
+
+    # ---- blokady ----
+
+    @contextmanager
+    def lock(self, name, timeout=LOCK_TIMEOUT):
+        """Wyłączny dostęp do stacka; StackBusy, gdy inna operacja trwa dłużej niż `timeout`"""
+        self.validate(name)
+        with self._lock:
+            thread_lock = self._locks.setdefault(name, threading.Lock())
+        deadline = time.monotonic() + timeout
+        if not thread_lock.acquire(timeout=timeout):
+            raise StackBusy(f"Na stacku {name} trwa inna operacja")
+        try:
+            locks_dir = os.path.join(self.root, LOCKS_DIR)
+            os.makedirs(locks_dir, exist_ok=True)
+            with open(os.path.join(locks_dir, f'{name}.lock'), 'w') as lock_file:
+                # flock chroni przed operacją z innego workera
+                while True:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        if time.monotonic() >= deadline:
+                            raise StackBusy(f"Na stacku {name} trwa inna operacja")
+                        time.sleep(LOCK_POLL_INTERVAL)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            thread_lock.release()
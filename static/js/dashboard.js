@@ -1,27 +1,140 @@
 let cachedData = null;
 let activeTab = null;
 let currentLogsContainer = null;
+let streamConnected = false;
+
+// Po czym rozpoznajemy element danej sekcji w różnicach ze strumienia
+const SECTION_KEYS = {
+    containers: 'id',
+    images: 'id',
+    volumes: 'name',
+    networks: 'id',
+    stacks: 'name'
+};
 
 // ============ ODŚWIEŻANIE DANYCH ============
 
-async function refreshData() {
-    try {
-        const response = await fetch('/status');
-        if (!response.ok) return;
+// Serwer wysyła sekcje jako {fields, rows} (format=compact) - tu wracają do obiektów
+function formatSize(bytes) {
+    return `${Math.round(bytes / (1024 * 1024) * 10) / 10} MB`;
+}
 
-        const data = await response.json();
-        cachedData = data;
+function decodeSection(section, compact) {
+    return compact.rows.map(row => {
+        const item = {};
+        compact.fields.forEach((field, i) => item[field] = row[i]);
+        if (section === 'images') {
+            item.size = formatSize(item.size);
+        } else if (section === 'stacks') {
+            item.containers = item.containers.map(([name, status]) => ({ name, status }));
+        }
+        return item;
+    });
+}
 
-        document.getElementById('count-containers').innerText = data.counts.containers;
-        document.getElementById('count-images').innerText = data.counts.images;
-        document.getElementById('count-volumes').innerText = data.counts.volumes;
-        document.getElementById('count-networks').innerText = data.counts.networks;
-        document.getElementById('count-stacks').innerText = data.counts.stacks || 0;
+function decodeSnapshot(data) {
+    Object.keys(SECTION_KEYS).forEach(section => {
+        if (data[section]) data[section] = decodeSection(section, data[section]);
+    });
+    return data;
+}
 
+function decodeDelta(delta) {
+    Object.entries(delta.sections).forEach(([section, change]) => {
+        change.upsert = decodeSection(section, change.upsert);
+    });
+    return delta;
+}
+
+function renderCounts() {
+    document.getElementById('count-containers').innerText = cachedData.counts.containers;
+    document.getElementById('count-images').innerText = cachedData.counts.images;
+    document.getElementById('count-volumes').innerText = cachedData.counts.volumes;
+    document.getElementById('count-networks').innerText = cachedData.counts.networks;
+    document.getElementById('count-stacks').innerText = cachedData.counts.stacks || 0;
+}
+
+function applySnapshot(data) {
+    cachedData = data;
+    renderCounts();
+    updateNetworkSelect();
+
+    if (activeTab) {
+        updateList(activeTab);
+    }
+}
+
+function applyDelta(delta) {
+    if (!cachedData) return;
+
+    Object.entries(delta.sections).forEach(([section, change]) => {
+        const key = SECTION_KEYS[section];
+        const removed = new Set(change.remove);
+        const upserts = new Map(change.upsert.map(item => [item[key], item]));
+
+        const items = [];
+        (cachedData[section] || []).forEach(item => {
+            if (removed.has(item[key])) return;
+            const updated = upserts.get(item[key]);
+            if (updated) {
+                upserts.delete(item[key]);
+                items.push(updated);
+            } else {
+                items.push(item);
+            }
+        });
+        upserts.forEach(item => items.push(item));
+        cachedData[section] = items;
+    });
+
+    cachedData.counts = delta.counts;
+    cachedData.version = delta.version;
+    renderCounts();
+
+    if (delta.sections.networks) {
         updateNetworkSelect();
+    }
+    if (activeTab && delta.sections[activeTab]) {
+        updateList(activeTab);
+    }
+}
+
+// Strumień SSE: pełny snapshot na start, potem same różnice
+function connectStream() {
+    if (!window.EventSource) return;
+
+    const source = new EventSource('/status/stream?format=compact');
+    source.addEventListener('snapshot', e => {
+        streamConnected = true;
+        applySnapshot(decodeSnapshot(JSON.parse(e.data)));
+    });
+    source.addEventListener('delta', e => applyDelta(decodeDelta(JSON.parse(e.data))));
+    source.onopen = () => {
+        // Po wznowieniu (Last-Event-ID) serwer wysyła tylko różnice albo nic - snapshotu nie będzie.
+        // Bez danych z pierwszego snapshotu polling działa dalej, aż ten przyjdzie.
+        if (cachedData) streamConnected = true;
+    };
+    source.onerror = () => {
+        // Przeglądarka sama wznowi połączenie; do tego czasu działa polling
+        streamConnected = false;
+    };
+}
+
+async function refreshData() {
+    // Przy aktywnym strumieniu zmiany przychodzą same
+    if (streamConnected) return;
+
+    try {
+        // Mając dane pytamy tylko o zmiany od naszej wersji (304 gdy brak zmian)
+        const url = cachedData ? `/status?format=compact&since=${cachedData.version}` : '/status?format=compact';
+        const response = await fetch(url);
+        if (!response.ok) return;
 
-        if (activeTab) {
-            updateList(activeTab);
+        const data = await response.json();
+        if (data.sections) {
+            applyDelta(decodeDelta(data));
+        } else {
+            applySnapshot(decodeSnapshot(data));
         }
     } catch (err) {
         console.error("Fetch error:", err);
@@ -32,150 +145,230 @@ function updateNetworkSelect() {
     const select = document.getElementById('c-network');
     if (!cachedData || !select) return;
 
-    select.innerHTML = '<option value="">Domyślna (bridge)</option>';
-    cachedData.networks.forEach(net => {
-        select.innerHTML += `<option value="${net.name}">${net.name}</option>`;
-    });
+    // Lista opcji budowana raz, i tylko gdy zmieniły się nazwy sieci
+    const names = cachedData.networks.map(net => net.name);
+    const signature = names.join('\n');
+    if (select.dataset.signature === signature) return;
+    select.dataset.signature = signature;
+
+    const selected = select.value;
+    const options = document.createDocumentFragment();
+    options.appendChild(new Option('Domyślna (bridge)', ''));
+    names.forEach(name => options.appendChild(new Option(name, name)));
+    select.replaceChildren(options);
+    select.value = names.includes(selected) ? selected : '';
 }
 
 // ============ WYŚWIETLANIE LISTY ============
 
+// Lista jest wirtualna: w DOM są tylko wiersze z widocznego okna (plus zapas),
+// ustawione absolutnie nad wypełniaczem o wysokości całej listy. Wiersze mają
+// klucz z SECTION_KEYS i dostają nowy HTML tylko wtedy, gdy się zmienił.
+const ROW_HEIGHT = 64;
+const OVERSCAN = 10;
+
+const LIST_TITLES = {
+    containers: 'Containers',
+    images: 'Images',
+    volumes: 'Volumes',
+    networks: 'Networks',
+    stacks: 'Stacks'
+};
+
+let listState = { type: null, spacer: null, rows: new Map(), pool: [], frame: null };
+
+function rowHtml(type, item) {
+    if (type === 'containers') {
+        return `
+            <div class="info">
+                <div class="dot ${item.status}"></div>
+                <div>
+                    <div class="item-name">${item.name}</div>
+                    <div class="item-details">${item.image}</div>
+                </div>
+            </div>
+            <div class="item-meta">
+                <div class="actions">
+                    ${item.status !== 'running' ? `<button class="action-btn start" onclick="containerAction('${item.id}', 'start')">▶</button>` : ''}
+                    ${item.status === 'running' ? `<button class="action-btn stop" onclick="containerAction('${item.id}', 'stop')">⏹</button>` : ''}
+                    <button class="action-btn restart" onclick="containerAction('${item.id}', 'restart')">🔄</button>
+                    <button class="action-btn logs" onclick="showLogs('${item.id}', '${item.name}')">📋</button>
+                    ${item.status === 'running' ? `<button class="action-btn terminal" onclick="openTerminal('${item.id}', '${item.name}')">⌨</button>` : ''}
+                    <button class="action-btn remove" onclick="containerAction('${item.id}', 'remove')">🗑</button>
+                </div>
+                <div style="text-align:right;">
+                    <div class="item-details">${item.status.toUpperCase()}</div>
+                    <div class="item-id">${item.id}</div>
+                </div>
+            </div>
+        `;
+    } else if (type === 'images') {
+        return `
+            <div class="info">
+                <div class="dot default"></div>
+                <div>
+                    <div class="item-name">${item.tags[0]}</div>
+                    <div class="item-id">${item.id}</div>
+                </div>
+            </div>
+            <div class="item-meta">
+                <div class="actions">
+                    <button class="action-btn remove" onclick="imageRemove('${item.id}')">🗑</button>
+                </div>
+                <div class="item-details">${item.size}</div>
+            </div>
+        `;
+    } else if (type === 'volumes') {
+        return `
+            <div class="info">
+                <div class="dot default"></div>
+                <div>
+                    <div class="item-name">${item.name}</div>
+                    <div class="item-details">${item.mountpoint}</div>
+                </div>
+            </div>
+            <div class="item-meta">
+                <div class="actions">
+                    <button class="action-btn remove" onclick="volumeRemove('${item.name}')">🗑</button>
+                </div>
+                <div class="item-details">${item.driver}</div>
+            </div>
+        `;
+    } else if (type === 'networks') {
+        return `
+            <div class="info">
+                <div class="dot default"></div>
+                <div>
+                    <div class="item-name">${item.name}</div>
+                    <div class="item-id">${item.id}</div>
+                </div>
+            </div>
+            <div class="item-meta">
+                <div class="actions">
+                    <button class="action-btn remove" onclick="networkRemove('${item.id}')">🗑</button>
+                </div>
+                <div class="item-details">${item.driver} / ${item.scope}</div>
+            </div>
+        `;
+    } else if (type === 'stacks') {
+        const runningCount = item.containers.filter(c => c.status === 'running').length;
+        const totalCount = item.containers.length;
+        const allRunning = runningCount === totalCount;
+        const statusClass = allRunning ? 'running' : (runningCount > 0 ? 'paused' : 'stopped');
+
+        const containerDots = item.containers.map(c =>
+            `<div class="stack-dot" style="background: var(--${c.status === 'running' ? 'success' : 'error'})"></div>`
+        ).join('');
+
+        return `
+            <div class="info">
+                <div class="dot ${statusClass}"></div>
+                <div>
+                    <div class="item-name">${item.name}</div>
+                    <div class="stack-containers">${containerDots}</div>
+                </div>
+            </div>
+            <div class="item-meta">
+                <div class="actions">
+                    <button class="action-btn start" onclick="stackAction('${item.name}', 'start')">▶</button>
+                    <button class="action-btn stop" onclick="stackAction('${item.name}', 'stop')">⏹</button>
+                    <button class="action-btn restart" onclick="stackAction('${item.name}', 'restart')">🔄</button>
+                    <button class="action-btn remove" onclick="stackAction('${item.name}', 'remove')">🗑</button>
+                </div>
+                <div style="text-align:right;">
+                    <div class="item-details">${runningCount}/${totalCount} running</div>
+                    <div class="item-id">${item.path || ''}</div>
+                </div>
+            </div>
+        `;
+    }
+    return '';
+}
+
+function resetList(list, type) {
+    list.replaceChildren();
+    list.scrollTop = 0;
+    listState = { type, spacer: null, rows: new Map(), pool: [], frame: null };
+}
+
 function updateList(type) {
     const list = document.getElementById('details-list');
     const header = document.getElementById('details-header');
     const addBtn = document.getElementById('btn-add');
-    list.innerHTML = '';
 
     if (!cachedData) return;
 
-    const titles = {
-        containers: 'Containers',
-        images: 'Images',
-        volumes: 'Volumes',
-        networks: 'Networks',
-        stacks: 'Stacks'
-    };
-    header.innerText = titles[type] || 'Lista';
+    header.innerText = LIST_TITLES[type] || 'Lista';
 
     // Pokaż przycisk dodawania dla wszystkich typów
     addBtn.style.display = ['containers', 'volumes', 'networks', 'images', 'stacks'].includes(type) ? 'block' : 'none';
 
     const items = cachedData[type] || [];
 
+    if (listState.type !== type || items.length === 0) {
+        resetList(list, type);
+    }
     if (items.length === 0) {
         list.innerHTML = '<div class="empty-state">Brak elementów</div>';
         return;
     }
 
-    items.forEach(item => {
-        const div = document.createElement('div');
-        div.className = 'list-item';
+    if (!listState.spacer) {
+        listState.spacer = document.createElement('div');
+        listState.spacer.className = 'list-spacer';
+        list.appendChild(listState.spacer);
+    }
+    listState.spacer.style.height = `${items.length * ROW_HEIGHT}px`;
+    renderWindow();
+}
 
-        if (type === 'containers') {
-            div.innerHTML = `
-                <div class="info">
-                    <div class="dot ${item.status}"></div>
-                    <div>
-                        <div class="item-name">${item.name}</div>
-                        <div class="item-details">${item.image}</div>
-                    </div>
-                </div>
-                <div class="item-meta">
-                    <div class="actions">
-                        ${item.status !== 'running' ? `<button class="action-btn start" onclick="containerAction('${item.id}', 'start')">▶</button>` : ''}
-                        ${item.status === 'running' ? `<button class="action-btn stop" onclick="containerAction('${item.id}', 'stop')">⏹</button>` : ''}
-                        <button class="action-btn restart" onclick="containerAction('${item.id}', 'restart')">🔄</button>
-                        <button class="action-btn logs" onclick="showLogs('${item.id}', '${item.name}')">📋</button>
-                        <button class="action-btn remove" onclick="containerAction('${item.id}', 'remove')">🗑</button>
-                    </div>
-                    <div style="text-align:right;">
-                        <div class="item-details">${item.status.toUpperCase()}</div>
-                        <div class="item-id">${item.id}</div>
-                    </div>
-                </div>
-            `;
-        } else if (type === 'images') {
-            div.innerHTML = `
-                <div class="info">
-                    <div class="dot default"></div>
-                    <div>
-                        <div class="item-name">${item.tags[0]}</div>
-                        <div class="item-id">${item.id}</div>
-                    </div>
-                </div>
-                <div class="item-meta">
-                    <div class="actions">
-                        <button class="action-btn remove" onclick="imageRemove('${item.id}')">🗑</button>
-                    </div>
-                    <div class="item-details">${item.size}</div>
-                </div>
-            `;
-        } else if (type === 'volumes') {
-            div.innerHTML = `
-                <div class="info">
-                    <div class="dot default"></div>
-                    <div>
-                        <div class="item-name">${item.name}</div>
-                        <div class="item-details">${item.mountpoint}</div>
-                    </div>
-                </div>
-                <div class="item-meta">
-                    <div class="actions">
-                        <button class="action-btn remove" onclick="volumeRemove('${item.name}')">🗑</button>
-                    </div>
-                    <div class="item-details">${item.driver}</div>
-                </div>
-            `;
-        } else if (type === 'networks') {
-            div.innerHTML = `
-                <div class="info">
-                    <div class="dot default"></div>
-                    <div>
-                        <div class="item-name">${item.name}</div>
-                        <div class="item-id">${item.id}</div>
-                    </div>
-                </div>
-                <div class="item-meta">
-                    <div class="actions">
-                        <button class="action-btn remove" onclick="networkRemove('${item.id}')">🗑</button>
-                    </div>
-                    <div class="item-details">${item.driver} / ${item.scope}</div>
-                </div>
-            `;
-        } else if (type === 'stacks') {
-            const runningCount = item.containers.filter(c => c.status === 'running').length;
-            const totalCount = item.containers.length;
-            const allRunning = runningCount === totalCount;
-            const statusClass = allRunning ? 'running' : (runningCount > 0 ? 'paused' : 'stopped');
-
-            let containerDots = item.containers.map(c =>
-                `<div class="stack-dot" style="background: var(--${c.status === 'running' ? 'success' : 'error'})"></div>`
-            ).join('');
-
-            div.innerHTML = `
-                <div class="info">
-                    <div class="dot ${statusClass}"></div>
-                    <div>
-                        <div class="item-name">${item.name}</div>
-                        <div class="stack-containers">${containerDots}</div>
-                    </div>
-                </div>
-                <div class="item-meta">
-                    <div class="actions">
-                        <button class="action-btn start" onclick="stackAction('${item.name}', 'start')">▶</button>
-                        <button class="action-btn stop" onclick="stackAction('${item.name}', 'stop')">⏹</button>
-                        <button class="action-btn restart" onclick="stackAction('${item.name}', 'restart')">🔄</button>
-                        <button class="action-btn remove" onclick="stackAction('${item.name}', 'remove')">🗑</button>
-                    </div>
-                    <div style="text-align:right;">
-                        <div class="item-details">${runningCount}/${totalCount} running</div>
-                        <div class="item-id">${item.path || ''}</div>
-                    </div>
-                </div>
-            `;
+function renderWindow() {
+    const { type, spacer, rows, pool } = listState;
+    if (!spacer || !cachedData) return;
+
+    const list = document.getElementById('details-list');
+    const items = cachedData[type] || [];
+    const key = SECTION_KEYS[type];
+    const first = Math.max(0, Math.floor(list.scrollTop / ROW_HEIGHT) - OVERSCAN);
+    const last = Math.min(items.length, Math.ceil((list.scrollTop + list.clientHeight) / ROW_HEIGHT) + OVERSCAN);
+
+    // Najpierw zwalniamy wiersze spoza okna, żeby nowe mogły je przejąć
+    const visible = new Set();
+    for (let i = first; i < last; i++) visible.add(items[i][key]);
+    rows.forEach((row, id) => {
+        if (visible.has(id)) return;
+        rows.delete(id);
+        row.remove();
+        if (pool.length < OVERSCAN * 4) pool.push(row);
+    });
+
+    for (let i = first; i < last; i++) {
+        const item = items[i];
+        let row = rows.get(item[key]);
+        if (!row) {
+            row = pool.pop() || document.createElement('div');
+            row.className = 'list-item virtual-row';
+            rows.set(item[key], row);
+            spacer.appendChild(row);
+        }
+        const html = rowHtml(type, item);
+        if (row.rowHtml !== html) {
+            row.innerHTML = html;
+            row.rowHtml = html;
+        }
+        const top = i * ROW_HEIGHT;
+        if (row.rowTop !== top) {
+            row.style.transform = `translateY(${top}px)`;
+            row.rowTop = top;
         }
+    }
+}
 
-        list.appendChild(div);
+function scheduleRenderWindow() {
+    if (listState.frame) return;
+    listState.frame = requestAnimationFrame(() => {
+        listState.frame = null;
+        renderWindow();
     });
 }
 
@@ -262,6 +455,7 @@ async function createStack() {
         });
         const data = await res.json();
         showToast(data.message, res.ok ? 'success' : 'error');
+        if (data.job) trackJob(data.job);
         if (res.ok) {
             closeModal('stack-modal');
             document.getElementById('stack-name').value = '';
@@ -275,29 +469,238 @@ async function createStack() {
 
 // ============ LOGI KONTENERÓW ============
 
+// Tyle linii trzymamy w modalu; starsze wypadają z DOM
+const MAX_LOG_LINES = 2000;
+const LOG_PAGE_SIZE = 200;
+let logsAbort = null;
+let logsOldest = null;
+
 async function showLogs(containerId, containerName) {
     currentLogsContainer = containerId;
     document.getElementById('logs-title').innerText = `📋 Logi: ${containerName}`;
+    document.getElementById('logs-filter').value = '';
     document.getElementById('logs-content').innerText = 'Ładowanie...';
     document.getElementById('logs-modal').classList.add('visible');
     await refreshLogs();
 }
 
+function stopLogs() {
+    if (logsAbort) {
+        logsAbort.abort();
+        logsAbort = null;
+    }
+}
+
+function logsParams(extra) {
+    const params = new URLSearchParams(extra);
+    const filter = document.getElementById('logs-filter').value.trim();
+    if (filter) {
+        params.set('q', filter);
+        params.set('icase', '1');
+    }
+    return params;
+}
+
+// Czyta odpowiedź NDJSON kawałek po kawałku, nie czekając na koniec strumienia
+async function readNdjson(url, signal, onEntries) {
+    const res = await fetch(url, { signal });
+    if (!res.ok) {
+        const data = await res.json();
+        throw new Error(data.message || res.status);
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        const entries = lines.filter(line => line).map(line => JSON.parse(line));
+        if (entries.length) onEntries(entries);
+    }
+}
+
+function logLineNodes(entries) {
+    const fragment = document.createDocumentFragment();
+    entries.forEach(entry => fragment.appendChild(document.createTextNode(`${entry.ts} ${entry.line}\n`)));
+    return fragment;
+}
+
+function appendLogLines(entries) {
+    const content = document.getElementById('logs-content');
+    const atBottom = content.scrollTop + content.clientHeight >= content.scrollHeight - 5;
+
+    if (!logsOldest) logsOldest = entries[0].ts;
+    content.appendChild(logLineNodes(entries));
+    while (content.childNodes.length > MAX_LOG_LINES) {
+        content.removeChild(content.firstChild);
+        logsOldest = content.firstChild.textContent.split(' ', 1)[0];
+    }
+
+    if (atBottom) content.scrollTop = content.scrollHeight;
+}
+
 async function refreshLogs() {
     if (!currentLogsContainer) return;
+    stopLogs();
+
+    const content = document.getElementById('logs-content');
+    const controller = new AbortController();
+    logsAbort = controller;
+    logsOldest = null;
+    content.innerText = '';
+
     try {
-        const res = await fetch(`/container/${currentLogsContainer}/logs`);
-        const data = await res.json();
-        if (res.ok) {
-            document.getElementById('logs-content').innerText = data.logs || 'Brak logów';
-        } else {
-            document.getElementById('logs-content').innerText = 'Błąd: ' + data.message;
+        const params = logsParams({ follow: '1', tail: LOG_PAGE_SIZE });
+        await readNdjson(`/container/${currentLogsContainer}/logs/stream?${params}`, controller.signal, appendLogLines);
+    } catch (err) {
+        if (err.name !== 'AbortError') {
+            content.appendChild(document.createTextNode('Błąd pobierania logów: ' + err.message));
         }
+    }
+}
+
+async function loadOlderLogs() {
+    if (!currentLogsContainer || !logsOldest) return;
+
+    const content = document.getElementById('logs-content');
+    const entries = [];
+    try {
+        const params = logsParams({ before: logsOldest, tail: LOG_PAGE_SIZE });
+        await readNdjson(`/container/${currentLogsContainer}/logs/stream?${params}`, undefined,
+            batch => entries.push(...batch));
     } catch (err) {
-        document.getElementById('logs-content').innerText = 'Błąd pobierania logów: ' + err;
+        showToast('Błąd pobierania logów: ' + err.message, 'error');
+        return;
+    }
+    if (!entries.length) {
+        showToast('Brak starszych logów', 'success');
+        return;
+    }
+
+    const previousHeight = content.scrollHeight;
+    logsOldest = entries[0].ts;
+    content.insertBefore(logLineNodes(entries), content.firstChild);
+    content.scrollTop += content.scrollHeight - previousHeight;
+}
+
+// ============ TERMINAL ============
+// Ramki binarne to surowe bajty TTY; tekstowe - komendy sterujące (resize).
+// Bez emulatora terminala: sekwencje ANSI są pomijane, \r i \b obsługujemy prosto.
+
+// Tyle znaków wyjścia trzymamy w DOM
+const MAX_TERMINAL_CHARS = 200000;
+const ANSI_SEQUENCE = /\x1b(?:\[[0-?]*[ -\/]*[@-~]|\][^\x07\x1b]*(?:\x07|\x1b\\)|[@-Z\\-_])/g;
+const TERMINAL_KEYS = {
+    Enter: '\r', Backspace: '\x7f', Tab: '\t', Escape: '\x1b', Delete: '\x1b[3~',
+    ArrowUp: '\x1b[A', ArrowDown: '\x1b[B', ArrowRight: '\x1b[C', ArrowLeft: '\x1b[D',
+    Home: '\x1b[H', End: '\x1b[F', PageUp: '\x1b[5~', PageDown: '\x1b[6~'
+};
+let terminalSocket = null;
+let terminalDecoder = null;
+const terminalEncoder = new TextEncoder();
+
+function terminalSize() {
+    const content = document.getElementById('terminal-content');
+    const probe = document.createElement('span');
+    probe.textContent = 'M';
+    content.appendChild(probe);
+    const { width, height } = probe.getBoundingClientRect();
+    probe.remove();
+    return {
+        cols: Math.max(20, Math.floor(content.clientWidth / (width || 7)) - 2),
+        rows: Math.max(5, Math.floor(content.clientHeight / (height || 14)))
+    };
+}
+
+function openTerminal(containerId, containerName) {
+    closeTerminal();
+    const content = document.getElementById('terminal-content');
+    document.getElementById('terminal-title').innerText = `⌨ Terminal: ${containerName}`;
+    content.textContent = '';
+    document.getElementById('terminal-modal').classList.add('visible');
+
+    const { cols, rows } = terminalSize();
+    const scheme = location.protocol === 'https:' ? 'wss' : 'ws';
+    const socket = new WebSocket(`${scheme}://${location.host}/container/${containerId}/exec?cols=${cols}&rows=${rows}`);
+    socket.binaryType = 'arraybuffer';
+    terminalDecoder = new TextDecoder();
+    terminalSocket = socket;
+
+    socket.onopen = () => content.focus();
+    socket.onmessage = event => {
+        if (event.data instanceof ArrayBuffer) {
+            writeTerminal(terminalDecoder.decode(new Uint8Array(event.data), { stream: true }));
+        }
+    };
+    socket.onclose = event => {
+        if (terminalSocket !== socket) return;
+        writeTerminal(`\n[Połączenie zamknięte${event.reason ? ': ' + event.reason : ''}]\n`);
+        terminalSocket = null;
+    };
+}
+
+function writeTerminal(text) {
+    const content = document.getElementById('terminal-content');
+    let output = content.textContent;
+    text = text.replace(ANSI_SEQUENCE, '').replace(/\r\n/g, '\n');
+    for (const ch of text) {
+        if (ch === '\b') output = output.slice(0, -1);
+        else if (ch === '\x07' || ch === '\r') continue;
+        else output += ch;
+    }
+    if (output.length > MAX_TERMINAL_CHARS) output = output.slice(-MAX_TERMINAL_CHARS);
+    content.textContent = output;
+    content.scrollTop = content.scrollHeight;
+}
+
+function sendTerminal(data) {
+    if (terminalSocket && terminalSocket.readyState === WebSocket.OPEN) {
+        terminalSocket.send(terminalEncoder.encode(data));
+    }
+}
+
+function terminalKeydown(event) {
+    let data = null;
+    if (event.ctrlKey && !event.altKey && event.key.length === 1) {
+        const code = event.key.toUpperCase().charCodeAt(0);
+        // Ctrl+C zostawiamy kopiowaniu, gdy coś jest zaznaczone
+        if (event.key === 'c' && String(window.getSelection())) return;
+        if (code >= 64 && code <= 95) data = String.fromCharCode(code - 64);
+    } else if (TERMINAL_KEYS[event.key]) {
+        data = TERMINAL_KEYS[event.key];
+    } else if (event.key.length === 1 && !event.metaKey) {
+        data = event.altKey ? '\x1b' + event.key : event.key;
     }
+    if (data === null) return;
+    event.preventDefault();
+    sendTerminal(data);
+}
+
+function terminalPaste(event) {
+    event.preventDefault();
+    sendTerminal(event.clipboardData.getData('text'));
 }
 
+function resizeTerminal() {
+    if (terminalSocket && terminalSocket.readyState === WebSocket.OPEN) {
+        terminalSocket.send(JSON.stringify({ type: 'resize', ...terminalSize() }));
+    }
+}
+
+function closeTerminal() {
+    if (terminalSocket) {
+        const socket = terminalSocket;
+        terminalSocket = null;
+        socket.close();
+    }
+}
+
+window.addEventListener('resize', resizeTerminal);
+
 // ============ MODAL TWORZENIA ============
 
 function openCreateModal() {
@@ -323,8 +726,10 @@ function openCreateModal() {
 function closeModal(id) {
     document.getElementById(id).classList.remove('visible');
     if (id === 'logs-modal') {
+        stopLogs();
         currentLogsContainer = null;
     }
+    if (id === 'terminal-modal') closeTerminal();
 }
 
 // Tworzenie kontenera
@@ -367,6 +772,7 @@ async function createContainer() {
         });
         const data = await res.json();
         showToast(data.message, res.ok ? 'success' : 'error');
+        if (data.job) trackJob(data.job);
         closeModal('container-modal');
         refreshData();
     } catch (err) {
@@ -424,6 +830,7 @@ async function pullImage() {
         });
         const data = await res.json();
         showToast(data.message, res.ok ? 'success' : 'error');
+        if (data.job) trackJob(data.job);
         closeModal('pull-modal');
         refreshData();
     } catch (err) {
@@ -431,6 +838,57 @@ async function pullImage() {
     }
 }
 
+// ============ ZADANIA W TLE ============
+
+const JOBS_STORAGE_KEY = 'orbit-active-jobs';
+
+// Id trwających zadań trzymamy w localStorage, żeby przeżyły przeładowanie strony
+function activeJobs() {
+    try {
+        return JSON.parse(localStorage.getItem(JOBS_STORAGE_KEY)) || [];
+    } catch (err) {
+        return [];
+    }
+}
+
+function forgetJob(jobId) {
+    localStorage.setItem(JOBS_STORAGE_KEY, JSON.stringify(activeJobs().filter(id => id !== jobId)));
+}
+
+function trackJob(jobId) {
+    const ids = activeJobs();
+    if (!ids.includes(jobId)) {
+        ids.push(jobId);
+        localStorage.setItem(JOBS_STORAGE_KEY, JSON.stringify(ids));
+    }
+    setTimeout(() => pollJob(jobId), 1000);
+}
+
+async function pollJob(jobId) {
+    try {
+        const res = await fetch(`/jobs/${jobId}`);
+        if (res.status === 404) {
+            forgetJob(jobId);
+            return;
+        }
+        if (!res.ok) throw new Error(res.status);
+
+        const job = await res.json();
+        if (job.status === 'done' || job.status === 'error') {
+            forgetJob(jobId);
+            showToast(job.message || `${job.target}: ${job.status}`, job.status === 'done' ? 'success' : 'error');
+            refreshData();
+            return;
+        }
+
+        const progress = job.progress && job.progress.percent !== null ? ` ${job.progress.percent}%` : '';
+        showToast(`⏳ ${job.target}${progress}`, 'success');
+        setTimeout(() => pollJob(jobId), 1000);
+    } catch (err) {
+        setTimeout(() => pollJob(jobId), 3000);
+    }
+}
+
 // ============ TABS ============
 
 function toggleTab(type) {
@@ -453,11 +911,14 @@ function toggleTab(type) {
 
 // ============ TOAST ============
 
+let toastTimer = null;
+
 function showToast(message, type = 'success') {
     const toast = document.getElementById('toast');
     toast.innerText = message;
     toast.className = 'toast visible ' + type;
-    setTimeout(() => toast.classList.remove('visible'), 3000);
+    clearTimeout(toastTimer);
+    toastTimer = setTimeout(() => toast.classList.remove('visible'), 3000);
 }
 
 // ============ LOGOUT ============
@@ -485,12 +946,44 @@ async function checkForUpdate() {
     }
 }
 
+// ============ METRYKI HOSTA ============
+
+function formatRate(bytes) {
+    return bytes >= 1024 * 1024 ? `${formatSize(bytes)}/s` : `${Math.round(bytes / 1024)} KB/s`;
+}
+
+async function refreshHostMetrics() {
+    try {
+        const response = await fetch('/host/metrics/current');
+        if (!response.ok) return;
+        const { current, info } = await response.json();
+        if (!current) return;
+
+        document.getElementById('host-cpu').innerText = `${current.cpu.toFixed(1)}% (${info.cpus} CPU)`;
+        document.getElementById('host-load').innerText = current.load1.toFixed(2);
+        document.getElementById('host-mem').innerText =
+            `${formatSize(current.mem_used)} / ${formatSize(info.mem_total)} (${Math.round(current.mem_percent)}%)`;
+        document.getElementById('host-disk').innerText = `${Math.round(current.disk_percent)}%`;
+        document.getElementById('host-io').innerText = `↓${formatRate(current.disk_read)} ↑${formatRate(current.disk_write)}`;
+        document.getElementById('host-net').innerText = `↓${formatRate(current.net_rx)} ↑${formatRate(current.net_tx)}`;
+    } catch (err) {
+        console.error("Host metrics error:", err);
+    }
+}
+
 // ============ INIT ============
 
 document.querySelectorAll('.tab').forEach(tab => {
     tab.addEventListener('click', () => toggleTab(tab.dataset.type));
 });
 
+document.getElementById('details-list').addEventListener('scroll', scheduleRenderWindow, { passive: true });
+window.addEventListener('resize', scheduleRenderWindow);
+
+connectStream();
 refreshData();
+activeJobs().forEach(pollJob);
 setInterval(refreshData, 5000);
+refreshHostMetrics();
+setInterval(refreshHostMetrics, 5000);
 checkForUpdate();
\ No newline at end of file
@@ -0,0 +1,253 @@
+import threading
+import time
+from array import array
+
+# Co ile sekund zapisujemy próbkę do bufora (Docker wysyła statystyki co ~1s)
+SAMPLE_INTERVAL = 5
+# Ile minut historii trzymamy w pamięci dla każdego kontenera
+RING_MINUTES = 15
+# Co ile sekund dopasowujemy strumienie do listy działających kontenerów
+SYNC_INTERVAL = 5
+# Retencja danych zagregowanych w SQLite
+RETENTION_1M = 24 * 3600
+RETENTION_1H = 30 * 24 * 3600
+
+FIELDS = ('cpu', 'mem', 'net_rx', 'net_tx', 'blk_read', 'blk_write')
+
+RESOLUTIONS = {'1m': ('container_metrics_1m', 60), '1h': ('container_metrics_1h', 3600)}
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_duration(value):
+    """'15m', '6h', '7d' albo same sekundy -> liczba sekund"""
+    value = value.strip().lower()
+    unit = DURATION_UNITS.get(value[-1:])
+    try:
+        return float(value[:-1]) * unit if unit else float(value)
+    except ValueError:
+        raise ValueError(f"Nieprawidłowy zakres: {value}")
+
+
+class RingBuffer:
+    """Bufor próbek o stałym rozmiarze: jedna kolumna array('d') na metrykę"""
+
+    def __init__(self, size, fields=FIELDS):
+        self.size = size
+        self.fields = fields
+        self._columns = {name: array('d', bytes(8 * size)) for name in ('ts',) + fields}
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def append(self, ts, values):
+        with self._lock:
+            i = self._next
+            self._columns['ts'][i] = ts
+            for name in self.fields:
+                self._columns[name][i] = values[name]
+            self._next = (i + 1) % self.size
+            self._count = min(self._count + 1, self.size)
+
+    def series(self, start=0.0, end=None):
+        """Kolumny próbek z przedziału [start, end), od najstarszej"""
+        with self._lock:
+            first = (self._next - self._count) % self.size
+            order = [(first + k) % self.size for k in range(self._count)]
+            ts = self._columns['ts']
+            picked = [i for i in order if ts[i] >= start and (end is None or ts[i] < end)]
+            return {name: [column[i] for i in picked] for name, column in self._columns.items()}
+
+
+def cpu_percent(raw):
+    cpu = raw.get('cpu_stats') or {}
+    precpu = raw.get('precpu_stats') or {}
+    cpu_delta = (cpu.get('cpu_usage') or {}).get('total_usage', 0) - \
+        (precpu.get('cpu_usage') or {}).get('total_usage', 0)
+    system_delta = cpu.get('system_cpu_usage', 0) - precpu.get('system_cpu_usage', 0)
+    online = cpu.get('online_cpus') or len((cpu.get('cpu_usage') or {}).get('percpu_usage') or []) or 1
+    if cpu_delta <= 0 or system_delta <= 0:
+        return 0.0
+    return cpu_delta / system_delta * online * 100.0
+
+
+def memory_bytes(raw):
+    memory = raw.get('memory_stats') or {}
+    details = memory.get('stats') or {}
+    # cgroup v2: inactive_file, v1: cache - tak samo liczy `docker stats`
+    cache = details.get('inactive_file', details.get('cache', 0))
+    return max(memory.get('usage', 0) - cache, 0)
+
+
+def io_counters(raw):
+    """Skumulowane bajty: (net_rx, net_tx, blk_read, blk_write)"""
+    networks = (raw.get('networks') or {}).values()
+    rx = sum(net.get('rx_bytes', 0) for net in networks)
+    tx = sum(net.get('tx_bytes', 0) for net in networks)
+    read = write = 0
+    for entry in (raw.get('blkio_stats') or {}).get('io_service_bytes_recursive') or []:
+        op = entry.get('op', '').lower()
+        if op == 'read':
+            read += entry.get('value', 0)
+        elif op == 'write':
+            write += entry.get('value', 0)
+    return rx, tx, read, write
+
+
+class ContainerStatsSampler:
+    """Zbiera CPU/mem/net/blkio ze strumieni stats - jeden strumień na działający kontener.
+
+    Ostatnie RING_MINUTES minut trzymane jest w pamięci w buforach o stałym
+    rozmiarze, starsze dane co minutę trafiają zagregowane do tabel 1m/1h w
+    SQLite. Zapytania o serie nie robią żadnego wywołania do Dockera.
+    """
+
+    def __init__(self, client, inventory, storage):
+        self.client = client
+        self.inventory = inventory
+        self.storage = storage
+        self._lock = threading.Lock()
+        self._rings = {}
+        self._followed = set()
+        self._stop = threading.Event()
+        self._rolled_until = int(time.time() // 60 * 60)
+        # Worker bez własnych strumieni czyta tylko historię z SQLite
+        self.sampling = False
+
+    def start(self):
+        self.sampling = True
+        threading.Thread(target=self._sync_loop, name='stats-sync', daemon=True).start()
+        threading.Thread(target=self._rollup_loop, name='stats-rollup', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    # ---- strumienie ----
+
+    def _sync_loop(self):
+        while not self._stop.is_set():
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"⚠️ Błąd synchronizacji statystyk: {e}")
+            self._stop.wait(SYNC_INTERVAL)
+
+    def sync(self):
+        if not self.inventory.wait_ready(0):
+            return
+        running = set(self.inventory.container_ids('running'))
+        known = set(self.inventory.container_ids())
+        with self._lock:
+            # Strumień zatrzymanego kontenera milknie i wznawia się po starcie,
+            # a kończy dopiero po usunięciu kontenera - wtedy zwalniamy wątek
+            for container_id in running - self._followed:
+                self._followed.add(container_id)
+                threading.Thread(target=self._follow, args=(container_id,),
+                                 name=f'stats-{container_id[:12]}', daemon=True).start()
+            # Bufory usuniętych kontenerów nie są już potrzebne
+            for container_id in self._rings.keys() - known:
+                del self._rings[container_id]
+
+    def _ring(self, container_id):
+        with self._lock:
+            ring = self._rings.get(container_id)
+            if ring is None:
+                ring = self._rings[container_id] = RingBuffer(int(RING_MINUTES * 60 // SAMPLE_INTERVAL))
+            return ring
+
+    def _follow(self, container_id):
+        ring = self._ring(container_id)
+        previous = None
+        try:
+            for raw in self.client.api.stats(container_id, stream=True, decode=True):
+                if self._stop.is_set():
+                    break
+                now = time.time()
+                if previous is not None and now - previous[0] < SAMPLE_INTERVAL:
+                    continue
+                counters = io_counters(raw)
+                if previous is not None:
+                    elapsed = now - previous[0]
+                    rates = [max(cur - old, 0) / elapsed for cur, old in zip(counters, previous[1])]
+                    ring.append(now, {
+                        'cpu': cpu_percent(raw),
+                        'mem': memory_bytes(raw),
+                        'net_rx': rates[0],
+                        'net_tx': rates[1],
+                        'blk_read': rates[2],
+                        'blk_write': rates[3]
+                    })
+                previous = (now, counters)
+        except Exception as e:
+            if not self._stop.is_set():
+                print(f"⚠️ Strumień statystyk {container_id[:12]} przerwany: {e}")
+        finally:
+            with self._lock:
+                self._followed.discard(container_id)
+
+    # ---- agregacja do SQLite ----
+
+    def _rollup_loop(self):
+        while not self._stop.wait(60):
+            try:
+                self.rollup()
+            except Exception as e:
+                print(f"⚠️ Błąd agregacji statystyk: {e}")
+
+    def rollup(self, now=None):
+        """Zapisuje pełne minuty z buforów do tabeli 1m, pełne godziny do 1h"""
+        now = now or time.time()
+        start, end = self._rolled_until, int(now // 60 * 60)
+        if end <= start:
+            return
+
+        rows = []
+        with self._lock:
+            rings = list(self._rings.items())
+        for container_id, ring in rings:
+            series = ring.series(start, end)
+            buckets = {}
+            for i, ts in enumerate(series['ts']):
+                buckets.setdefault(int(ts // 60 * 60), []).append(i)
+            for bucket, indexes in buckets.items():
+                rows.append((container_id, bucket) + tuple(
+                    sum(series[name][i] for i in indexes) / len(indexes) for name in FIELDS))
+
+        with self.storage.transaction() as conn:
+            conn.executemany(f"INSERT OR REPLACE INTO container_metrics_1m (container_id, ts, {', '.join(FIELDS)}) "
+                             f"VALUES (?, ?, {', '.join('?' for _ in FIELDS)})", rows)
+            hour_start, hour_end = start // 3600 * 3600, end // 3600 * 3600
+            if hour_end > hour_start:
+                averages = ', '.join(f'AVG({name})' for name in FIELDS)
+                conn.execute(f"INSERT OR REPLACE INTO container_metrics_1h (container_id, ts, {', '.join(FIELDS)}) "
+                             f"SELECT container_id, ts / 3600 * 3600 AS hour, {averages} "
+                             f"FROM container_metrics_1m WHERE ts >= ? AND ts < ? GROUP BY container_id, hour",
+                             (hour_start, hour_end))
+            conn.execute("DELETE FROM container_metrics_1m WHERE ts < ?", (now - RETENTION_1M,))
+            conn.execute("DELETE FROM container_metrics_1h WHERE ts < ?", (now - RETENTION_1H,))
+        self._rolled_until = end
+
+    # ---- odczyt ----
+
+    def series(self, container_id, start, end=None, resolution=None):
+        """Serie w układzie kolumnowym; rozdzielczość dobierana do zakresu"""
+        end = end or time.time()
+        if resolution is None:
+            if self.sampling and start >= time.time() - RING_MINUTES * 60:
+                resolution = 'raw'
+            elif end - start <= RETENTION_1M:
+                resolution = '1m'
+            else:
+                resolution = '1h'
+
+        if resolution == 'raw':
+            ring = self._rings.get(container_id)
+            data = ring.series(start, end) if ring else {name: [] for name in ('ts',) + FIELDS}
+            return {"resolution": 'raw', "interval": SAMPLE_INTERVAL, "series": data}
+
+        table, interval = RESOLUTIONS[resolution]
+        rows = self.storage.query(f"SELECT ts, {', '.join(FIELDS)} FROM {table} "
+                                  f"WHERE container_id = ? AND ts >= ? AND ts < ? ORDER BY ts",
+                                  (container_id, start, end))
+        data = {name: [row[i] for row in rows] for i, name in enumerate(('ts',) + FIELDS)}
+        return {"resolution": resolution, "interval": interval, "series": data}
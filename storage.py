@@ -0,0 +1,355 @@
+import json
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from metrics import timed
+
+# Ile bezczynnych połączeń trzymamy w puli
+POOL_SIZE = 8
+# Ile ms czekać na blokadę zapisu, zanim SQLite zgłosi "database is locked"
+BUSY_TIMEOUT_MS = 5000
+
+
+# ============ MIGRACJE ============
+# Kolejne wersje schematu; numer zapisany w PRAGMA user_version.
+# Pierwsza migracja pokrywa bazy utworzone jeszcze przez dawne init_db(),
+# dlatego używa IF NOT EXISTS.
+
+METRIC_COLUMNS = '''(container_id TEXT,
+                     ts INTEGER,
+                     cpu REAL,
+                     mem REAL,
+                     net_rx REAL,
+                     net_tx REAL,
+                     blk_read REAL,
+                     blk_write REAL,
+                     PRIMARY KEY (container_id, ts))'''
+
+HOST_METRIC_COLUMNS = '''(ts INTEGER PRIMARY KEY,
+                          cpu REAL,
+                          load1 REAL,
+                          mem_used REAL,
+                          mem_percent REAL,
+                          swap_used REAL,
+                          disk_percent REAL,
+                          disk_read REAL,
+                          disk_write REAL,
+                          net_rx REAL,
+                          net_tx REAL)'''
+
+MIGRATIONS = [
+    (1, "users i hosts", [
+        '''CREATE TABLE IF NOT EXISTS users
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE,
+            password TEXT)''',
+        '''CREATE TABLE IF NOT EXISTS hosts
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            url TEXT,
+            is_local INTEGER DEFAULT 0)''',
+    ]),
+    (2, "historia statystyk kontenerów", [
+        f"CREATE TABLE IF NOT EXISTS container_metrics_1m {METRIC_COLUMNS}",
+        f"CREATE TABLE IF NOT EXISTS container_metrics_1h {METRIC_COLUMNS}",
+        "CREATE INDEX IF NOT EXISTS idx_container_metrics_1m_ts ON container_metrics_1m (ts)",
+        "CREATE INDEX IF NOT EXISTS idx_container_metrics_1h_ts ON container_metrics_1h (ts)",
+    ]),
+    (3, "zadania w tle widoczne z każdego workera", [
+        '''CREATE TABLE IF NOT EXISTS jobs
+           (id TEXT PRIMARY KEY,
+            created_at REAL,
+            data TEXT)''',
+        "CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at)",
+    ]),
+    (4, "limity czasu per host", [
+        "ALTER TABLE hosts ADD COLUMN connect_timeout REAL",
+        "ALTER TABLE hosts ADD COLUMN read_timeout REAL",
+    ]),
+    (5, "historia metryk hosta", [
+        f"CREATE TABLE IF NOT EXISTS host_metrics_1m {HOST_METRIC_COLUMNS}",
+        f"CREATE TABLE IF NOT EXISTS host_metrics_1h {HOST_METRIC_COLUMNS}",
+    ]),
+    (6, "powiadomienia o zdarzeniach kontenerów", [
+        '''CREATE TABLE IF NOT EXISTS notification_sinks
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            kind TEXT,
+            url TEXT,
+            options TEXT,
+            rate_per_minute REAL)''',
+        '''CREATE TABLE IF NOT EXISTS notification_rules
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT,
+            events TEXT,
+            host_id INTEGER,
+            project TEXT,
+            container TEXT,
+            sink_id INTEGER REFERENCES notification_sinks (id) ON DELETE CASCADE)''',
+    ]),
+    (7, "wiadomości testowe i liczniki powiadomień między procesami", [
+        '''CREATE TABLE IF NOT EXISTS notification_tests
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sink_id INTEGER,
+            created_at REAL)''',
+        '''CREATE TABLE IF NOT EXISTS notification_status
+           (id INTEGER PRIMARY KEY CHECK (id = 1),
+            data TEXT,
+            updated_at REAL)''',
+    ]),
+    (8, "wspólne klucze aktywnych zadań między workerami", [
+        "ALTER TABLE jobs ADD COLUMN dedup_key TEXT",
+        "ALTER TABLE jobs ADD COLUMN updated_at REAL",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedup_key ON jobs (dedup_key) WHERE dedup_key IS NOT NULL",
+    ]),
+]
+
+
+class Storage:
+    """Warstwa SQLite: pula połączeń w trybie WAL, migracje schematu i cache hostów.
+
+    WAL pozwala czytać równolegle z zapisem, więc logowania, panel i wątki w
+    tle (statystyki, audyt) nie czekają na siebie nawzajem.
+    """
+
+    def __init__(self, path, pool_size=POOL_SIZE, migrations=MIGRATIONS):
+        self.path = path
+        self.migrations = migrations
+        self._idle = queue.Queue(maxsize=pool_size)
+        self._hosts_lock = threading.Lock()
+        self._hosts = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Połączenie wypożyczone z puli na czas bloku"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            try:
+                self._idle.put_nowait(conn)
+            except queue.Full:
+                conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """Jak connection(), ale z commitem na końcu (rollback przy wyjątku)"""
+        with timed('sqlite transaction'), self.connection() as conn:
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    @contextmanager
+    def immediate(self):
+        """Transakcja z blokadą zapisu od pierwszej instrukcji (BEGIN IMMEDIATE).
+
+        Dla "sprawdź, potem zapisz" między procesami: odczyt wewnątrz bloku
+        widzi stan, którego nikt inny nie zmieni przed naszym commitem.
+        """
+        with timed('sqlite transaction'), self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def query(self, sql, params=()):
+        with timed('sqlite query'), self.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        with timed('sqlite query'), self.connection() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def execute(self, sql, params=()):
+        with self.transaction() as conn:
+            return conn.execute(sql, params).rowcount
+
+    # ---- schemat ----
+
+    def migrate(self):
+        """Wykonuje brakujące migracje; zwraca bieżącą wersję schematu.
+
+        Kolektor i workery startują razem na świeżej bazie - wersję czytamy
+        dopiero pod blokadą zapisu, więc każdą migrację wykona jeden proces
+        (ALTER TABLE ... ADD COLUMN nie da się powtórzyć).
+        """
+        applied = []
+        with self.immediate() as conn:
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            for version, description, statements in self.migrations:
+                if version <= current:
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f"PRAGMA user_version={version}")
+                applied.append((version, description))
+                current = version
+        for version, description in applied:
+            print(f"🗄️ Migracja bazy {version}: {description}")
+        return current
+
+    # ---- użytkownicy ----
+
+    def get_user(self, email):
+        return self.query_one("SELECT id, email, password FROM users WHERE email = ?", (email,))
+
+    def create_user(self, email, password_hash):
+        """Rzuca sqlite3.IntegrityError, gdy email jest już zajęty"""
+        self.execute("INSERT INTO users (email, password) VALUES (?, ?)", (email, password_hash))
+
+    # ---- hosty ----
+
+    def hosts(self):
+        """Tabela hosts z cache w pamięci; cache unieważniają zapisy przez tę klasę"""
+        with self._hosts_lock:
+            if self._hosts is None:
+                rows = self.query("SELECT id, name, url, is_local, connect_timeout, read_timeout FROM hosts ORDER BY id")
+                self._hosts = [dict(row) for row in rows]
+            return list(self._hosts)
+
+    def get_host(self, host_id):
+        return next((host for host in self.hosts() if host['id'] == host_id), None)
+
+    def invalidate_hosts(self):
+        with self._hosts_lock:
+            self._hosts = None
+
+    def add_host(self, name, url, is_local=False, connect_timeout=None, read_timeout=None):
+        try:
+            self.execute("INSERT INTO hosts (name, url, is_local, connect_timeout, read_timeout) VALUES (?, ?, ?, ?, ?)",
+                         (name, url, int(is_local), connect_timeout, read_timeout))
+        finally:
+            self.invalidate_hosts()
+
+    def remove_host(self, host_id):
+        """Usuwa zdalny host; lokalnego nie da się usunąć"""
+        try:
+            return self.execute("DELETE FROM hosts WHERE id = ? AND is_local = 0", (host_id,))
+        finally:
+            self.invalidate_hosts()
+
+    def ensure_local_host(self):
+        if any(host['is_local'] for host in self.hosts()):
+            return
+        # Sprawdzenie i zapis pod jedną blokadą - inaczej dwa startujące procesy dodadzą dwa hosty lokalne
+        try:
+            with self.immediate() as conn:
+                if conn.execute("SELECT 1 FROM hosts WHERE is_local = 1").fetchone() is None:
+                    conn.execute("INSERT INTO hosts (name, url, is_local) VALUES (?, ?, 1)",
+                                 ("Local Docker", "unix://var/run/docker.sock"))
+        finally:
+            self.invalidate_hosts()
+
+    # ---- zadania ----
+
+    def save_job(self, record, dedup_key=None):
+        """Zapisuje stan zadania; dedup_key trzyma się wiersza, dopóki zadanie trwa"""
+        self.execute("INSERT OR REPLACE INTO jobs (id, created_at, data, dedup_key, updated_at) VALUES (?, ?, ?, ?, ?)",
+                     (record['id'], record['created_at'], json.dumps(record), dedup_key, time.time()))
+
+    def claim_job(self, record, dedup_key, stale_after):
+        """Zapisuje nowe zadanie z kluczem deduplikacji, chyba że inny proces ma już aktywne
+        zadanie z tym kluczem - wtedy zwraca jego zapis (None, gdy klucz jest nasz).
+
+        Wiersz bez zapisu od `stale_after` sekund należał do procesu, który zginął,
+        i nie blokuje klucza.
+        """
+        with self.immediate() as conn:
+            row = conn.execute("SELECT data, updated_at FROM jobs WHERE dedup_key = ?", (dedup_key,)).fetchone()
+            if row is not None and row['updated_at'] > time.time() - stale_after:
+                return json.loads(row['data'])
+            conn.execute("UPDATE jobs SET dedup_key = NULL WHERE dedup_key = ?", (dedup_key,))
+            conn.execute("INSERT OR REPLACE INTO jobs (id, created_at, data, dedup_key, updated_at) "
+                         "VALUES (?, ?, ?, ?, ?)",
+                         (record['id'], record['created_at'], json.dumps(record), dedup_key, time.time()))
+        return None
+
+    def job_updated_at(self, job_id):
+        row = self.query_one("SELECT updated_at FROM jobs WHERE id = ?", (job_id,))
+        return row['updated_at'] if row else None
+
+    def get_job(self, job_id):
+        row = self.query_one("SELECT data FROM jobs WHERE id = ?", (job_id,))
+        return json.loads(row['data']) if row else None
+
+    def list_jobs(self, limit):
+        rows = self.query("SELECT data FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,))
+        return [json.loads(row['data']) for row in rows]
+
+    def prune_jobs(self, keep):
+        self.execute("DELETE FROM jobs WHERE dedup_key IS NULL AND "
+                     "id NOT IN (SELECT id FROM jobs ORDER BY created_at DESC LIMIT ?)", (keep,))
+
+    # ---- powiadomienia ----
+
+    def notification_sinks(self):
+        rows = self.query("SELECT id, name, kind, url, options, rate_per_minute FROM notification_sinks ORDER BY id")
+        return [dict(row, options=json.loads(row['options'] or '{}')) for row in rows]
+
+    def add_notification_sink(self, name, kind, url, options=None, rate_per_minute=None):
+        with self.transaction() as conn:
+            return conn.execute("INSERT INTO notification_sinks (name, kind, url, options, rate_per_minute) "
+                                "VALUES (?, ?, ?, ?, ?)",
+                                (name, kind, url, json.dumps(options or {}), rate_per_minute)).lastrowid
+
+    def remove_notification_sink(self, sink_id):
+        """Usuwa odbiorcę razem z jego regułami (ON DELETE CASCADE)"""
+        return self.execute("DELETE FROM notification_sinks WHERE id = ?", (sink_id,))
+
+    def notification_rules(self):
+        rows = self.query("SELECT id, name, events, host_id, project, container, sink_id "
+                          "FROM notification_rules ORDER BY id")
+        return [dict(row, events=row['events'].split(',')) for row in rows]
+
+    def add_notification_rule(self, name, events, sink_id, host_id=None, project=None, container=None):
+        with self.transaction() as conn:
+            return conn.execute("INSERT INTO notification_rules (name, events, host_id, project, container, sink_id) "
+                                "VALUES (?, ?, ?, ?, ?, ?)",
+                                (name, ','.join(events), host_id, project, container, sink_id)).lastrowid
+
+    def remove_notification_rule(self, rule_id):
+        return self.execute("DELETE FROM notification_rules WHERE id = ?", (rule_id,))
+
+    def queue_notification_test(self, sink_id):
+        """Wiadomość testowa dla procesu, który wysyła powiadomienia (kolektora)"""
+        self.execute("INSERT INTO notification_tests (sink_id, created_at) VALUES (?, ?)", (sink_id, time.time()))
+
+    def take_notification_tests(self, max_age):
+        """Zabiera zlecone wiadomości testowe; zwraca odbiorców tych nie starszych niż max_age s"""
+        with self.immediate() as conn:
+            rows = conn.execute("SELECT sink_id, created_at FROM notification_tests").fetchall()
+            if rows:
+                conn.execute("DELETE FROM notification_tests")
+        return [row['sink_id'] for row in rows if row['created_at'] >= time.time() - max_age]
+
+    def save_notification_status(self, data):
+        self.execute("INSERT OR REPLACE INTO notification_status (id, data, updated_at) VALUES (1, ?, ?)",
+                     (data, time.time()))
+
+    def notification_status(self):
+        """Ostatnie liczniki opublikowane przez kolektor: (dane, kiedy) albo None"""
+        row = self.query_one("SELECT data, updated_at FROM notification_status WHERE id = 1")
+        return (json.loads(row['data']), row['updated_at']) if row else None
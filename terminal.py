@@ -0,0 +1,508 @@
+import base64
+import hashlib
+import json
+import os
+import selectors
+import socket
+import ssl
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+# Ile terminali naraz obsługuje jedna instancja Orbit
+MAX_TERMINALS = 64
+# Bajty czekające na wysłanie w jedną stronę; powyżej HIGH przestajemy czytać z drugiej,
+# wracamy do czytania poniżej LOW - zalew wyjścia nie rośnie w pamięci bez końca
+HIGH_WATERMARK = 256 * 1024
+LOW_WATERMARK = 64 * 1024
+READ_CHUNK = 64 * 1024
+# Największa ramka od przeglądarki (wklejony tekst) i wiadomość sterująca
+MAX_FRAME = 1024 * 1024
+MAX_CONTROL_MESSAGE = 4096
+# Ping co tyle sekund; klient, od którego nic nie przyszło przez 3 interwały, jest martwy
+PING_INTERVAL = 30
+# Ile sekund czekamy na wysłanie ramki close, zanim zerwiemy połączenie
+CLOSE_TIMEOUT = 5
+
+DEFAULT_COLS = 80
+DEFAULT_ROWS = 24
+# bash, gdy jest w obrazie, inaczej sh
+DEFAULT_SHELL = ['/bin/sh', '-c', 'if command -v bash >/dev/null 2>&1; then exec bash; else exec sh; fi']
+
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+CLOSE_NORMAL = 1000
+CLOSE_GOING_AWAY = 1001
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_TOO_BIG = 1009
+CLOSE_TRY_AGAIN = 1013
+
+# Nieblokujące gniazdo (także TLS do zdalnego hosta) nie ma teraz danych / miejsca
+WOULD_BLOCK = (BlockingIOError, InterruptedError, ssl.SSLWantReadError, ssl.SSLWantWriteError)
+
+
+class TerminalError(Exception):
+    pass
+
+
+class TerminalsFull(Exception):
+    pass
+
+
+# ============ WEBSOCKET ============
+
+def websocket_key(headers):
+    """Sec-WebSocket-Key z requestu upgrade; TerminalError, gdy to nie jest handshake WebSocket"""
+    if headers.get('Upgrade', '').lower() != 'websocket' or \
+            'upgrade' not in headers.get('Connection', '').lower():
+        raise TerminalError("Oczekiwano połączenia WebSocket (Upgrade: websocket)")
+    if headers.get('Sec-WebSocket-Version') != '13':
+        raise TerminalError("Obsługiwana jest tylko wersja 13 protokołu WebSocket")
+    key = headers.get('Sec-WebSocket-Key', '')
+    try:
+        if len(base64.b64decode(key, validate=True)) != 16:
+            raise ValueError
+    except ValueError:
+        raise TerminalError("Nieprawidłowy Sec-WebSocket-Key")
+    return key
+
+
+def handshake_response(key):
+    accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+    return (
+        'HTTP/1.1 101 Switching Protocols\r\n'
+        'Upgrade: websocket\r\n'
+        'Connection: Upgrade\r\n'
+        f'Sec-WebSocket-Accept: {accept}\r\n'
+        '\r\n'
+    ).encode()
+
+
+def frame(opcode, payload=b''):
+    """Ramka serwera (bez maski): sam nagłówek doklejony przed bajtami, bez kopiowania treści na nowo"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+
+def close_frame(code, reason=''):
+    return frame(OP_CLOSE, struct.pack('!H', code) + reason.encode()[:120])
+
+
+def unmask(payload, mask):
+    """XOR z maską klienta na całej ramce naraz (na liczbach, nie bajt po bajcie)"""
+    length = len(payload)
+    if not length:
+        return b''
+    key = (mask * (length // 4 + 1))[:length]
+    return (int.from_bytes(payload, 'big') ^ int.from_bytes(key, 'big')).to_bytes(length, 'big')
+
+
+def hijack(environ):
+    """Zabiera serwerowi WSGI połączenie z klientem i zwraca jego duplikat.
+
+    Deskryptor serwera zostaje podmieniony na martwą parę gniazd: jego
+    odpowiedź na ten request i zamknięcie połączenia trafiają w próżnię, a
+    wątek (albo worker) wraca do obsługi kolejnych requestów. Połączenie z
+    przeglądarką należy odtąd tylko do TerminalRelay.
+    """
+    sock = environ.get('werkzeug.socket') or environ.get('gunicorn.socket')
+    if sock is None:
+        raise TerminalError("Serwer WSGI nie udostępnia gniazda klienta - terminal niedostępny")
+    if isinstance(sock, ssl.SSLSocket):
+        raise TerminalError("Terminal nie działa przy TLS w samym Orbit - zakończ TLS na reverse proxy")
+    conn = sock.dup()
+    dead, peer = socket.socketpair()
+    os.dup2(dead.fileno(), sock.fileno())
+    dead.close()
+    peer.close()
+    return conn
+
+
+# ============ DOCKER EXEC ============
+
+def open_exec(client, container_id, cmd=None, cols=DEFAULT_COLS, rows=DEFAULT_ROWS):
+    """Tworzy sesję exec z TTY i zwraca (exec_id, surowe gniazdo strumienia)"""
+    exec_id = client.api.exec_create(container_id, cmd or DEFAULT_SHELL, stdin=True, tty=True,
+                                     environment={'TERM': 'xterm-256color'})['Id']
+    sock = client.api.exec_start(exec_id, tty=True, socket=True)
+    try:
+        client.api.exec_resize(exec_id, height=rows, width=cols)
+    except Exception as e:
+        print(f"⚠️ Nie udało się ustawić rozmiaru terminala {exec_id[:12]}: {e}")
+    return exec_id, sock
+
+
+# ============ PRZEKAŹNIK ============
+
+class Terminal:
+    """Jedna sesja: przeglądarka (ramki WebSocket) <-> exec w kontenerze (surowe bajty TTY)"""
+
+    def __init__(self, ws, stream, client, exec_id, container):
+        self.ws = ws
+        # Obiekt z docker-py trzyma odpowiedź HTTP przy życiu - bez niego gniazdo zamknie GC
+        self._stream_io = stream
+        self.stream = getattr(stream, '_sock', stream)
+        self.client = client
+        self.exec_id = exec_id
+        self.container = container
+        self.to_client = bytearray()
+        self.to_stream = bytearray()
+        self.inbound = bytearray()
+        # Składana z fragmentów wiadomość tekstowa (sterująca)
+        self.message = None
+        self.message_opcode = None
+        self.client_paused = False
+        self.stream_paused = False
+        self.stream_open = True
+        self.closing = None
+        self.last_seen = self.last_ping = time.monotonic()
+        self.masks = {}
+
+    # ---- od przeglądarki ----
+
+    def read_client(self, relay):
+        data = self.ws.recv(READ_CHUNK)
+        if not data:
+            return False
+        self.last_seen = time.monotonic()
+        self.inbound += data
+        return self._parse(relay)
+
+    def _parse(self, relay):
+        buf = self.inbound
+        while len(buf) >= 2:
+            b0, b1 = buf[0], buf[1]
+            opcode = b0 & 0x0F
+            length = b1 & 0x7F
+            pos = 2
+            if length == 126:
+                if len(buf) < 4:
+                    break
+                length = struct.unpack_from('!H', buf, 2)[0]
+                pos = 4
+            elif length == 127:
+                if len(buf) < 10:
+                    break
+                length = struct.unpack_from('!Q', buf, 2)[0]
+                pos = 10
+            if not b1 & 0x80:
+                self.close(CLOSE_PROTOCOL_ERROR, "Ramki klienta muszą być maskowane")
+                return True
+            if length > MAX_FRAME:
+                self.close(CLOSE_TOO_BIG, "Za duża ramka")
+                return True
+            end = pos + 4 + length
+            if len(buf) < end:
+                break
+            payload = unmask(bytes(buf[pos + 4:end]), bytes(buf[pos:pos + 4]))
+            del buf[:end]
+            self._on_frame(relay, bool(b0 & 0x80), opcode, payload)
+            if self.closing:
+                break
+        return True
+
+    def _on_frame(self, relay, fin, opcode, payload):
+        if opcode in (OP_TEXT, OP_BINARY):
+            self.message_opcode = opcode
+        elif opcode == OP_CONTINUATION:
+            opcode = self.message_opcode
+            if opcode is None:
+                self.close(CLOSE_PROTOCOL_ERROR, "Nieoczekiwana ramka kontynuacji")
+                return
+
+        if opcode == OP_BINARY:
+            # Klawisze i wklejony tekst - prosto do TTY, bez dekodowania
+            if self.stream_open:
+                self.to_stream += payload
+        elif opcode == OP_TEXT:
+            self.message = (self.message or b'') + payload
+            if len(self.message) > MAX_CONTROL_MESSAGE:
+                self.close(CLOSE_TOO_BIG, "Za duża wiadomość sterująca")
+            elif fin:
+                message, self.message = self.message, None
+                self._on_control(relay, message)
+        elif opcode == OP_PING:
+            self.to_client += frame(OP_PONG, payload)
+        elif opcode == OP_CLOSE:
+            code = struct.unpack('!H', payload[:2])[0] if len(payload) >= 2 else CLOSE_NORMAL
+            self.close(code)
+        elif opcode != OP_PONG:
+            self.close(CLOSE_PROTOCOL_ERROR, "Nieznany typ ramki")
+
+        if fin and opcode in (OP_TEXT, OP_BINARY):
+            self.message_opcode = None
+
+    def _on_control(self, relay, message):
+        try:
+            command = json.loads(message)
+        except ValueError:
+            return
+        if isinstance(command, dict) and command.get('type') == 'resize':
+            try:
+                cols = max(1, min(int(command['cols']), 1000))
+                rows = max(1, min(int(command['rows']), 1000))
+            except (KeyError, TypeError, ValueError):
+                return
+            relay.resize(self, cols, rows)
+
+    # ---- od kontenera ----
+
+    def read_stream(self):
+        """Czyta, dopóki są dane i jest miejsce w buforze do przeglądarki"""
+        while len(self.to_client) < HIGH_WATERMARK:
+            try:
+                data = self.stream.recv(READ_CHUNK)
+            except WOULD_BLOCK:
+                return
+            if not data:
+                self.stream_open = False
+                self.close(CLOSE_NORMAL, "Proces zakończony")
+                return
+            self.to_client += frame(OP_BINARY, data)
+            if not self.pending():
+                return
+
+    def pending(self):
+        """Bajty odszyfrowane już przez TLS - selektor ich nie zgłosi"""
+        pending = getattr(self.stream, 'pending', None)
+        return pending() if pending else 0
+
+    # ---- wysyłanie ----
+
+    def flush_client(self):
+        if self.to_client:
+            try:
+                sent = self.ws.send(self.to_client)
+            except WOULD_BLOCK:
+                return
+            del self.to_client[:sent]
+
+    def flush_stream(self):
+        if self.to_stream and self.stream_open:
+            try:
+                sent = self.stream.send(self.to_stream)
+            except WOULD_BLOCK:
+                return
+            del self.to_stream[:sent]
+
+    def close(self, code, reason=''):
+        """Zaczyna zamykanie: ramka close do przeglądarki, EOF do procesu"""
+        if self.closing:
+            return
+        self.closing = time.monotonic()
+        self.to_client += close_frame(code, reason)
+        self.to_stream.clear()
+        if self.stream_open:
+            self.stream_open = False
+            try:
+                self.stream.shutdown(socket.SHUT_WR)
+            except OSError:
+                pass
+
+    @property
+    def finished(self):
+        return self.closing is not None and (not self.to_client or time.monotonic() - self.closing > CLOSE_TIMEOUT)
+
+    def wanted_events(self):
+        """Maski selektora dla obu gniazd wynikające ze stanu buforów"""
+        if len(self.to_stream) >= HIGH_WATERMARK:
+            self.client_paused = True
+        elif len(self.to_stream) <= LOW_WATERMARK:
+            self.client_paused = False
+        if len(self.to_client) >= HIGH_WATERMARK:
+            self.stream_paused = True
+        elif len(self.to_client) <= LOW_WATERMARK:
+            self.stream_paused = False
+
+        ws = selectors.EVENT_WRITE if self.to_client else 0
+        if not self.client_paused and not self.closing:
+            ws |= selectors.EVENT_READ
+        stream = 0
+        if self.stream_open:
+            if self.to_stream:
+                stream |= selectors.EVENT_WRITE
+            if not self.stream_paused:
+                stream |= selectors.EVENT_READ
+        return ws, stream
+
+
+class TerminalRelay:
+    """Wszystkie terminale obsługiwane przez jeden wątek z selektorem.
+
+    Request HTTP kończy się zaraz po handshake'u - otwarty terminal nie
+    zajmuje wątku ani workera serwera, tylko dwa gniazda i dwa bufory.
+    Bajty płyną bez dekodowania: wyjście TTY dostaje tylko nagłówek ramki,
+    wejście z przeglądarki jest tylko odmaskowywane.
+    """
+
+    def __init__(self, max_terminals=MAX_TERMINALS):
+        self.max_terminals = max_terminals
+        self._selector = selectors.DefaultSelector()
+        self._lock = threading.Lock()
+        self._terminals = set()
+        self._pending = []
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._resizer = ThreadPoolExecutor(max_workers=2, thread_name_prefix='terminal-resize')
+        self._started = False
+
+    def count(self):
+        with self._lock:
+            return len(self._terminals) + len(self._pending)
+
+    def full(self):
+        return self.count() >= self.max_terminals
+
+    def add(self, terminal):
+        with self._lock:
+            if len(self._terminals) + len(self._pending) >= self.max_terminals:
+                raise TerminalsFull(f"Otwartych jest już {self.max_terminals} terminali")
+            self._pending.append(terminal)
+            if not self._started:
+                self._started = True
+                threading.Thread(target=self._loop, name='terminal-relay', daemon=True).start()
+        self._wake()
+
+    def resize(self, terminal, cols, rows):
+        # Wywołanie API Dockera nie może zatrzymać pętli wszystkich terminali
+        self._resizer.submit(self._resize, terminal, cols, rows)
+
+    def _resize(self, terminal, cols, rows):
+        try:
+            terminal.client.api.exec_resize(terminal.exec_id, height=rows, width=cols)
+        except Exception as e:
+            print(f"⚠️ Nie udało się zmienić rozmiaru terminala {terminal.exec_id[:12]}: {e}")
+
+    def _wake(self):
+        try:
+            self._wake_w.send(b'\0')
+        except WOULD_BLOCK:
+            pass
+
+    def _loop(self):
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        while True:
+            touched = set()
+            for key, mask in self._selector.select(timeout=1):
+                if key.data is None:
+                    self._accept_pending(touched)
+                    continue
+                terminal, side = key.data
+                touched.add(terminal)
+                try:
+                    self._handle(terminal, side, mask)
+                except OSError:
+                    # Zerwane połączenie z którejkolwiek strony kończy sesję
+                    terminal.stream_open = False
+                    terminal.closing = terminal.closing or time.monotonic() - CLOSE_TIMEOUT - 1
+            touched |= self._housekeeping()
+            for terminal in touched:
+                try:
+                    self._update(terminal)
+                except Exception as e:
+                    print(f"⚠️ Błąd terminala {terminal.exec_id[:12]}: {e}")
+                    self._remove(terminal)
+
+    def _accept_pending(self, touched):
+        try:
+            while self._wake_r.recv(4096):
+                pass
+        except WOULD_BLOCK:
+            pass
+        with self._lock:
+            pending, self._pending = self._pending, []
+            self._terminals.update(pending)
+        for terminal in pending:
+            terminal.ws.setblocking(False)
+            terminal.stream.setblocking(False)
+            touched.add(terminal)
+
+    def _handle(self, terminal, side, mask):
+        if side == 'ws':
+            if mask & selectors.EVENT_READ and not terminal.client_paused:
+                if not terminal.read_client(self):
+                    # Przeglądarka zamknęła połączenie bez ramki close
+                    terminal.close(CLOSE_GOING_AWAY)
+                    terminal.to_client.clear()
+            if mask & selectors.EVENT_WRITE:
+                terminal.flush_client()
+            terminal.flush_stream()
+        else:
+            if mask & selectors.EVENT_READ and terminal.stream_open and not terminal.stream_paused:
+                terminal.read_stream()
+            if mask & selectors.EVENT_WRITE:
+                terminal.flush_stream()
+            terminal.flush_client()
+
+    def _housekeeping(self):
+        now = time.monotonic()
+        touched = set()
+        with self._lock:
+            terminals = list(self._terminals)
+        for terminal in terminals:
+            if terminal.closing:
+                touched.add(terminal)
+            elif now - terminal.last_seen > 3 * PING_INTERVAL:
+                terminal.close(CLOSE_GOING_AWAY, "Brak odpowiedzi")
+                touched.add(terminal)
+            elif now - terminal.last_ping > PING_INTERVAL:
+                terminal.last_ping = now
+                terminal.to_client += frame(OP_PING)
+                touched.add(terminal)
+            if terminal.stream_open and not terminal.stream_paused and terminal.pending():
+                terminal.read_stream()
+                touched.add(terminal)
+        return touched
+
+    def _update(self, terminal):
+        if terminal.finished:
+            self._remove(terminal)
+            return
+        ws_events, stream_events = terminal.wanted_events()
+        self._set_events(terminal, terminal.ws, 'ws', ws_events)
+        self._set_events(terminal, terminal.stream, 'stream', stream_events)
+
+    def _set_events(self, terminal, sock, side, events):
+        current = terminal.masks.get(side, 0)
+        if events == current:
+            return
+        if not current:
+            self._selector.register(sock, events, (terminal, side))
+        elif not events:
+            self._selector.unregister(sock)
+        else:
+            self._selector.modify(sock, events, (terminal, side))
+        terminal.masks[side] = events
+
+    def _remove(self, terminal):
+        for side, sock in (('ws', terminal.ws), ('stream', terminal.stream)):
+            if terminal.masks.pop(side, 0):
+                try:
+                    self._selector.unregister(sock)
+                except (KeyError, ValueError):
+                    pass
+            try:
+                sock.close()
+            except OSError:
+                pass
+        try:
+            terminal._stream_io.close()
+        except Exception:
+            pass
+        with self._lock:
+            self._terminals.discard(terminal)